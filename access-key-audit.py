@@ -1,11 +1,10 @@
 #!/usr/bin/env python3
 import boto3
+import aws_instrumentation
 import csv
 from datetime import datetime
 
-iam = boto3.client('iam')
-
-def list_all_users():
+def list_all_users(iam):
     users = []
     paginator = iam.get_paginator('list_users')
     for page in paginator.paginate():
@@ -13,26 +12,28 @@ def list_all_users():
             users.append(u['UserName'])
     return users
 
-def list_access_keys(user):
+def list_access_keys(iam, user):
     response = iam.list_access_keys(UserName=user)
     return response.get('AccessKeyMetadata', [])
 
-def get_last_used(access_key_id):
+def get_last_used(iam, access_key_id):
     resp = iam.get_access_key_last_used(AccessKeyId=access_key_id)
     data = resp.get('AccessKeyLastUsed', {})
     return data.get('ServiceName'), data.get('LastUsedDate')
 
 def main():
+    aws_instrumentation.install()
+    iam = boto3.client('iam')
     output_file = 'iam_access_keys_report.csv'
     with open(output_file, 'w', newline='') as csvfile:
         fieldnames = ['UserName', 'AccessKeyId', 'Description', 'Status', 'CreateDate', 'LastUsedService', 'LastUsedDate']
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         writer.writeheader()
 
-        for user in list_all_users():
-            keys = list_access_keys(user)
+        for user in list_all_users(iam):
+            keys = list_access_keys(iam, user)
             for k in keys:
-                service, last_used_date = get_last_used(k['AccessKeyId'])
+                service, last_used_date = get_last_used(iam, k['AccessKeyId'])
                 writer.writerow({
                     'UserName': user,
                     'AccessKeyId': k['AccessKeyId'],
@@ -0,0 +1,103 @@
+'''
+api_plan.py
+
+--plan support for the long collectors: before scanning a large account, estimate how
+many API calls each operation will take, how long that takes at the rate limits, and
+what it costs, using only cheap count calls (account summary, credential report,
+describe_clusters, one list_metrics pass) or what is already on disk (--resume journals,
+caches). The script prints the plan and exits without doing the expensive work.
+
+Runtime per operation is calls x max(1 / rate, LATENCY) divided over the workers the
+script uses for it: the rate is the published quota where AWS documents one
+(KNOWN_RATES), otherwise the governor's starting rate (aws_governor.py), so the
+estimate is on the conservative side. Collectors call operations one after another,
+so the total is the sum.
+
+Usage from a script:
+  add_plan_argument(parser)
+  if args.plan:
+      plan = ApiPlan('cwcheck.py')
+      plan.add('ec2', 'DescribeInstances', pages)
+      plan.note('...')
+      plan.report()
+      return
+'''
+import math
+
+import aws_governor
+
+LATENCY = 0.1  # seconds per call, typical round trip from inside the region
+# Published default quotas (requests per second).
+KNOWN_RATES = {
+    ('cloudwatch', 'GetMetricStatistics'): 400.0,
+    ('cloudwatch', 'GetMetricData'): 50.0,
+    ('cloudwatch', 'ListMetrics'): 25.0,
+    ('ec2', 'DescribeInstances'): 20.0,
+}
+# USD per 1000 calls (GetMetricData: per 1000 metrics requested); other calls are free.
+PRICES = {
+    ('cloudwatch', 'GetMetricStatistics'): 0.01,
+    ('cloudwatch', 'ListMetrics'): 0.01,
+    ('cloudwatch', 'GetMetricData'): 0.01,
+}
+
+
+def pages(items, page_size):
+    """Calls a paginated listing of `items` takes (at least one)."""
+    return max(1, math.ceil(items / page_size))
+
+
+def rate_for(service, operation):
+    return KNOWN_RATES.get((service, operation),
+                           aws_governor.INITIAL_RATES.get(service, aws_governor.INITIAL_RATE))
+
+
+class ApiPlan(object):
+    def __init__(self, title):
+        self.title = title
+        self.steps = []
+        self.notes = []
+
+    def add(self, service, operation, calls, workers=1, units=None):
+        """One operation of the scan; `units` is what the price applies to when it is not calls."""
+        calls = int(math.ceil(calls))
+        rate = rate_for(service, operation)
+        seconds = max(calls / rate, calls * LATENCY / workers)
+        cost = PRICES.get((service, operation), 0.0) * (calls if units is None else units) / 1000.0
+        self.steps.append((f"{service}.{operation}", calls, rate, seconds, cost))
+
+    def note(self, text):
+        self.notes.append(text)
+
+    def total_calls(self):
+        return sum(step[1] for step in self.steps)
+
+    def total_seconds(self):
+        return sum(step[3] for step in self.steps)
+
+    def report(self):
+        print(f"\n📋 Plan for {self.title} (nothing was scanned)\n")
+        width = max([len('Operation')] + [len(step[0]) for step in self.steps])
+        print(f"  {'Operation':<{width}}  {'Calls':>9}  {'Rate/s':>7}  {'Time':>9}  {'Cost $':>8}")
+        for name, calls, rate, seconds, cost in self.steps:
+            print(f"  {name:<{width}}  {calls:>9}  {rate:>7g}  {format_duration(seconds):>9}  {cost:>8.2f}")
+        cost = sum(step[4] for step in self.steps)
+        print(f"  {'Total':<{width}}  {self.total_calls():>9}  {'':>7}  "
+              f"{format_duration(self.total_seconds()):>9}  {cost:>8.2f}")
+        for text in self.notes:
+            print(f"  • {text}")
+        print()
+
+
+def format_duration(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def add_plan_argument(parser):
+    parser.add_argument('--plan', action='store_true',
+                        help="estimate API calls, runtime and cost from cheap counts, then exit")
+    return parser
@@ -18,14 +18,33 @@ Required IAM permissions (minimum):
  - ssm:GetCommandInvocation
  - ec2:DescribeInstances
 
+The CSV also carries each Tomcat's JVM footprint (PID, RSS, CPU time, -Xmx, threads, open
+file descriptors, host memory), found by mapping the redirect port to the java process
+listening on it in a single /proc pass, and tomcat_footprint_<timestamp>.csv rolls it up
+per instance, flagging hosts whose JVMs are overcommitted.
+
+Each inspection first runs a cheap fingerprint (the /home user directories, server.xml
+paths, mtimes and sizes plus the listening-port set). When it matches the fingerprint cached for the instance
+(tomcat_fingerprints.json) the cached CSV is reused and the full scan is skipped.
+
 Usage:
   python3 ssm_tomcat_report.py
+  python3 ssm_tomcat_report.py --instance i-0123456789abcdef0
+  python3 ssm_tomcat_report.py --all [--force] [--snapshot]
 
 Author: ChatGPT (GPT-5 Thinking mini)
 '''
 from __future__ import print_function
 import boto3
 import botocore
+import aws_instrumentation
+import tracing
+from snapshot_store import add_snapshot_argument, record
+import argparse
+import csv
+import hashlib
+import io
+import json
 import time
 import sys
 import os
@@ -33,6 +52,61 @@ from datetime import datetime
 
 SSM_POLL_INTERVAL = 3  # seconds
 SSM_MAX_WAIT = 600     # seconds
+SEND_COMMAND_MAX_TARGETS = 50
+FINGERPRINT_CACHE_FILE = 'tomcat_fingerprints.json'
+LIST_OUTPUT_LIMIT = 2500          # stdout characters list_command_invocations returns
+INVOCATION_OUTPUT_LIMIT = 24000   # stdout characters get_command_invocation returns
+OUTPUT_LIMIT_MARGIN = 100         # output this close to a limit may have been cut off
+
+# Cheap first phase: what the full scan depends on (the /home user directories, every
+# server.xml path, mtime and size under them, plus the listening TCP ports), hashed on the
+# host so only a digest comes back. If it matches the cached digest the cached CSV is still
+# accurate.
+# The same step does one /proc pass over the java processes: listening socket inodes are
+# mapped to ports, and for every port a JVM listens on it prints
+#   proc <port> <pid> <rss_kb> <cpu_seconds> <xmx_mb> <threads> <open_fds>
+# plus "mem <MemTotal kB>". That part changes constantly, so it is never cached.
+FINGERPRINT_SCRIPT = r'''#!/usr/bin/env bash
+{
+  for userdir in /home/*; do [ -d "$userdir" ] && echo "home $userdir"; done
+  find /home/*/ -type f -name server.xml -exec stat -c 'xml %n %Y %s' {} + 2>/dev/null || true
+  ss -ltn 2>/dev/null | awk 'NR>1 {print $4}' | awk -F: '{print "port " $NF}' || true
+} | LC_ALL=C sort -u | sha256sum | cut -d' ' -f1
+
+echo "mem $(awk '/^MemTotal:/ {print $2}' /proc/meminfo)"
+declare -A INODE_PORT
+while read -r _ local _ st _ _ _ _ _ inode _; do
+  [[ "$st" == "0A" ]] && INODE_PORT[$inode]=$((16#${local##*:}))
+done < <(tail -qn +2 /proc/net/tcp /proc/net/tcp6 2>/dev/null)
+tck=$(getconf CLK_TCK)
+for p in /proc/[0-9]*; do
+  [[ "$(cat "$p/comm" 2>/dev/null)" == java ]] || continue
+  pid=${p#/proc/}
+  fds=$(ls "$p/fd" 2>/dev/null | wc -l)
+  rss=$(awk '/^VmRSS:/ {print $2}' "$p/status" 2>/dev/null)
+  threads=$(awk '/^Threads:/ {print $2}' "$p/status" 2>/dev/null)
+  read -r -a st < <(sed 's/.*) //' "$p/stat" 2>/dev/null)
+  cpu=$(( (${st[11]:-0} + ${st[12]:-0}) / tck ))
+  xmx=$(tr '\0' '\n' < "$p/cmdline" 2>/dev/null | sed -n 's/^-Xmx\([0-9]*\)\([kKmMgG]\{0,1\}\)$/\1 \2/p' | tail -n1)
+  read -r n unit <<< "$xmx"
+  case "$unit" in
+    g|G) xmx_mb=$(( n * 1024 )) ;;
+    m|M) xmx_mb=$n ;;
+    k|K) xmx_mb=$(( n / 1024 )) ;;
+    *)   xmx_mb=$(( ${n:-0} / 1048576 )) ;;
+  esac
+  find "$p/fd" -lname 'socket:*' -printf '%l\n' 2>/dev/null | sed 's/socket:\[\(.*\)\]/\1/' | sort -u | \
+  while read -r inode; do
+    port=${INODE_PORT[$inode]:-}
+    [[ -n "$port" ]] && echo "proc $port $pid ${rss:-0} $cpu $xmx_mb ${threads:-0} $fds"
+  done
+done
+exit 0
+'''
+FOOTPRINT_COLUMNS = ['pid', 'rss_kb', 'cpu_seconds', 'xmx_mb', 'threads', 'open_fds', 'host_mem_kb']
+ROLLUP_COLUMNS = ['InstanceId', 'Name', 'Tomcats', 'Running', 'RssMB', 'XmxMB', 'HostMemMB', 'XmxPctOfHost',
+                  'Threads', 'OpenFds', 'Overcommitted']
+OVERCOMMIT_RSS_FRACTION = 0.9   # running JVMs using more than this share of host memory
 
 def list_ssm_instances(ssm_client, ec2_client):
     """Return list of dicts: [{'InstanceId': id, 'Name': name, 'PlatformName': p, 'PingStatus': s}, ...]"""
@@ -205,7 +279,7 @@ def run_ssm_command_and_wait(ssm_client, instance_id, command_string):
         )
     except botocore.exceptions.ClientError as e:
         print("Failed to send SSM command:", e, file=sys.stderr)
-        sys.exit(1)
+        return None
 
     cmd_id = resp['Command']['CommandId']
     print(f"Sent SSM command {cmd_id} to instance {instance_id}. Waiting for completion...")
@@ -221,16 +295,16 @@ def run_ssm_command_and_wait(ssm_client, instance_id, command_string):
                 elapsed += 1
                 if elapsed > SSM_MAX_WAIT:
                     print("Timeout waiting for command invocation to appear.", file=sys.stderr)
-                    sys.exit(1)
+                    return None
                 continue
             print("Error fetching command invocation:", e, file=sys.stderr)
-            sys.exit(1)
+            return None
 
         status = inv.get('Status')
         if status in ('Pending', 'InProgress', 'Delayed', 'Cancelling'):
             if elapsed >= SSM_MAX_WAIT:
                 print("Timed out waiting for SSM command to finish.", file=sys.stderr)
-                sys.exit(1)
+                return None
             time.sleep(SSM_POLL_INTERVAL)
             elapsed += SSM_POLL_INTERVAL
             continue
@@ -248,37 +322,228 @@ def run_ssm_command_and_wait(ssm_client, instance_id, command_string):
             # Still return stdout if present (could contain partial results)
             return stdout
 
+def fetch_fingerprints(ssm_client, instance_ids):
+    """
+    Run FINGERPRINT_SCRIPT on up to 50 instances per send_command and collect all results
+    with list_command_invocations (one paginated call per poll instead of one per instance).
+    That output is cut at LIST_OUTPUT_LIMIT characters (one 'proc' line per JVM socket), so
+    an instance near the limit is re-read with get_command_invocation.
+    Returns {instance_id: (digest, footprint)}; instances that failed are left out (they
+    get a full scan without footprint columns).
+    """
+    fingerprints = {}
+    for start in range(0, len(instance_ids), SEND_COMMAND_MAX_TARGETS):
+        chunk = instance_ids[start:start + SEND_COMMAND_MAX_TARGETS]
+        try:
+            resp = ssm_client.send_command(InstanceIds=chunk, DocumentName='AWS-RunShellScript',
+                                           Parameters={'commands': [FINGERPRINT_SCRIPT]}, TimeoutSeconds=60)
+        except botocore.exceptions.ClientError as e:
+            print("Failed to send fingerprint command:", e, file=sys.stderr)
+            continue
+        cmd_id = resp['Command']['CommandId']
+        pending = set(chunk)
+        elapsed = 0
+        while pending and elapsed <= SSM_MAX_WAIT:
+            time.sleep(SSM_POLL_INTERVAL)
+            elapsed += SSM_POLL_INTERVAL
+            paginator = ssm_client.get_paginator('list_command_invocations')
+            for page in paginator.paginate(CommandId=cmd_id, Details=True):
+                for inv in page.get('CommandInvocations', []):
+                    iid = inv['InstanceId']
+                    if iid not in pending or inv['Status'] in ('Pending', 'InProgress', 'Delayed', 'Cancelling'):
+                        continue
+                    pending.discard(iid)
+                    if inv['Status'] != 'Success':
+                        continue
+                    plugins = inv.get('CommandPlugins') or [{}]
+                    lines, complete = fingerprint_lines(ssm_client, cmd_id, iid, plugins[0].get('Output') or '')
+                    if not complete:
+                        print(f"{iid}: fingerprint output exceeds the SSM output limit, "
+                              "the JVM footprint is incomplete.", file=sys.stderr)
+                    if lines and len(lines[0]) == 64:
+                        fingerprints[iid] = (lines[0], parse_footprint(lines[1:]))
+    return fingerprints
+
+def fingerprint_lines(ssm_client, cmd_id, instance_id, output):
+    """
+    Lines of the fingerprint output, re-read with get_command_invocation when the
+    list_command_invocations copy may have been cut off. Returns (lines, complete); when
+    even the full read hit its limit the cut-off last line is dropped.
+    """
+    limit = LIST_OUTPUT_LIMIT
+    if len(output) >= limit - OUTPUT_LIMIT_MARGIN:
+        try:
+            inv = ssm_client.get_command_invocation(CommandId=cmd_id, InstanceId=instance_id)
+            output, limit = inv.get('StandardOutputContent') or '', INVOCATION_OUTPUT_LIMIT
+        except botocore.exceptions.ClientError as e:
+            print(f"Error fetching the full fingerprint output of {instance_id}:", e, file=sys.stderr)
+    if len(output) < limit - OUTPUT_LIMIT_MARGIN:
+        return output.strip().splitlines(), True
+    return output.splitlines()[:-1], False
+
+def parse_footprint(lines):
+    """'mem'/'proc' lines of FINGERPRINT_SCRIPT -> {'mem_kb': n, 'ports': {port: [pid, rss_kb, ...]}}."""
+    footprint = {'mem_kb': '', 'ports': {}}
+    for line in lines:
+        fields = line.split()
+        if fields[:1] == ['mem'] and len(fields) == 2:
+            footprint['mem_kb'] = fields[1]
+        elif fields[:1] == ['proc'] and len(fields) == 8:
+            footprint['ports'][fields[1]] = fields[2:]
+    return footprint
+
+def add_footprint_columns(output, footprint):
+    """Append the JVM columns to the scan CSV, joining each user's redirect port to the JVM listening on it."""
+    rows = list(csv.reader(io.StringIO(output)))
+    if not rows:
+        return output
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    writer.writerow(rows[0] + FOOTPRINT_COLUMNS)
+    for row in rows[1:]:
+        if not row:
+            continue
+        jvm = footprint['ports'].get(row[2] if len(row) > 2 else '') if footprint else None
+        writer.writerow(row + (jvm or [''] * 6) + [footprint['mem_kb'] if footprint else ''])
+    return buf.getvalue()
+
+def footprint_rollup(instance_id, name, output):
+    """One ROLLUP_COLUMNS row per instance: what its Tomcat JVMs use and are allowed to use."""
+    rows = list(csv.DictReader(io.StringIO(output)))
+    jvms = {r['pid']: r for r in rows if r.get('pid')}   # a JVM listening on several ports counts once
+    num = lambda v: int(v) if v and v.isdigit() else 0
+    rss_mb = sum(num(r['rss_kb']) for r in jvms.values()) // 1024
+    xmx_mb = sum(num(r['xmx_mb']) for r in jvms.values())
+    host_mb = num(rows[0].get('host_mem_kb')) // 1024 if rows else 0
+    overcommitted = bool(host_mb) and (xmx_mb > host_mb or rss_mb > OVERCOMMIT_RSS_FRACTION * host_mb)
+    tomcats = sum(1 for r in rows if r.get('picked_serverxml'))   # not the no-serverxml users
+    return [instance_id, name, tomcats, len(jvms), rss_mb, xmx_mb, host_mb,
+            round(100.0 * xmx_mb / host_mb, 1) if host_mb else '',
+            sum(num(r['threads']) for r in jvms.values()), sum(num(r['open_fds']) for r in jvms.values()),
+            'yes' if overcommitted else 'no']
+
+def scan_version():
+    """Digest of the full remote scan, so changing the scan invalidates every cached result."""
+    return hashlib.sha256(send_readonly_script(None, None).encode('utf-8')).hexdigest()[:16]
+
+def load_fingerprint_cache(path=FINGERPRINT_CACHE_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_fingerprint_cache(cache, path=FINGERPRINT_CACHE_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(cache, fh)
+    os.replace(tmp_path, path)
+
+def inspect_instances(ssm_client, instance_ids, cache, force=False):
+    """
+    Two-phase inspection: fingerprint every instance, reuse the cached CSV where the
+    fingerprint (and scan version) is unchanged, run the full scan on the rest.
+    Yields (instance_id, csv_output, reused).
+    """
+    version = scan_version()
+    # Fingerprints are fetched even with --force: the same step collects the JVM footprint.
+    with tracing.span('fingerprints', instances=len(instance_ids)):
+        fingerprints = fetch_fingerprints(ssm_client, instance_ids)
+    for instance_id in instance_ids:
+        digest, footprint = fingerprints.get(instance_id, (None, None))
+        cached = cache.get(instance_id)
+        if not force and digest and cached and cached['Fingerprint'] == digest and cached['ScanVersion'] == version:
+            yield instance_id, add_footprint_columns(cached['Output'], footprint), True
+            continue
+        with tracing.span('full-scan', instance=instance_id):
+            output = run_ssm_command_and_wait(ssm_client, instance_id, send_readonly_script(ssm_client, instance_id))
+        if output and digest:
+            # Only cache when the fingerprint was taken before the scan, so a change in between re-scans next time.
+            cache[instance_id] = {'Fingerprint': digest, 'ScanVersion': version, 'Output': output,
+                                  'ScannedAt': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')}
+        yield instance_id, add_footprint_columns(output, footprint) if output else output, False
+
 def safe_filename(name):
     # produce a filesystem-safe filename
     keep = (' ', '.', '_', '-')
     return "".join(c for c in name if c.isalnum() or c in keep).rstrip()
 
+def tomcat_snapshot_rows(instance_id, output):
+    """Report CSV (scan columns + FOOTPRINT_COLUMNS) -> snapshot rows."""
+    reader = csv.reader(io.StringIO(output))
+    next(reader, None)
+    return [[instance_id] + row[:5 + len(FOOTPRINT_COLUMNS)] for row in reader if row]
+
 def main():
-    session = boto3.Session()
+    session = aws_instrumentation.install(boto3.Session())
+    parser = argparse.ArgumentParser(description="Tomcat redirect port report over SSM (read-only).")
+    parser.add_argument('--instance', help="inspect this instance instead of choosing interactively")
+    parser.add_argument('--all', action='store_true', help="inspect every SSM-Online instance")
+    parser.add_argument('--force', action='store_true', help="always run the full scan (ignore cached fingerprints)")
+    args = tracing.add_trace_arguments(add_snapshot_argument(parser)).parse_args()
+    tracing.setup(args)
+
     ssm = session.client('ssm')
     ec2 = session.client('ec2')
 
-    instances = list_ssm_instances(ssm, ec2)
-    chosen = prompt_user_choice(instances)
-    instance_id = chosen['InstanceId']
-    inst_name = chosen.get('Name') or instance_id
-
-    print(f"Selected instance: {instance_id} (Name: {inst_name})")
-
-    remote_cmd = send_readonly_script(ssm, instance_id)
-    output = run_ssm_command_and_wait(ssm, instance_id, remote_cmd)
-
-    if not output:
-        print("No output returned from remote inspection. The instance may not have any /home/*/server.xml files, or the command failed.", file=sys.stderr)
-        sys.exit(1)
-
+    with tracing.span('list-ssm-instances'):
+        instances = list_ssm_instances(ssm, ec2)
+    if args.snapshot:
+        record('ssm_instances', [[i['InstanceId'], i['Name'], i['PlatformName'], i['PingStatus']] for i in instances])
+    if args.all:
+        chosen = [i for i in instances if i['PingStatus'] == 'Online']
+    elif args.instance:
+        chosen = [i for i in instances if i['InstanceId'] == args.instance] or \
+            [{'InstanceId': args.instance, 'Name': ''}]
+    else:
+        chosen = [prompt_user_choice(instances)]
+    names = {i['InstanceId']: i.get('Name') or i['InstanceId'] for i in chosen}
+
+    for inst in chosen:
+        print(f"Selected instance: {inst['InstanceId']} (Name: {names[inst['InstanceId']]})")
+
+    cache = load_fingerprint_cache()
     timestamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
-    safe_name = safe_filename(inst_name)
-    local_filename = f"{safe_name}_tomcat_redirects_{timestamp}.csv"
-    with open(local_filename, 'w', encoding='utf-8') as fh:
-        fh.write(output)
-
-    print(f"CSV saved to: {os.path.abspath(local_filename)}")
+    reused_count = failed = 0
+    rollup = []
+    for instance_id, output, reused in inspect_instances(ssm, list(names), cache, args.force):
+        if not output:
+            print(f"No output returned from remote inspection of {instance_id}. The instance may not have any "
+                  "/home/*/server.xml files, or the command failed.", file=sys.stderr)
+            failed += 1
+            continue
+        if reused:
+            reused_count += 1
+            print(f"{instance_id}: fingerprint unchanged, reusing the cached scan.")
+
+        local_filename = f"{safe_filename(names[instance_id])}_tomcat_redirects_{timestamp}.csv"
+        with open(local_filename, 'w', encoding='utf-8') as fh:
+            fh.write(output)
+
+        print(f"CSV saved to: {os.path.abspath(local_filename)}")
+        with tracing.span('rollup', instance=instance_id):
+            rollup.append(footprint_rollup(instance_id, names[instance_id], output))
+        if args.snapshot:
+            record('tomcat', tomcat_snapshot_rows(instance_id, output))
+    save_fingerprint_cache(cache)
+
+    if rollup:
+        rollup_filename = f"tomcat_footprint_{timestamp}.csv"
+        with open(rollup_filename, 'w', newline='', encoding='utf-8') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(ROLLUP_COLUMNS)
+            writer.writerows(rollup)
+        for row in rollup:
+            if row[-1] == 'yes':
+                print(f"Overcommitted: {row[0]} ({row[1]}): -Xmx total {row[5]} MB, RSS {row[4]} MB "
+                      f"on {row[6]} MB host memory")
+        print(f"Per-instance JVM footprint saved to: {os.path.abspath(rollup_filename)}")
+
+    if len(names) > 1:
+        print(f"{len(names)} instance(s): {reused_count} unchanged (cached), "
+              f"{len(names) - reused_count - failed} scanned, {failed} failed.")
+    if failed == len(names):
+        sys.exit(1)
     print("Done. The script was read-only on AWS and on the instance (only read operations were performed).")
 
 if __name__ == '__main__':
@@ -0,0 +1,214 @@
+'''
+aws_governor.py
+
+Adaptive rate governor for the audit scripts, attached through botocore event hooks
+like aws_instrumentation.py (which installs it, so every collector gets it).
+
+  * Every (service, operation) has a token bucket; each HTTP attempt, retries included,
+    takes one token. The refill rate grows additively on every successful call and is
+    halved when an attempt is throttled.
+  * Every service has an adaptive concurrency limit shared by all threads of the script:
+    calls beyond the limit wait before being sent. The limit grows by 1/limit per success
+    and is halved on throttling (AIMD), so thread pools settle just under the real limit.
+  * Clients get the botocore "standard" retry mode with more attempts, so a throttled
+    call is retried instead of surfacing as a crash.
+
+Decreases are applied at most once per DECREASE_COOLDOWN seconds, so a burst of
+throttled in-flight calls counts as one congestion signal.
+
+Callers that still get a throttling error after all retries must treat the unit as
+unknown, never as a finding: use is_throttle_error(exc).
+
+Environment:
+  AWS_GOVERNOR=0    do not install the governor
+'''
+import os
+import threading
+import time
+
+from aws_instrumentation import THROTTLE_CODES
+
+INITIAL_RATE = 20.0          # tokens per second per operation
+INITIAL_RATES = {'iam': 10.0, 'sts': 10.0, 'ssm': 10.0}   # per-service overrides
+MIN_RATE = 0.5
+MAX_RATE = 200.0
+RATE_STEP = 0.2              # added to an operation's rate per successful call
+BURST = 10                   # bucket capacity
+INITIAL_CONCURRENCY = 16
+MAX_CONCURRENCY = 64
+DECREASE_FACTOR = 0.5
+DECREASE_COOLDOWN = 1.0      # seconds
+MAX_ATTEMPTS = 10
+
+_lock = threading.Lock()
+_buckets = {}
+_limits = {}
+_installed = set()
+
+
+class TokenBucket(object):
+    __slots__ = ('rate', 'tokens', 'updated', 'decreased', 'lock')
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = float(BURST)
+        self.updated = time.monotonic()
+        self.decreased = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until it is available (tokens are reserved, so waiters queue up fairly)."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(BURST, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def success(self):
+        with self.lock:
+            self.rate = min(MAX_RATE, self.rate + RATE_STEP)
+
+    def throttled(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.decreased >= DECREASE_COOLDOWN:
+                self.rate = max(MIN_RATE, self.rate * DECREASE_FACTOR)
+                self.decreased = now
+
+
+class ConcurrencyLimit(object):
+    __slots__ = ('limit', 'in_flight', 'decreased', 'cond')
+
+    def __init__(self):
+        self.limit = float(INITIAL_CONCURRENCY)
+        self.in_flight = 0
+        self.decreased = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, success):
+        with self.cond:
+            self.in_flight -= 1
+            if success:
+                self.limit = min(MAX_CONCURRENCY, self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+    def throttled(self):
+        with self.cond:
+            now = time.monotonic()
+            if now - self.decreased >= DECREASE_COOLDOWN:
+                self.limit = max(1.0, self.limit * DECREASE_FACTOR)
+                self.decreased = now
+
+
+def _key(event_name):
+    # e.g. 'before-send.cloudwatch.GetMetricStatistics' -> ('cloudwatch', 'GetMetricStatistics')
+    parts = event_name.split('.')
+    return parts[1], parts[2] if len(parts) > 2 else ''
+
+
+def bucket(service, operation):
+    key = (service, operation)
+    b = _buckets.get(key)
+    if b is None:
+        with _lock:
+            b = _buckets.get(key)
+            if b is None:
+                b = _buckets[key] = TokenBucket(INITIAL_RATES.get(service, INITIAL_RATE))
+    return b
+
+
+def concurrency(service):
+    c = _limits.get(service)
+    if c is None:
+        with _lock:
+            c = _limits.get(service)
+            if c is None:
+                c = _limits[service] = ConcurrencyLimit()
+    return c
+
+
+def _throttled(parsed, status_code):
+    return (parsed or {}).get('Error', {}).get('Code') in THROTTLE_CODES or status_code == 429
+
+
+def is_throttle_error(exc):
+    """True when `exc` is a ClientError caused by throttling (the result is unknown, not a finding)."""
+    response = getattr(exc, 'response', None) or {}
+    return _throttled(response, response.get('ResponseMetadata', {}).get('HTTPStatusCode'))
+
+
+def _on_before_call(event_name, context, **kwargs):
+    service, _ = _key(event_name)
+    concurrency(service).acquire()
+    context['_governor_service'] = service
+
+
+def _release(context, success):
+    service = context.pop('_governor_service', None)
+    if service is not None:
+        concurrency(service).release(success)
+
+
+def _on_after_call(event_name, http_response, parsed, context, **kwargs):
+    success = http_response.status_code < 400
+    if success:
+        bucket(*_key(event_name)).success()
+    _release(context, success)
+
+
+def _on_after_call_error(context, **kwargs):
+    _release(context, False)
+
+
+def _on_before_send(event_name, **kwargs):
+    bucket(*_key(event_name)).acquire()
+
+
+def _on_needs_retry(event_name, response, **kwargs):
+    # Called after every attempt, so each throttled attempt is a congestion signal.
+    if response is None:
+        return
+    http_response, parsed = response
+    if _throttled(parsed, getattr(http_response, 'status_code', None)):
+        service, operation = _key(event_name)
+        bucket(service, operation).throttled()
+        concurrency(service).throttled()
+
+
+def install(session):
+    """Register the governor on a boto3.Session or botocore Session (idempotent)."""
+    if os.environ.get('AWS_GOVERNOR', '1') == '0':
+        return session
+    core = getattr(session, '_session', session)
+    events = core.get_component('event_emitter')
+    if id(events) in _installed:
+        return session
+    events.register('before-call', _on_before_call, unique_id='governor-before-call')
+    events.register('after-call', _on_after_call, unique_id='governor-after-call')
+    events.register('after-call-error', _on_after_call_error, unique_id='governor-after-call-error')
+    events.register('before-send', _on_before_send, unique_id='governor-before-send')
+    events.register('needs-retry', _on_needs_retry, unique_id='governor-needs-retry')
+    if core.get_default_client_config() is None:
+        from botocore.config import Config
+        core.set_default_client_config(Config(retries={'mode': 'standard', 'max_attempts': MAX_ATTEMPTS}))
+    _installed.add(id(events))
+    return session
+
+
+def snapshot():
+    """Current rates and concurrency limits, for the instrumentation summary or debugging."""
+    with _lock:
+        return {
+            'rates': {f"{s}.{o}": round(b.rate, 2) for (s, o), b in sorted(_buckets.items())},
+            'concurrency': {s: int(c.limit) for s, c in sorted(_limits.items())},
+        }
@@ -0,0 +1,230 @@
+'''
+aws_instrumentation.py
+
+AWS API call instrumentation for the audit scripts, attached through botocore event
+hooks. For every (service, operation) it records the number of calls, errors, a latency
+histogram, retry attempts, throttled attempts and bytes received. A summary table is
+printed to stderr when the script exits and can also be written as JSON.
+
+Hooks are registered on a session's event emitter and clients copy that emitter when
+they are created, so install() must run before the script creates its clients: every
+script calls it first thing in main(). Only the offline-capable tools (iam_policy_engine.py,
+credential_analytics.py), which import boto3 lazily, call it where they start talking to AWS.
+install() also installs the adaptive rate governor (aws_governor.py) on the session.
+
+Environment:
+  AWS_METRICS=0             disable the exit summary
+  AWS_METRICS_JSON=path     also write the metrics as JSON at exit
+  AWS_GOVERNOR=0            do not install the rate governor
+  AWS_TRACE=path            write a Chrome trace of the run (see tracing.py)
+
+Usage:
+  import aws_instrumentation
+  aws_instrumentation.install()                 # boto3 default session (boto3.client)
+  aws_instrumentation.install(session)          # an explicit boto3.Session()
+'''
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+import tracing
+
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+THROTTLE_CODES = {
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottledException',
+    'TooManyRequestsException', 'ProvisionedThroughputExceededException', 'TransactionInProgressException',
+    'RequestLimitExceeded', 'BandwidthLimitExceeded', 'LimitExceededException', 'RequestThrottled',
+    'SlowDown', 'PriorRequestNotComplete', 'EC2ThrottledException',
+}
+
+_lock = threading.Lock()
+_stats = {}
+_instrumented = set()
+_exit_hook = {'registered': False, 'json_path': None, 'summary': True}
+
+
+def _new_stats():
+    return {'calls': 0, 'errors': 0, 'retries': 0, 'throttled': 0, 'bytes_received': 0,
+            'latency_ms_total': 0.0, 'latency_ms_max': 0.0,
+            'latency_histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1)}
+
+
+def _entry(service, operation):
+    key = (service, operation)
+    entry = _stats.get(key)
+    if entry is None:
+        entry = _stats[key] = _new_stats()
+    return entry
+
+
+def _service_name(model):
+    return model.service_model.service_name
+
+
+def _on_request_start(model, context, **kwargs):
+    context['_metrics_start'] = time.perf_counter()
+    with _lock:
+        _entry(_service_name(model), model.name)['calls'] += 1
+
+
+def _record_latency(entry, context, service, operation):
+    start = context.get('_metrics_start')
+    if start is None:
+        return
+    end = time.perf_counter()
+    tracing.add_span(f"{service}.{operation}", start, end, 'aws')
+    elapsed_ms = (end - start) * 1000
+    entry['latency_ms_total'] += elapsed_ms
+    entry['latency_ms_max'] = max(entry['latency_ms_max'], elapsed_ms)
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if elapsed_ms <= bound:
+            entry['latency_histogram'][i] += 1
+            break
+    else:
+        entry['latency_histogram'][-1] += 1
+
+
+def _on_after_call(http_response, parsed, model, context, **kwargs):
+    size = http_response.headers.get('content-length')
+    if size is None and not model.has_streaming_output and getattr(http_response, 'raw', None) is not None:
+        size = len(http_response.content or b'')
+    service = _service_name(model)
+    with _lock:
+        entry = _entry(service, model.name)
+        _record_latency(entry, context, service, model.name)
+        entry['bytes_received'] += int(size or 0)
+        entry['retries'] += (parsed or {}).get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        if 'Error' in (parsed or {}):
+            entry['errors'] += 1
+
+
+def _on_after_call_error(exception, context, **kwargs):
+    model = context.get('_metrics_model')
+    if model is None:
+        return
+    service = _service_name(model)
+    with _lock:
+        entry = _entry(service, model.name)
+        _record_latency(entry, context, service, model.name)
+        entry['errors'] += 1
+
+
+def _on_before_parameter_build(model, context, **kwargs):
+    # after-call-error does not receive the operation model, so keep it on the request context.
+    context['_metrics_model'] = model
+
+
+def _on_needs_retry(response, operation, caught_exception=None, **kwargs):
+    throttled = False
+    if response is not None:
+        http_response, parsed = response
+        code = (parsed or {}).get('Error', {}).get('Code')
+        throttled = code in THROTTLE_CODES or getattr(http_response, 'status_code', None) == 429
+    if throttled:
+        with _lock:
+            _entry(_service_name(operation), operation.name)['throttled'] += 1
+
+
+def instrument_session(session):
+    """Register the hooks on a boto3.Session or botocore Session (idempotent)."""
+    events = session.events if hasattr(session, 'events') else session.get_component('event_emitter')
+    if id(events) in _instrumented:
+        return session
+    events.register('before-parameter-build', _on_before_parameter_build, unique_id='metrics-model')
+    events.register('before-parameter-build', _on_request_start, unique_id='metrics-start')
+    events.register('after-call', _on_after_call, unique_id='metrics-after-call')
+    events.register('after-call-error', _on_after_call_error, unique_id='metrics-after-call-error')
+    events.register('needs-retry', _on_needs_retry, unique_id='metrics-needs-retry')
+    _instrumented.add(id(events))
+    return session
+
+
+def install(session=None, summary=None, json_path=None):
+    """
+    Instrument `session` (default: boto3's default session) and print the summary at exit.
+    `summary`/`json_path` override AWS_METRICS / AWS_METRICS_JSON.
+    """
+    if session is None:
+        import boto3
+        session = boto3._get_default_session()
+    instrument_session(session)
+    import aws_governor
+    aws_governor.install(session)
+    tracing.setup()
+
+    if summary is None:
+        summary = os.environ.get('AWS_METRICS', '1') != '0'
+    _exit_hook['summary'] = summary
+    _exit_hook['json_path'] = json_path or os.environ.get('AWS_METRICS_JSON') or _exit_hook['json_path']
+    if not _exit_hook['registered']:
+        atexit.register(_at_exit)
+        _exit_hook['registered'] = True
+    return session
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def _percentile_bucket(histogram, fraction):
+    """Upper bound (ms) of the histogram bucket holding the given fraction of calls (None: overflow)."""
+    total = sum(histogram)
+    if not total:
+        return 0
+    running = 0
+    for i, count in enumerate(histogram):
+        running += count
+        if running >= fraction * total:
+            return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else None
+    return None
+
+
+def snapshot():
+    """Return the collected metrics as a JSON-serializable dict."""
+    with _lock:
+        operations = []
+        for (service, operation), entry in sorted(_stats.items()):
+            row = dict(entry, service=service, operation=operation)
+            row['latency_histogram'] = list(entry['latency_histogram'])
+            row['latency_ms_avg'] = round(entry['latency_ms_total'] / entry['calls'], 2) if entry['calls'] else 0
+            row['latency_ms_p50_bucket'] = _percentile_bucket(entry['latency_histogram'], 0.5)
+            row['latency_ms_p95_bucket'] = _percentile_bucket(entry['latency_histogram'], 0.95)
+            operations.append(row)
+    totals = {k: sum(op[k] for op in operations) for k in ('calls', 'errors', 'retries', 'throttled', 'bytes_received')}
+    return {'script': os.path.basename(sys.argv[0]) if sys.argv else '', 'buckets_ms': list(LATENCY_BUCKETS_MS),
+            'totals': totals, 'operations': operations}
+
+
+def format_summary(data=None):
+    data = data or snapshot()
+    if not data['operations']:
+        return ''
+    lines = [f"{'Service':<12} {'Operation':<40} {'Calls':>7} {'Err':>5} {'Retry':>6} {'Thrtl':>6} "
+             f"{'Avg ms':>8} {'p95 ms':>8} {'Max ms':>8} {'KB recv':>9}"]
+    for op in sorted(data['operations'], key=lambda o: -o['calls']):
+        p95 = op['latency_ms_p95_bucket']
+        p95 = f">{LATENCY_BUCKETS_MS[-1]}" if p95 is None else f"<={p95}"
+        lines.append(f"{op['service']:<12} {op['operation']:<40} {op['calls']:>7} {op['errors']:>5} "
+                     f"{op['retries']:>6} {op['throttled']:>6} {op['latency_ms_avg']:>8.1f} {p95:>8} "
+                     f"{op['latency_ms_max']:>8.1f} {op['bytes_received'] / 1024:>9.1f}")
+    t = data['totals']
+    lines.append(f"{'TOTAL':<53} {t['calls']:>7} {t['errors']:>5} {t['retries']:>6} {t['throttled']:>6}")
+    return '\n'.join(lines)
+
+
+def write_json(path, data=None):
+    data = data or snapshot()
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(data, fh, indent=2, default=str)
+
+
+def _at_exit():
+    data = snapshot()
+    if _exit_hook['summary'] and data['operations']:
+        print("\n📈 AWS API calls:\n" + format_summary(data), file=sys.stderr)
+    if _exit_hook['json_path']:
+        write_json(_exit_hook['json_path'], data)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+'''
+awsaudit.py
+
+Single entry point for the audit scripts in this directory. Each subcommand maps to an
+existing script; the script is only loaded (together with boto3, rich, tabulate, ...)
+when that subcommand is invoked, so `--help` and listing commands start instantly.
+Everything after the subcommand is passed to the script unchanged.
+
+Usage:
+  python3 awsaudit.py --help
+  python3 awsaudit.py iam-audit --format jsonl
+  python3 awsaudit.py cw-check
+  python3 awsaudit.py prefix-lists --mode console
+'''
+import argparse
+import os
+import runpy
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# subcommand -> (script file, one-line help)
+COMMANDS = {
+    'iam-audit': ('iamuserauditnew.py', "IAM users with AWS vs customer policies and access keys"),
+    'iam-user-audit': ('iamuseraudit.py', "IAM users with groups, managed/inline policies and access keys"),
+    'iam-groups': ('iamgroupaudit.py', "IAM groups with managed and inline policies"),
+    'iam-user-policies': ('iamuserandgrouppolicies.py', "IAM users with direct and group policies"),
+    'iam-roles': ('iamroleaudit.py', "users and roles with last activity, MFA and trusted entities"),
+    'iam-report': ('iam_audit_report.py', "users and roles from the credential report"),
+    'iam-permissions': ('iam_user_combined_permissions.py', "per-user policy documents (text report)"),
+    'iam-service-usage': ('service_last_accessed.py', "services granted vs used per IAM user and role"),
+    'iam-trust': ('iam_trust_graph.py', "who can reach a role through chains of AssumeRole (offline)"),
+    'iam-query': ('iam_policy_engine.py', "offline who-can / actions-for permission queries"),
+    'credentials': ('credential_analytics.py', "inactivity, key age, rotation and MFA gaps from credential reports"),
+    'access-keys': ('access-key-audit.py', "access keys with last used service and date"),
+    'cw-check': ('cwcheck.py', "which instances report CWAgent memory metrics"),
+    'cw-check-one': ('matricsreceivecheck.py', "memory metric check for a single instance"),
+    'mem-report': ('memory_report.py', "memory utilization percentiles and right-sizing candidates"),
+    'missing-status': ('checkstatus.py', "state/platform of instances in missing_instances.txt"),
+    'missing-details': ('get_missing_instance_details.py', "table of instances in missing_instances.txt"),
+    'ecs-tree': ('ecs_tree_view.py', "ECS clusters, container instances, tasks and containers as a tree"),
+    'ecs-details': ('ecs_cluster_details.py', "ECS clusters, container instances, tasks and containers as text"),
+    'tomcat-report': ('atc-conf-check.py', "Tomcat redirect ports on an SSM-managed instance"),
+    'tomcat-dirs': ('javatomcat.py', "Tomcat directories per /home user on an instance"),
+    'prefix-lists': ('prefix_list_locator.py', "locate prefix list IDs from prefix_ids.txt across regions"),
+    'prefix-index': ('prefix_list_index.py', "refresh / query the persistent prefix list index"),
+    'prefix-cidr': ('prefix_list_cidr_index.py', "prefix lists containing an IP or overlapping a CIDR"),
+    'report-delta': ('report_delta.py', "canonical snapshot and delta of a CSV report"),
+    'snapshot': ('snapshot_store.py', "cross-dataset queries over the local SQLite snapshot"),
+    'benchmark': ('benchmark.py', "offline collector benchmarks on synthetic accounts"),
+}
+
+
+def run_script(script, args):
+    """Run a script as __main__ with its own argv, exactly as `python3 <script> args...` would."""
+    path = os.path.join(SCRIPT_DIR, script)
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    sys.argv = [path] + list(args)
+    runpy.run_path(path, run_name='__main__')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="AWS audit toolkit.")
+    sub = parser.add_subparsers(dest='command', metavar='COMMAND')
+    for name, (script, help_text) in COMMANDS.items():
+        sub.add_parser(name, help=help_text, add_help=False)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    # Only the subcommand is parsed here; its own options are left for the script.
+    args, rest = parser.parse_known_args(argv[:1])
+    rest += argv[1:]
+    if args.command is None:
+        parser.print_help()
+        return 2
+    run_script(COMMANDS[args.command][0], rest)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
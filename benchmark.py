@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+'''
+benchmark.py
+
+Offline benchmark of the collectors against synthetic AWS accounts. Nothing here talks
+to AWS: accounts are built inside moto's in-memory backends (SSM instance inventory and
+command invocations, which moto does not model, are served by a botocore Stubber).
+
+Each collector runs in its own child process, so peak memory is not polluted by the
+account setup or by the previous collector. For every collector we record:
+  - API calls per service.operation (from aws_instrumentation, setup excluded)
+  - wall time of the collector alone
+  - peak Python heap (tracemalloc) and the child's max RSS
+
+Results are written as JSON so runs can be compared across versions:
+  python3 benchmark.py --users 10000 --instances 5000 --clusters 200 --ssm-instances 1000
+  python3 benchmark.py --only cwcheck ecs_tree_view --instances 500
+  python3 benchmark.py --compare bench_old.json bench_new.json
+
+Requires: boto3, moto (pip install 'moto[all]').
+'''
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+COLLECTORS = ('cwcheck', 'ecs_tree_view', 'iamuserauditnew', 'access-key-audit', 'atc-conf-check')
+DEFAULT_SIZES = {'users': 1000, 'instances': 500, 'clusters': 20, 'ssm_instances': 100}
+# Which synthetic data each collector needs.
+NEEDS = {
+    'cwcheck': ('instances',),
+    'ecs_tree_view': ('clusters',),
+    'iamuserauditnew': ('users',),
+    'access-key-audit': ('users',),
+    'atc-conf-check': ('ssm_instances',),
+}
+
+
+def _load_script(name):
+    """Import a repo script by file name (some contain '-', so plain import does not work)."""
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), os.path.join(REPO_DIR, name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _run_main(name):
+    """Call a script's main() as if it had been started without arguments."""
+    module = _load_script(name)
+    saved_argv = sys.argv
+    sys.argv = [name + '.py']
+    try:
+        module.main()
+    finally:
+        sys.argv = saved_argv
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# --- synthetic account builders -------------------------------------------------------
+
+def build_iam(boto3, users):
+    iam = boto3.client('iam')
+    policy_doc = json.dumps({'Version': '2012-10-17', 'Statement': [
+        {'Effect': 'Allow', 'Action': 's3:GetObject', 'Resource': '*'}]})
+    policy_arns = [iam.create_policy(PolicyName=f'bench-policy-{i}', PolicyDocument=policy_doc)['Policy']['Arn']
+                   for i in range(20)]
+    groups = [f'bench-group-{i}' for i in range(max(1, users // 50))]
+    for i, group in enumerate(groups):
+        iam.create_group(GroupName=group)
+        iam.attach_group_policy(GroupName=group, PolicyArn=policy_arns[i % len(policy_arns)])
+        iam.put_group_policy(GroupName=group, PolicyName='inline', PolicyDocument=policy_doc)
+    for i in range(users):
+        name = f'bench-user-{i:06d}'
+        iam.create_user(UserName=name)
+        iam.add_user_to_group(GroupName=groups[i % len(groups)], UserName=name)
+        iam.attach_user_policy(UserName=name, PolicyArn=policy_arns[i % len(policy_arns)])
+        if i % 2 == 0:
+            iam.create_access_key(UserName=name)
+
+
+def _run_instances(boto3, count):
+    ec2 = boto3.client('ec2')
+    image_id = ec2.describe_images(Owners=['amazon'])['Images'][0]['ImageId']
+    ids = []
+    for batch in _chunks(range(count), 500):
+        kwargs = {'ImageId': image_id, 'MinCount': len(batch), 'MaxCount': len(batch), 'InstanceType': 't3.micro',
+                  'TagSpecifications': [{'ResourceType': 'instance', 'Tags': [{'Key': 'Name', 'Value': 'bench'}]}]}
+        resp = ec2.run_instances(**kwargs)
+        ids.extend(i['InstanceId'] for i in resp['Instances'])
+    return ids
+
+
+def build_ec2_metrics(boto3, instances, reporting_ratio=0.8):
+    """EC2 instances, `reporting_ratio` of which publish CWAgent mem_used_percent."""
+    ids = _run_instances(boto3, instances)
+    cloudwatch = boto3.client('cloudwatch')
+    reporting = ids[:int(len(ids) * reporting_ratio)]
+    now = datetime.utcnow()
+    for batch in _chunks(reporting, 20):
+        cloudwatch.put_metric_data(Namespace='CWAgent', MetricData=[
+            {'MetricName': 'mem_used_percent', 'Dimensions': [{'Name': 'InstanceId', 'Value': iid}],
+             'Timestamp': now, 'Value': 42.0, 'Unit': 'Percent'} for iid in batch])
+    return ids
+
+
+def build_ecs(boto3, clusters, instances_per_cluster=2, tasks_per_instance=2):
+    ecs = boto3.client('ecs')
+    ec2_ids = _run_instances(boto3, clusters * instances_per_cluster)
+    ecs.register_task_definition(family='bench', containerDefinitions=[
+        {'name': 'app', 'image': 'nginx:latest', 'memory': 128,
+         'portMappings': [{'containerPort': 80, 'hostPort': 80}]}])
+    for c in range(clusters):
+        cluster = f'bench-cluster-{c:04d}'
+        ecs.create_cluster(clusterName=cluster)
+        for iid in ec2_ids[c * instances_per_cluster:(c + 1) * instances_per_cluster]:
+            identity = json.dumps({'instanceId': iid})
+            ecs.register_container_instance(cluster=cluster, instanceIdentityDocument=identity)
+        ecs.run_task(cluster=cluster, taskDefinition='bench', count=instances_per_cluster * tasks_per_instance)
+
+
+def build_ssm_stub(boto3, ssm_instances, passes=2, wide_every=10):
+    """
+    Return a Stubber-backed SSM client whose inventory lists `ssm_instances` real moto EC2
+    instances, with the responses atc-conf-check.py's inspect_instances() asks for queued
+    for `passes` runs: per 50 instances one send_command and one list_command_invocations
+    for the fingerprints, a get_command_invocation re-read for every `wide_every`-th
+    instance (enough JVM sockets to pass the list output limit), and on the first run
+    only (nothing cached yet) a send_command/get_command_invocation full scan per instance.
+    """
+    from botocore.stub import Stubber
+    ids = _run_instances(boto3, ssm_instances)
+    ssm = boto3.client('ssm')
+    stubber = Stubber(ssm)
+    pages = list(_chunks(ids, 50))
+    for n, page in enumerate(pages):
+        response = {'InstanceInformationList': [
+            {'InstanceId': iid, 'PingStatus': 'Online', 'PlatformName': 'Amazon Linux'} for iid in page]}
+        if n + 1 < len(pages):
+            response['NextToken'] = str(n + 1)
+        stubber.add_response('describe_instance_information', response)
+
+    def fingerprint(n):
+        sockets = 80 if n % wide_every == 0 else 2
+        return ('0' * 64 + '\nmem 16303420\n'
+                + ''.join(f"proc {8443 + p} {1000 + p // 2} 2097152 3600 2048 120 400\n" for p in range(sockets)))
+
+    csv_out = 'username,tomcat_home,redirect_port,status,picked_serverxml\n"app","/home/app/tomcat","8443","running","/home/app/tomcat/conf/server.xml"\n'
+    for run in range(passes):
+        for c, chunk in enumerate(_chunks(list(enumerate(ids)), 50)):
+            stubber.add_response('send_command', {'Command': {'CommandId': f'00000001-0000-0000-{run:04d}-{c:012d}'}})
+            stubber.add_response('list_command_invocations', {'CommandInvocations': [
+                {'InstanceId': iid, 'Status': 'Success',
+                 'CommandPlugins': [{'Output': fingerprint(n)[:2500]}]} for n, iid in chunk]})
+            for n, iid in chunk:
+                if len(fingerprint(n)) >= 2500 - 100:
+                    stubber.add_response('get_command_invocation', {
+                        'Status': 'Success', 'StandardOutputContent': fingerprint(n), 'StandardErrorContent': ''})
+        if run == 0:
+            for n, iid in enumerate(ids):
+                stubber.add_response('send_command', {'Command': {'CommandId': f'00000002-0000-0000-0000-{n:012d}'}})
+                stubber.add_response('get_command_invocation', {'Status': 'Success', 'StandardOutputContent': csv_out,
+                                                                'StandardErrorContent': ''})
+    stubber.activate()
+    return ssm
+
+
+# --- collector runners ---------------------------------------------------------------
+
+def run_cwcheck(boto3, context):
+    _run_main('cwcheck')
+
+
+def run_ecs_tree_view(boto3, context):
+    _run_main('ecs_tree_view')
+
+
+def run_iamuserauditnew(boto3, context):
+    for _ in _load_script('iamuserauditnew').get_iam_details():
+        pass
+
+
+def run_access_key_audit(boto3, context):
+    _run_main('access-key-audit')
+
+
+def run_atc_conf_check(boto3, context):
+    """Two --all runs as main() does them: the first scans every host, the second reuses the fingerprint cache."""
+    atc = _load_script('atc-conf-check')
+    atc.SSM_POLL_INTERVAL = 0  # the stubbed invocations are already complete
+    ssm, ec2 = context['ssm'], boto3.client('ec2')
+    ids = [i['InstanceId'] for i in atc.list_ssm_instances(ssm, ec2) if i['PingStatus'] == 'Online']
+    cache = {}
+    for _ in range(2):
+        for instance_id, output, _ in atc.inspect_instances(ssm, ids, cache):
+            atc.footprint_rollup(instance_id, instance_id, output)
+
+
+RUNNERS = {
+    'cwcheck': run_cwcheck,
+    'ecs_tree_view': run_ecs_tree_view,
+    'iamuserauditnew': run_iamuserauditnew,
+    'access-key-audit': run_access_key_audit,
+    'atc-conf-check': run_atc_conf_check,
+}
+
+
+def run_one(collector, sizes):
+    """Child-process entry point: build the account, run one collector, return its metrics."""
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    for var in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_SESSION_TOKEN'):
+        os.environ[var] = 'testing'
+    # The collectors install the instrumentation themselves; keep their exit summary quiet.
+    os.environ['AWS_METRICS'] = '0'
+    # Pacing against moto would only measure the governor's token buckets.
+    os.environ['AWS_GOVERNOR'] = '0'
+    sys.path.insert(0, REPO_DIR)
+    import boto3
+    import aws_instrumentation
+    from moto import mock_aws
+
+    with mock_aws():
+        # mock_aws() replaces boto3's default session, so instrument the one it installed.
+        aws_instrumentation.install(summary=False)
+        context = {}
+        needs = NEEDS[collector]
+        if 'users' in needs:
+            build_iam(boto3, sizes['users'])
+        if 'instances' in needs:
+            build_ec2_metrics(boto3, sizes['instances'])
+        if 'clusters' in needs:
+            build_ecs(boto3, sizes['clusters'])
+        if 'ssm_instances' in needs:
+            context['ssm'] = build_ssm_stub(boto3, sizes['ssm_instances'])
+
+        aws_instrumentation.reset()
+        tracemalloc.start()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            RUNNERS[collector](boto3, context)
+        wall = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    metrics = aws_instrumentation.snapshot()
+    return {
+        'wall_seconds': round(wall, 3),
+        'api_calls': {f"{op['service']}.{op['operation']}": op['calls'] for op in metrics['operations']},
+        'total_api_calls': metrics['totals']['calls'],
+        'peak_python_heap_bytes': peak,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def run_suite(collectors, sizes):
+    results = {}
+    for collector in collectors:
+        print(f"⏱  {collector} ...", flush=True)
+        with tempfile.TemporaryDirectory() as workdir:
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--run-one', collector, '--sizes', json.dumps(sizes)],
+                cwd=workdir, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stderr, file=sys.stderr)
+            results[collector] = {'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'failed'}
+            continue
+        results[collector] = json.loads(proc.stdout.strip().splitlines()[-1])
+        r = results[collector]
+        print(f"   {r['wall_seconds']:.2f}s, {r['total_api_calls']} calls, "
+              f"peak heap {r['peak_python_heap_bytes'] / 1e6:.1f} MB")
+    return results
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=REPO_DIR,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def compare(old_path, new_path):
+    with open(old_path) as fh:
+        old = json.load(fh)
+    with open(new_path) as fh:
+        new = json.load(fh)
+    print(f"{'Collector':<20} {'Metric':<24} {'Old':>14} {'New':>14} {'Change':>9}")
+    for collector in sorted(set(old['results']) | set(new['results'])):
+        o, n = old['results'].get(collector, {}), new['results'].get(collector, {})
+        for metric in ('wall_seconds', 'total_api_calls', 'peak_python_heap_bytes'):
+            if metric not in o or metric not in n:
+                continue
+            change = f"{(n[metric] - o[metric]) / o[metric] * 100:+.1f}%" if o[metric] else 'n/a'
+            print(f"{collector:<20} {metric:<24} {o[metric]:>14} {n[metric]:>14} {change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline collector benchmarks on synthetic AWS accounts.")
+    parser.add_argument('--users', type=int, default=DEFAULT_SIZES['users'])
+    parser.add_argument('--instances', type=int, default=DEFAULT_SIZES['instances'], help="EC2 instances with CWAgent metrics")
+    parser.add_argument('--clusters', type=int, default=DEFAULT_SIZES['clusters'])
+    parser.add_argument('--ssm-instances', type=int, default=DEFAULT_SIZES['ssm_instances'])
+    parser.add_argument('--only', nargs='+', choices=COLLECTORS, help="run only these collectors")
+    parser.add_argument('--output', help="results JSON (default: bench-<timestamp>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two results files")
+    parser.add_argument('--run-one', help=argparse.SUPPRESS)
+    parser.add_argument('--sizes', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.run_one:
+        print(json.dumps(run_one(args.run_one, json.loads(args.sizes))))
+        return
+
+    sizes = {'users': args.users, 'instances': args.instances, 'clusters': args.clusters,
+             'ssm_instances': args.ssm_instances}
+    results = run_suite(args.only or COLLECTORS, sizes)
+    output = args.output or f"bench-{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.json"
+    with open(output, 'w') as fh:
+        json.dump({'version': git_version(), 'timestamp': datetime.utcnow().isoformat() + 'Z',
+                   'python': platform.python_version(), 'sizes': sizes, 'results': results}, fh, indent=2)
+    print(f"\n✅ Results saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+'''
+checkpoint.py
+
+Checkpoint journal for long scans (instances, users, groups, clusters). Every completed
+unit of work is appended to a JSON-lines journal and fsync'ed before the scan moves on,
+so a crash or throttling failure loses at most the unit in flight.
+
+With --resume, units already in the journal are skipped and their stored result is
+replayed in the original order, so the outputs are identical to an uninterrupted run.
+Without --resume an old journal is discarded. The journal is removed once the scan
+completes.
+
+Usage from a script:
+  journal = CheckpointJournal('cwcheck', resume=args.resume)
+  for instance_id in instance_ids:
+      if instance_id in journal:
+          result = journal.get(instance_id)
+      else:
+          result = check(instance_id)
+          journal.record(instance_id, result)
+  journal.complete()
+'''
+import json
+import os
+import threading
+
+CHECKPOINT_DIR = '.checkpoints'
+
+
+class CheckpointJournal(object):
+    def __init__(self, name, resume=False, directory=CHECKPOINT_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, name + '.jsonl')
+        self._done = {}
+        self._lock = threading.Lock()
+        if resume:
+            self._load()
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+        self._fh = open(self.path, 'a', encoding='utf-8')
+        if self._done:
+            print(f"↩️  Resuming: {len(self._done)} unit(s) already completed in {self.path}")
+
+    def _load(self):
+        good_bytes = 0
+        try:
+            with open(self.path, 'rb') as fh:
+                for line in fh:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError('incomplete line')
+                        entry = json.loads(line.decode('utf-8'))
+                    except ValueError:
+                        # A torn last line from a crash mid-write; that unit simply runs again.
+                        break
+                    self._done[entry['unit']] = entry['result']
+                    good_bytes += len(line)
+        except FileNotFoundError:
+            return
+        # Drop the torn tail so new records are not appended onto it.
+        os.truncate(self.path, good_bytes)
+
+    def __contains__(self, unit):
+        return unit in self._done
+
+    def __len__(self):
+        return len(self._done)
+
+    def get(self, unit):
+        return self._done[unit]
+
+    def record(self, unit, result):
+        line = json.dumps({'unit': unit, 'result': result}, default=str) + '\n'
+        with self._lock:
+            self._fh.write(line)
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._done[unit] = result
+
+    def close(self):
+        if not self._fh.closed:
+            self._fh.close()
+
+    def complete(self):
+        """The scan finished: the journal is no longer needed."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def journaled_units(name, directory=CHECKPOINT_DIR):
+    """Number of units a --resume run would skip; reads the journal without touching it (for --plan)."""
+    try:
+        with open(os.path.join(directory, name + '.jsonl'), 'rb') as fh:
+            return sum(1 for line in fh if line.endswith(b'\n'))
+    except FileNotFoundError:
+        return 0
+
+
+def add_resume_argument(parser):
+    parser.add_argument('--resume', action='store_true',
+                        help="skip units completed by an interrupted previous run")
+    return parser
@@ -1,21 +1,30 @@
 import boto3
+import aws_instrumentation
 
-# Initialize EC2 client
-ec2 = boto3.client('ec2')
+def read_instance_ids(path='missing_instances.txt'):
+    with open(path, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
 
-# Read instance IDs from file
-with open('missing_instances.txt', 'r') as f:
-    instance_ids = [line.strip() for line in f if line.strip()]
+def main():
+    aws_instrumentation.install()
+    # Initialize EC2 client
+    ec2 = boto3.client('ec2')
 
-# Describe instances
-response = ec2.describe_instances(InstanceIds=instance_ids)
+    # Read instance IDs from file
+    instance_ids = read_instance_ids()
 
-print("\nInstance Info:\n")
-for reservation in response['Reservations']:
-    for instance in reservation['Instances']:
-        instance_id = instance['InstanceId']
-        state = instance['State']['Name']
-        platform = instance.get('Platform', 'Linux/Other')  # Windows shows explicitly, others don't
-        print(f"- Instance ID: {instance_id}")
-        print(f"  Platform: {platform}")
-        print(f"  State   : {state}\n")
+    # Describe instances
+    response = ec2.describe_instances(InstanceIds=instance_ids)
+
+    print("\nInstance Info:\n")
+    for reservation in response['Reservations']:
+        for instance in reservation['Instances']:
+            instance_id = instance['InstanceId']
+            state = instance['State']['Name']
+            platform = instance.get('Platform', 'Linux/Other')  # Windows shows explicitly, others don't
+            print(f"- Instance ID: {instance_id}")
+            print(f"  Platform: {platform}")
+            print(f"  State   : {state}\n")
+
+if __name__ == '__main__':
+    main()
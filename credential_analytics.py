@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+'''
+credential_analytics.py
+
+Stale-credential analytics over IAM credential reports, for one account or many at
+once (e.g. the reports of every account in the organization). iamroleaudit.py and
+iam_audit_report.py walk the report row by row; here the reports are loaded into
+columns (NumPy arrays, timestamps parsed to epoch seconds, booleans as bool arrays) and
+every rule is one vectorized expression over all users of all accounts.
+
+Findings per user:
+  inactive               no console or key use for INACTIVE_DAYS (and older than that)
+  console-without-mfa    password enabled, no MFA device
+  unrotated-key          active access key older than ROTATION_DAYS
+  stale-key              active access key unused (or never used) for INACTIVE_DAYS
+  root-access-key        the root user has an active access key
+  root-without-mfa       the root user has no MFA device
+
+Output: a per-account summary (printed and written as credential_summary.csv) and the
+flagged principals (credential_findings.csv).
+
+Usage:
+  python3 credential_analytics.py                              # this account's report
+  python3 credential_analytics.py reports/*.csv --inactive-days 60 --rotation-days 90
+  python3 credential_analytics.py --save credential_report.csv # also keep the fetched report
+
+Requires: numpy.
+'''
+import argparse
+import csv
+import io
+import sys
+import time
+from datetime import datetime, timezone
+
+from report_writers import add_format_argument, open_report_writer, output_path
+
+INACTIVE_DAYS = 90
+ROTATION_DAYS = 90
+ROOT_USER = '<root_account>'
+NEVER = -1  # epoch seconds stand-in for 'N/A' / 'no_information' / 'not_supported'
+DIGITS = (0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18)  # digit positions in 'YYYY-MM-DDTHH:MM:SS'
+
+TIMESTAMP_COLUMNS = ('user_creation_time', 'password_last_used', 'access_key_1_last_rotated',
+                     'access_key_1_last_used_date', 'access_key_2_last_rotated', 'access_key_2_last_used_date')
+FLAG_COLUMNS = ('password_enabled', 'mfa_active', 'access_key_1_active', 'access_key_2_active')
+
+SUMMARY_HEADERS = ['Account', 'Users', 'ConsoleUsers', 'ConsoleWithoutMfa', 'Inactive', 'ActiveKeys',
+                   'UnrotatedKeys', 'StaleKeys', 'MaxKeyAgeDays', 'RootFindings']
+FINDING_HEADERS = ['Account', 'User', 'Finding', 'Days', 'Detail']
+
+
+def _epoch_seconds(chars, np):
+    """
+    Epoch seconds from a (rows x 14) matrix of the DIGITS characters minus ord('0'); NEVER for
+    rows that do not start with a digit ('N/A', 'no_information', 'not_supported'). Every
+    report timestamp is UTC ('...+00:00'), so the digits are read from fixed positions.
+    """
+    dated = (chars[:, 0] >= 0) & (chars[:, 0] <= 9)
+
+    def number(start, width):
+        value = chars[:, start]
+        for i in range(start + 1, start + width):
+            value = value * 10 + chars[:, i]
+        return value
+
+    year, month, day = number(0, 4), number(4, 2), number(6, 2)
+    # Days since 1970-01-01 from the civil date (H. Hinnant's days_from_civil).
+    year = year - (month <= 2)
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    days = era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+    seconds = days * 86400 + number(8, 2) * 3600 + number(10, 2) * 60 + number(12, 2)
+    return np.where(dated, seconds, NEVER)
+
+
+def _read_fields(header, body, np):
+    """
+    Columns of an unquoted report located on the raw bytes: every ',' / newline is a field
+    boundary, so field k of row r is the (r * columns + k)-th one. None if the report has
+    quoted fields (user names may contain commas), which go through the csv module instead.
+    """
+    if '"' in body:
+        return None
+    raw = body.encode('utf-8')
+    data = np.frombuffer(raw, dtype=np.uint8)
+    bounds = np.flatnonzero((data == ord(',')) | (data == ord('\n')))
+    count = len(bounds) + 1 if body else 0
+    if count % len(header):
+        return None
+    starts = np.concatenate(([0], bounds + 1))[:count].reshape(-1, len(header))
+    ends = np.append(bounds, len(data))[:count].reshape(-1, len(header))
+    last = max(len(data) - 1, 0)
+    data = data if len(data) else np.zeros(1, dtype=np.uint8)
+    position = {name: k for k, name in enumerate(header)}
+    rows = len(starts)
+
+    def strings(name, limit=None):
+        if name not in position:
+            return np.full(rows, '', dtype=object)[:limit]
+        k = position[name]
+        return np.array([raw[a:b].decode('utf-8') for a, b in zip(starts[:limit, k].tolist(),
+                                                                   ends[:limit, k].tolist())], dtype=object)
+
+    def flag(name):
+        if name not in position:
+            return np.zeros(rows, dtype=bool)
+        k = position[name]
+        # 'true' / 'false' / 'not_supported': the first character decides.
+        return (ends[:, k] > starts[:, k]) & (data[np.minimum(starts[:, k], last)] == ord('t'))
+
+    def timestamps(name):
+        if name not in position:
+            return np.full(rows, NEVER, dtype=np.int64)
+        k = position[name]
+        chars = data[np.minimum(starts[:, k, None] + np.array(DIGITS), last)].astype(np.int64) - ord('0')
+        chars[ends[:, k] - starts[:, k] < 19, 0] = -1
+        return _epoch_seconds(chars, np)
+
+    return strings, flag, timestamps
+
+
+def _read_quoted(header, body, np):
+    """The same accessors as _read_fields() for a report that needs the csv module."""
+    rows = list(csv.reader(io.StringIO(body)))
+    columns = dict(zip(header, (list(c) for c in zip(*rows))))
+
+    def strings(name, limit=None):
+        return np.array(columns.get(name, [''] * len(rows))[:limit], dtype=object)
+
+    def flag(name):
+        return np.array(columns.get(name, [''] * len(rows)), dtype='U1') == 't'
+
+    def timestamps(name):
+        text = np.array(columns.get(name, [''] * len(rows)), dtype='U19')
+        chars = text.view(np.uint32).reshape(len(text), 19)[:, DIGITS].astype(np.int64) - ord('0')
+        return _epoch_seconds(chars, np)
+
+    return strings, flag, timestamps
+
+
+def load_columns(reports, np):
+    """
+    Credential report CSV texts -> dict of equal-length columns: 'user' and 'account' as
+    object arrays, FLAG_COLUMNS as bool arrays, TIMESTAMP_COLUMNS as int64 epoch seconds
+    (NEVER where the report has no date).
+    """
+    parts = []
+    for text in reports:
+        first, _, body = text.replace('\r\n', '\n').rstrip('\n').partition('\n')
+        header = first.split(',')
+        strings, flag, timestamps = _read_fields(header, body, np) or _read_quoted(header, body, np)
+        report = {'user': strings('user')}
+        # One report is one account; its ID is in every ARN, so the first one is enough.
+        arns = strings('arn', 1)
+        arn = arns[0] if len(arns) else ''
+        report['account'] = np.full(len(report['user']), arn.split(':')[4] if arn.count(':') >= 5 else '',
+                                    dtype=object)
+        report.update((name, flag(name)) for name in FLAG_COLUMNS)
+        report.update((name, timestamps(name)) for name in TIMESTAMP_COLUMNS)
+        parts.append(report)
+    if not parts:
+        return {}
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def analyse(cols, now, inactive_days, rotation_days, np):
+    """Vectorized per-user metrics and finding masks over the columns from load_columns()."""
+    day = 86400.0
+    is_root = cols['user'] == ROOT_USER
+
+    used = np.stack([cols['password_last_used'], cols['access_key_1_last_used_date'],
+                     cols['access_key_2_last_used_date']])
+    last_activity = used.max(axis=0)
+    # Never used: measure inactivity from the creation time instead.
+    since = np.where(last_activity == NEVER, cols['user_creation_time'], last_activity)
+    inactive_for = np.where(since == NEVER, np.nan, (now - since) / day)
+
+    result = {
+        'inactive_for': inactive_for,
+        'inactive': ~is_root & (inactive_for > inactive_days),
+        'console_without_mfa': ~is_root & cols['password_enabled'] & ~cols['mfa_active'],
+        'root_access_key': is_root & (cols['access_key_1_active'] | cols['access_key_2_active']),
+        'root_without_mfa': is_root & ~cols['mfa_active'],
+    }
+    for n in ('1', '2'):
+        active = cols[f'access_key_{n}_active']
+        rotated = cols[f'access_key_{n}_last_rotated']
+        last_used = cols[f'access_key_{n}_last_used_date']
+        age = np.where(active & (rotated != NEVER), (now - rotated) / day, np.nan)
+        unused_since = np.where(last_used == NEVER, rotated, last_used)
+        idle = np.where(active & (unused_since != NEVER), (now - unused_since) / day, np.nan)
+        with np.errstate(invalid='ignore'):
+            result[f'key_{n}_age'] = age
+            result[f'key_{n}_idle'] = idle
+            result[f'key_{n}_unrotated'] = age > rotation_days
+            result[f'key_{n}_stale'] = idle > inactive_days
+    return result
+
+
+def summarize(cols, result, np):
+    """SUMMARY_HEADERS rows, one per account plus a total, from grouped sums of the masks."""
+    accounts, group = np.unique(cols['account'].astype(str), return_inverse=True)
+    count = len(accounts)
+
+    def per_account(mask):
+        return np.bincount(group, weights=mask.astype(np.int64), minlength=count).astype(np.int64)
+
+    is_user = cols['user'] != ROOT_USER
+    key_ages = np.fmax(result['key_1_age'], result['key_2_age'])
+    max_age = np.full(count, np.nan)
+    with np.errstate(invalid='ignore'):
+        valid = ~np.isnan(key_ages)
+        np.fmax.at(max_age, group[valid], key_ages[valid])
+    columns = [
+        per_account(is_user),
+        per_account(is_user & cols['password_enabled']),
+        per_account(result['console_without_mfa']),
+        per_account(result['inactive']),
+        per_account(cols['access_key_1_active']) + per_account(cols['access_key_2_active']),
+        per_account(result['key_1_unrotated']) + per_account(result['key_2_unrotated']),
+        per_account(result['key_1_stale']) + per_account(result['key_2_stale']),
+        max_age,
+        per_account(result['root_access_key']) + per_account(result['root_without_mfa']),
+    ]
+    rows = [[account] + [_fmt(column[i]) for column in columns] for i, account in enumerate(accounts)]
+    totals = [_fmt(column.sum()) for column in columns]
+    totals[7] = _fmt(np.nanmax(max_age)) if valid.any() else ''
+    return rows + [['TOTAL'] + totals]
+
+
+def findings(cols, result, np):
+    """FINDING_HEADERS rows for every flagged user, built from np.flatnonzero of each mask."""
+    rules = [
+        ('inactive', result['inactive'], result['inactive_for'], ''),
+        ('console-without-mfa', result['console_without_mfa'], None, ''),
+        ('root-access-key', result['root_access_key'], None, ''),
+        ('root-without-mfa', result['root_without_mfa'], None, ''),
+    ]
+    for n in ('1', '2'):
+        rules.append(('unrotated-key', result[f'key_{n}_unrotated'], result[f'key_{n}_age'], f"access key {n}"))
+        rules.append(('stale-key', result[f'key_{n}_stale'], result[f'key_{n}_idle'], f"access key {n}"))
+    for name, mask, days, detail in rules:
+        for i in np.flatnonzero(mask):
+            yield [cols['account'][i], cols['user'][i], name, '' if days is None else _fmt(days[i]), detail]
+
+
+def _fmt(value):
+    if isinstance(value, float) and value != value:
+        return ''
+    return str(int(value))
+
+
+def print_table(headers, rows):
+    widths = [max(len(h), *(len(str(row[i])) for row in rows)) for i, h in enumerate(headers)]
+    print('  ' + '  '.join(h.ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print('  ' + '  '.join(str(v).ljust(w) for v, w in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inactivity, key age, rotation and MFA gaps from credential reports.")
+    parser.add_argument('reports', nargs='*', help="credential report CSV files (default: fetch this account's)")
+    parser.add_argument('--inactive-days', type=int, default=INACTIVE_DAYS, help="inactivity threshold")
+    parser.add_argument('--rotation-days', type=int, default=ROTATION_DAYS, help="access key rotation SLA")
+    parser.add_argument('--save', metavar='FILE', help="also save the fetched credential report")
+    add_format_argument(parser)
+    args = parser.parse_args()
+
+    try:
+        import numpy as np
+    except ImportError:
+        print("credential_analytics.py requires numpy (pip install numpy)", file=sys.stderr)
+        sys.exit(1)
+
+    if args.reports:
+        reports = []
+        for path in args.reports:
+            with open(path, 'r', encoding='utf-8') as fh:
+                reports.append(fh.read())
+    else:
+        import aws_instrumentation
+        from iamroleaudit import get_credential_report
+        aws_instrumentation.install()
+        reports = [get_credential_report()]
+        if args.save:
+            with open(args.save, 'w', encoding='utf-8') as fh:
+                fh.write(reports[0])
+
+    started = time.perf_counter()
+    cols = load_columns(reports, np)
+    loaded = time.perf_counter()
+    now = int(datetime.now(timezone.utc).timestamp())
+    result = analyse(cols, now, args.inactive_days, args.rotation_days, np)
+    summary = summarize(cols, result, np)
+    flagged = list(findings(cols, result, np))
+    elapsed = time.perf_counter() - started
+
+    print_table(SUMMARY_HEADERS, summary)
+    summary_file = output_path('credential_summary.csv', args.format)
+    with open_report_writer(summary_file, SUMMARY_HEADERS, args.format) as writer:
+        writer.write_rows(summary[:-1])
+    findings_file = output_path('credential_findings.csv', args.format)
+    with open_report_writer(findings_file, FINDING_HEADERS, args.format) as writer:
+        writer.write_rows(flagged)
+
+    rows = len(cols['user'])
+    print(f"\n⚙️  {rows} credential report row(s) from {len(reports)} report(s) analysed in {elapsed:.2f}s "
+          f"(parse {loaded - started:.2f}s, {rows / elapsed if elapsed else 0:,.0f} rows/s)")
+    print(f"✅ {len(flagged)} finding(s) saved to '{findings_file}', summary to '{summary_file}'")
+
+
+if __name__ == '__main__':
+    main()
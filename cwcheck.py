@@ -1,14 +1,17 @@
+import argparse
 import boto3
+import aws_instrumentation
+import tracing
+from aws_governor import is_throttle_error
+from api_plan import ApiPlan, add_plan_argument, pages
+from checkpoint import CheckpointJournal, add_resume_argument, journaled_units
+from get_missing_instance_details import ENRICH_HEADERS, EnrichmentPipeline
+from matricsreceivecheck import GET_METRIC_DATA_MAX_QUERIES, discover_memory_metrics
+from report_writers import open_report_writer
+from snapshot_store import add_snapshot_argument, record
 from datetime import datetime, timedelta
 
-ec2 = boto3.client('ec2')
-cloudwatch = boto3.client('cloudwatch')
-
-# Output files
-working_file = open("working_instances.txt", "w")
-missing_file = open("missing_instances.txt", "w")
-
-def get_all_instance_ids():
+def get_all_instance_ids(ec2):
     instance_ids = []
     paginator = ec2.get_paginator('describe_instances')
     for page in paginator.paginate():
@@ -17,7 +20,7 @@ def get_all_instance_ids():
                 instance_ids.append(instance['InstanceId'])
     return instance_ids
 
-def has_recent_datapoints(metric):
+def has_recent_datapoints(cloudwatch, metric):
     end_time = datetime.utcnow()
     start_time = end_time - timedelta(minutes=15)
     response = cloudwatch.get_metric_statistics(
@@ -31,7 +34,7 @@ def has_recent_datapoints(metric):
     )
     return len(response['Datapoints']) > 0
 
-def check_instance_metrics(instance_id):
+def check_instance_metrics(cloudwatch, instance_id):
     print(f"\n🔍 Checking memory-related metrics for instance: {instance_id}")
     metrics = cloudwatch.list_metrics(Dimensions=[{'Name': 'InstanceId', 'Value': instance_id}])
     found = False
@@ -39,7 +42,7 @@ def check_instance_metrics(instance_id):
         name = m['MetricName'].lower()
         if 'mem' in name or 'memory' in name:
             print(f"  📊 Found metric: {m['MetricName']} (Namespace: {m['Namespace']})")
-            if has_recent_datapoints(m):
+            if has_recent_datapoints(cloudwatch, m):
                 print("    ✅ Receiving data.")
                 return True
             else:
@@ -49,21 +52,125 @@ def check_instance_metrics(instance_id):
         print("  ⚠️ No memory-related metrics found.")
     return False
 
-# Main process
-instance_ids = get_all_instance_ids()
-print(f"🔎 Total instances found: {len(instance_ids)}")
-
-for instance_id in instance_ids:
+def check_instance(cloudwatch, instance_id):
+    """True/False for working/missing, None when throttled even after retries (unknown, not missing)."""
     try:
-        if check_instance_metrics(instance_id):
-            working_file.write(instance_id + "\n")
-        else:
-            missing_file.write(instance_id + "\n")
+        return check_instance_metrics(cloudwatch, instance_id)
     except Exception as e:
+        if is_throttle_error(e):
+            return None
         print(f"  ⚠️ Error checking instance {instance_id}: {e}")
-        missing_file.write(instance_id + "\n")
+        return False
+
+def plan_checks(cloudwatch, instance_ids, resume=False):
+    """
+    --plan: estimate the per-instance checks from one paginated list_metrics over the agent
+    namespace (which instances publish a memory metric) instead of one call per instance.
+    """
+    found = discover_memory_metrics(cloudwatch, instance_ids)
+    journaled = journaled_units('cwcheck')
+    share = (len(instance_ids) - journaled) / len(instance_ids) if resume and instance_ids else 1
+    plan = ApiPlan('cwcheck.py')
+    plan.add('ec2', 'DescribeInstances', pages(len(instance_ids), 1000))
+    plan.add('cloudwatch', 'ListMetrics', len(instance_ids) * share)
+    # At least one per instance with a memory metric (more when its first metric is stale).
+    plan.add('cloudwatch', 'GetMetricStatistics', len(found) * share)
+    plan.note(f"{len(instance_ids)} instance(s), {len(found)} publish a CWAgent memory metric")
+    if journaled:
+        plan.note(f"{journaled} instance(s) are in the checkpoint journal: "
+                  + ("skipped with --resume" if resume else "--resume would skip them"))
+    batched = 1 + pages(len(found), GET_METRIC_DATA_MAX_QUERIES)
+    plan.note(f"batched alternative (matricsreceivecheck.py --watch / memory_report.py): about {batched} "
+              f"list_metrics + get_metric_data call(s)")
+    return plan
+
+def main():
+    aws_instrumentation.install()
+    parser = argparse.ArgumentParser(description="Check CWAgent memory metrics for every instance.")
+    parser.add_argument('--enrich', action='store_true',
+                        help="describe missing instances (state, platform, Name, SSM ping) while the scan runs, "
+                             "into missing_instances_details.csv")
+    args = tracing.add_trace_arguments(
+        add_plan_argument(add_snapshot_argument(add_resume_argument(parser)))).parse_args()
+    tracing.setup(args)
+    ec2 = boto3.client('ec2')
+    cloudwatch = boto3.client('cloudwatch')
+
+    with tracing.span('list-instances'):
+        instance_ids = get_all_instance_ids(ec2)
+    print(f"🔎 Total instances found: {len(instance_ids)}")
+    if args.plan:
+        plan_checks(cloudwatch, instance_ids, args.resume).report()
+        return
+
+    # Each checked instance is journaled, so --resume replays finished ones instead of re-checking them.
+    journal = CheckpointJournal('cwcheck', resume=args.resume)
+
+    # Results by instance; the files are written once every instance is checked.
+    throttled = []
+    statuses = {}
+    details_writer = pipeline = None
+    if args.enrich:
+        details_writer = open_report_writer('missing_instances_details.csv', ENRICH_HEADERS, 'csv')
+        pipeline = EnrichmentPipeline(ec2, boto3.client('ssm'), details_writer)
+
+    def record_result(instance_id, working):
+        statuses[instance_id] = 'working' if working else 'missing'
+        if pipeline is not None and not working:
+            pipeline.put(instance_id)
+
+    for instance_id in instance_ids:
+        if instance_id in journal:
+            working = journal.get(instance_id)
+        else:
+            with tracing.span('check-instance', instance=instance_id):
+                working = check_instance(cloudwatch, instance_id)
+            if working is None:
+                print(f"  ⏳ Throttled checking {instance_id}; will retry at the end.")
+                throttled.append(instance_id)
+                continue
+            journal.record(instance_id, working)
+        record_result(instance_id, working)
+
+    # One more pass once the governor has backed off; whatever is still throttled stays unknown.
+    still_throttled = []
+    for instance_id in throttled:
+        with tracing.span('recheck-throttled', instance=instance_id):
+            working = check_instance(cloudwatch, instance_id)
+        if working is None:
+            still_throttled.append(instance_id)
+            continue
+        journal.record(instance_id, working)
+        record_result(instance_id, working)
+
+    # Written in instance_ids order, so rechecked and --resume runs match an uninterrupted one.
+    with open("working_instances.txt", "w") as working_file, open("missing_instances.txt", "w") as missing_file:
+        for instance_id in instance_ids:
+            if instance_id in statuses:
+                (working_file if statuses[instance_id] == 'working' else missing_file).write(instance_id + "\n")
+
+    if pipeline is not None:
+        with tracing.span('enrich-drain'):
+            enriched = pipeline.close()
+            details_writer.close()
+        print(f"📋 {enriched} missing instance(s) described in 'missing_instances_details.csv'")
+
+    if args.snapshot:
+        statuses.update((instance_id, 'throttled') for instance_id in still_throttled)
+        with tracing.span('snapshot'):
+            record('cw_memory', [[i, statuses[i]] for i in instance_ids if i in statuses])
+
+    if still_throttled:
+        with open("throttled_instances.txt", "w") as throttled_file:
+            throttled_file.writelines(instance_id + "\n" for instance_id in still_throttled)
+        # Not journaled, so --resume checks them again.
+        print(f"\n⏳ {len(still_throttled)} instance(s) could not be checked (throttled): see 'throttled_instances.txt'."
+              " Re-run with --resume to check them.")
+        journal.close()
+        return
 
-working_file.close()
-missing_file.close()
+    journal.complete()
+    print("\n✅ Done! Results saved in 'working_instances.txt' and 'missing_instances.txt'")
 
-print("\n✅ Done! Results saved in 'working_instances.txt' and 'missing_instances.txt'")
+if __name__ == "__main__":
+    main()
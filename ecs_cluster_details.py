@@ -1,69 +1,94 @@
+import argparse
 import boto3
+import aws_instrumentation
+import tracing
+from checkpoint import CheckpointJournal, add_resume_argument
 import json
 
-ecs = boto3.client('ecs')
-ec2 = boto3.client('ec2')
-
-def list_clusters():
+def list_clusters(ecs):
     return ecs.list_clusters()['clusterArns']
 
-def list_container_instances(cluster):
+def list_container_instances(ecs, cluster):
     resp = ecs.list_container_instances(cluster=cluster)
     return resp.get('containerInstanceArns', [])
 
-def describe_container_instances(cluster, instance_arns):
+def describe_container_instances(ecs, cluster, instance_arns):
     if not instance_arns:
         return []
     return ecs.describe_container_instances(cluster=cluster, containerInstances=instance_arns)['containerInstances']
 
-def list_tasks(cluster, container_instance_arn):
+def list_tasks(ecs, cluster, container_instance_arn):
     return ecs.list_tasks(cluster=cluster, containerInstance=container_instance_arn).get('taskArns', [])
 
-def describe_tasks(cluster, task_arns):
+def describe_tasks(ecs, cluster, task_arns):
     if not task_arns:
         return []
     return ecs.describe_tasks(cluster=cluster, tasks=task_arns)['tasks']
 
-def get_task_def_details(task_def_arn):
+def get_task_def_details(ecs, task_def_arn):
     return ecs.describe_task_definition(taskDefinition=task_def_arn)['taskDefinition']
 
-def get_ec2_instance_ids(container_instances):
+def get_ec2_instance_ids(ec2, container_instances):
     ec2_ids = [ci['ec2InstanceId'] for ci in container_instances if 'ec2InstanceId' in ci]
     return ec2.describe_instances(InstanceIds=ec2_ids)['Reservations'] if ec2_ids else []
 
-def format_output():
-    clusters = list_clusters()
+def cluster_lines(ecs, cluster):
+    """The report lines for one cluster (journaled for --resume)."""
+    lines = [f"\nCluster: {cluster}"]
+    container_instance_arns = list_container_instances(ecs, cluster)
+    container_instances = describe_container_instances(ecs, cluster, container_instance_arns)
+
+    for ci in container_instances:
+        ec2_id = ci.get('ec2InstanceId', 'Unknown')
+        lines.append(f"  ContainerInstance: {ci['containerInstanceArn'].split('/')[-1]}")
+        lines.append(f"    EC2 Instance ID: {ec2_id}")
+
+        task_arns = list_tasks(ecs, cluster, ci['containerInstanceArn'])
+        tasks = describe_tasks(ecs, cluster, task_arns)
+
+        for task in tasks:
+            task_id = task['taskArn'].split('/')[-1]
+            task_def_arn = task['taskDefinitionArn']
+            task_status = task.get('lastStatus')
+            lines.append(f"    Task: {task_id}")
+            lines.append(f"      Task Definition: {task_def_arn.split('/')[-1]}")
+            lines.append(f"      Last Status: {task_status}")
+
+            task_def = get_task_def_details(ecs, task_def_arn)
+            for container_def in task_def.get('containerDefinitions', []):
+                name = container_def.get('name')
+                image = container_def.get('image')
+                ports = [pm['containerPort'] for pm in container_def.get('portMappings', [])]
+                port_list = ', '.join(map(str, ports)) if ports else 'None'
+                lines.append(f"      Container: {name}")
+                lines.append(f"        Image: {image}")
+                lines.append(f"        Ports: {port_list}")
+    return lines
+
+def format_output(resume=False):
+    ecs = boto3.client('ecs')
+    journal = CheckpointJournal('ecs_cluster_details', resume=resume)
+
+    with tracing.span('list-clusters'):
+        clusters = list_clusters(ecs)
 
     for cluster in clusters:
-        print(f"\nCluster: {cluster}")
-        container_instance_arns = list_container_instances(cluster)
-        container_instances = describe_container_instances(cluster, container_instance_arns)
-
-        for ci in container_instances:
-            ec2_id = ci.get('ec2InstanceId', 'Unknown')
-            print(f"  ContainerInstance: {ci['containerInstanceArn'].split('/')[-1]}")
-            print(f"    EC2 Instance ID: {ec2_id}")
-
-            task_arns = list_tasks(cluster, ci['containerInstanceArn'])
-            tasks = describe_tasks(cluster, task_arns)
-
-            for task in tasks:
-                task_id = task['taskArn'].split('/')[-1]
-                task_def_arn = task['taskDefinitionArn']
-                task_status = task.get('lastStatus')
-                print(f"    Task: {task_id}")
-                print(f"      Task Definition: {task_def_arn.split('/')[-1]}")
-                print(f"      Last Status: {task_status}")
-
-                task_def = get_task_def_details(task_def_arn)
-                for container_def in task_def.get('containerDefinitions', []):
-                    name = container_def.get('name')
-                    image = container_def.get('image')
-                    ports = [pm['containerPort'] for pm in container_def.get('portMappings', [])]
-                    port_list = ', '.join(map(str, ports)) if ports else 'None'
-                    print(f"      Container: {name}")
-                    print(f"        Image: {image}")
-                    print(f"        Ports: {port_list}")
+        if cluster in journal:
+            lines = journal.get(cluster)
+        else:
+            with tracing.span('collect-cluster', cluster=cluster):
+                lines = cluster_lines(ecs, cluster)
+            journal.record(cluster, lines)
+        print("\n".join(lines))
+
+    journal.complete()
+
+def main():
+    aws_instrumentation.install()
+    parser = argparse.ArgumentParser(description="ECS clusters, instances, tasks and containers.")
+    args = tracing.add_trace_arguments(add_resume_argument(parser)).parse_args()
+    tracing.setup(args)
+    format_output(args.resume)
 
 if __name__ == "__main__":
-    format_output()
+    main()
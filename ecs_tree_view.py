@@ -1,78 +1,164 @@
+import argparse
 import boto3
-from rich.tree import Tree
-from rich import print
+import aws_instrumentation
+import tracing
+from api_plan import ApiPlan, add_plan_argument, pages
+from checkpoint import CheckpointJournal, add_resume_argument, journaled_units
+from records import intern
+from snapshot_store import add_snapshot_argument, record
 
-ecs = boto3.client('ecs')
-ec2 = boto3.client('ec2')
 
-
-def list_clusters():
+def list_clusters(ecs):
     return ecs.list_clusters()['clusterArns']
 
 
-def list_container_instances(cluster):
+def list_container_instances(ecs, cluster):
     return ecs.list_container_instances(cluster=cluster).get('containerInstanceArns', [])
 
 
-def describe_container_instances(cluster, arns):
+def describe_container_instances(ecs, cluster, arns):
     if not arns:
         return []
     return ecs.describe_container_instances(cluster=cluster, containerInstances=arns)['containerInstances']
 
 
-def list_tasks(cluster, container_instance_arn):
+def list_tasks(ecs, cluster, container_instance_arn):
     return ecs.list_tasks(cluster=cluster, containerInstance=container_instance_arn).get('taskArns', [])
 
 
-def describe_tasks(cluster, arns):
+def describe_tasks(ecs, cluster, arns):
     if not arns:
         return []
     return ecs.describe_tasks(cluster=cluster, tasks=arns)['tasks']
 
 
-def get_task_def(task_def_arn):
+def get_task_def(ecs, task_def_arn):
     return ecs.describe_task_definition(taskDefinition=task_def_arn)['taskDefinition']
 
 
+def collect_cluster(ecs, cluster_arn):
+    """Describe one cluster down to its containers as plain data (journaled for --resume)."""
+    cluster = {'name': cluster_arn.split("/")[-1], 'container_instances': []}
+
+    container_instance_arns = list_container_instances(ecs, cluster_arn)
+    container_instances = describe_container_instances(ecs, cluster_arn, container_instance_arns)
+
+    for ci in container_instances:
+        ci_data = {
+            'id': ci['containerInstanceArn'].split("/")[-1],
+            'ec2_id': ci.get('ec2InstanceId', 'Unknown'),
+            'tasks': [],
+        }
+        cluster['container_instances'].append(ci_data)
+
+        task_arns = list_tasks(ecs, cluster_arn, ci['containerInstanceArn'])
+        tasks = describe_tasks(ecs, cluster_arn, task_arns)
+
+        # Tasks of the same definition repeat the same status, names, images and ports: intern them.
+        for task in tasks:
+            task_def = get_task_def(ecs, task['taskDefinitionArn'])
+            ci_data['tasks'].append({
+                'id': task['taskArn'].split('/')[-1],
+                'status': intern(task.get('lastStatus', 'N/A')),
+                'definition': intern(f"{task_def['family']}:{task_def['revision']}"),
+                'containers': [{
+                    'name': intern(container['name']),
+                    'image': intern(container['image']),
+                    'ports': [intern(str(p['containerPort'])) for p in container.get('portMappings', [])],
+                } for container in task_def.get('containerDefinitions', [])],
+            })
+    return cluster
+
+
+def render_cluster(root_tree, cluster):
+    cluster_tree = root_tree.add(f"[green]Cluster: {cluster['name']}[/]")
+    for ci in cluster['container_instances']:
+        ci_tree = cluster_tree.add(f"[cyan]Container Instance: {ci['id']}[/] (EC2: {ci['ec2_id']})")
+        for task in ci['tasks']:
+            task_tree = ci_tree.add(f"Task: {task['id']} (Status: {task['status']})")
+            task_tree.add(f"[yellow]Task Definition:[/] {task['definition']}")
+            for container in task['containers']:
+                port_str = ", ".join(container['ports']) if container['ports'] else "None"
+                container_tree = task_tree.add(f"Container: {container['name']}")
+                container_tree.add(f"Image: {container['image']}")
+                container_tree.add(f"Ports: {port_str}")
+
+
+def snapshot_rows(cluster):
+    for ci in cluster['container_instances']:
+        yield [cluster['name'], ci['id'], ci['ec2_id'], len(ci['tasks']),
+               ', '.join(task['definition'] for task in ci['tasks'])]
+
+
+def plan_clusters(ecs, resume=False):
+    """--plan: estimate collect_cluster() for every cluster from the counts describe_clusters returns."""
+    cluster_arns = list_clusters(ecs)
+    clusters = []
+    for offset in range(0, len(cluster_arns), 100):
+        clusters.extend(ecs.describe_clusters(clusters=cluster_arns[offset:offset + 100])['clusters'])
+    journaled = journaled_units('ecs_tree_view')
+    if resume and journaled:
+        # The journal is written in list_clusters order, so the first `journaled` clusters are done.
+        done = set(cluster_arns[:journaled])
+        clusters = [c for c in clusters if c['clusterArn'] not in done]
+    instances = sum(c['registeredContainerInstancesCount'] for c in clusters)
+    tasks = sum(c['runningTasksCount'] + c['pendingTasksCount'] for c in clusters)
+
+    plan = ApiPlan('ecs_tree_view.py')
+    plan.add('ecs', 'ListClusters', 1)
+    plan.add('ecs', 'ListContainerInstances', len(clusters))
+    plan.add('ecs', 'DescribeContainerInstances', sum(1 for c in clusters if c['registeredContainerInstancesCount']))
+    plan.add('ecs', 'ListTasks', instances)
+    # At most one per container instance (none for instances without tasks).
+    plan.add('ecs', 'DescribeTasks', min(instances, tasks))
+    plan.add('ecs', 'DescribeTaskDefinition', tasks)
+    plan.note(f"{len(cluster_arns)} cluster(s), {instances} container instance(s), {tasks} task(s) to describe "
+              f"(counts from {pages(len(cluster_arns), 100)} describe_clusters call(s))")
+    if journaled:
+        plan.note(f"{journaled} cluster(s) are in the checkpoint journal: "
+                  + ("skipped with --resume" if resume else "--resume would skip them"))
+    return plan
+
+
 def main():
-    root_tree = Tree("[bold blue]ECS Cluster Overview[/]")
+    aws_instrumentation.install()
+    parser = argparse.ArgumentParser(description="ECS clusters as a tree.")
+    args = tracing.add_trace_arguments(
+        add_plan_argument(add_snapshot_argument(add_resume_argument(parser)))).parse_args()
+    tracing.setup(args)
+    if args.plan:
+        plan_clusters(boto3.client('ecs'), args.resume).report()
+        return
 
-    for cluster_arn in list_clusters():
-        cluster_name = cluster_arn.split("/")[-1]
-        cluster_tree = root_tree.add(f"[green]Cluster: {cluster_name}[/]")
-
-        container_instance_arns = list_container_instances(cluster_arn)
-        container_instances = describe_container_instances(cluster_arn, container_instance_arns)
-
-        for ci in container_instances:
-            ci_id = ci['containerInstanceArn'].split("/")[-1]
-            ec2_id = ci.get('ec2InstanceId', 'Unknown')
-            ci_tree = cluster_tree.add(f"[cyan]Container Instance: {ci_id}[/] (EC2: {ec2_id})")
-
-            task_arns = list_tasks(cluster_arn, ci['containerInstanceArn'])
-            tasks = describe_tasks(cluster_arn, task_arns)
-
-            for task in tasks:
-                task_id = task['taskArn'].split('/')[-1]
-                status = task.get('lastStatus', 'N/A')
-                task_def_arn = task['taskDefinitionArn']
-                task_tree = ci_tree.add(f"Task: {task_id} (Status: {status})")
-
-                task_def = get_task_def(task_def_arn)
-                def_name = task_def['family']
-                def_rev = task_def['revision']
-                task_tree.add(f"[yellow]Task Definition:[/] {def_name}:{def_rev}")
-
-                for container in task_def.get('containerDefinitions', []):
-                    cname = container['name']
-                    image = container['image']
-                    ports = [str(p['containerPort']) for p in container.get('portMappings', [])]
-                    port_str = ", ".join(ports) if ports else "None"
-                    container_tree = task_tree.add(f"Container: {cname}")
-                    container_tree.add(f"Image: {image}")
-                    container_tree.add(f"Ports: {port_str}")
-
-    print(root_tree)
+    # rich is only needed for rendering; import it when the view is actually built.
+    from rich.tree import Tree
+    from rich import print as rich_print
+
+    ecs = boto3.client('ecs')
+
+    root_tree = Tree("[bold blue]ECS Cluster Overview[/]")
+    journal = CheckpointJournal('ecs_tree_view', resume=args.resume)
+    rows = []
+
+    with tracing.span('list-clusters'):
+        cluster_arns = list_clusters(ecs)
+    for cluster_arn in cluster_arns:
+        if cluster_arn in journal:
+            cluster = journal.get(cluster_arn)
+        else:
+            with tracing.span('collect-cluster', cluster=cluster_arn):
+                cluster = collect_cluster(ecs, cluster_arn)
+            journal.record(cluster_arn, cluster)
+        with tracing.span('build-tree', cluster=cluster_arn):
+            render_cluster(root_tree, cluster)
+        rows.extend(snapshot_rows(cluster))
+
+    with tracing.span('print-tree'):
+        rich_print(root_tree)
+    if args.snapshot:
+        with tracing.span('snapshot'):
+            record('ecs_container_instances', rows)
+    journal.complete()
 
 
 if __name__ == "__main__":
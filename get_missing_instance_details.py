@@ -1,22 +1,147 @@
+import queue
+import sys
+import threading
+
 import boto3
+import botocore
+import aws_instrumentation
+import tracing
+
+# Pipeline stage fed by cwcheck.py --enrich: missing instance IDs are enriched in batches
+# (one describe_instances and one describe_instance_information call per batch) while the
+# metric scan is still running. A full queue blocks the scan rather than buffering it all.
+ENRICH_BATCH = 50
+ENRICH_MAX_WAIT = 2.0       # seconds a partial batch waits for more IDs
+ENRICH_QUEUE_SIZE = 500
+ENRICH_PUT_TIMEOUT = 1.0    # seconds between liveness checks while the queue is full
+ENRICH_HEADERS = ['InstanceId', 'State', 'Platform', 'Name', 'PingStatus']
+_DONE = object()
+
+def describe_batch(ec2, ssm, instance_ids):
+    """ENRICH_HEADERS rows for up to ENRICH_BATCH instances (state, platform, Name tag and SSM ping status)."""
+    details = {}
+    try:
+        # A filter instead of InstanceIds: an instance terminated since the scan must not fail the batch.
+        for page in ec2.get_paginator('describe_instances').paginate(
+                Filters=[{'Name': 'instance-id', 'Values': instance_ids}]):
+            for reservation in page['Reservations']:
+                for instance in reservation['Instances']:
+                    tags = {t['Key']: t['Value'] for t in instance.get('Tags', [])}
+                    details[instance['InstanceId']] = (instance['State']['Name'], instance.get('Platform', 'linux'),
+                                                       tags.get('Name', ''))
+    except (botocore.exceptions.ClientError, botocore.exceptions.BotoCoreError) as e:
+        sys.stderr.write(f"Error describing {len(instance_ids)} instance(s): {e}\n")
+        details = {iid: ('unknown', '', '') for iid in instance_ids}
+    pings = {}
+    try:
+        for page in ssm.get_paginator('describe_instance_information').paginate(
+                Filters=[{'Key': 'InstanceIds', 'Values': instance_ids}]):
+            for info in page['InstanceInformationList']:
+                pings[info['InstanceId']] = info.get('PingStatus', '')
+        default_ping = 'not managed'
+    except (botocore.exceptions.ClientError, botocore.exceptions.BotoCoreError) as e:
+        sys.stderr.write(f"Error fetching SSM status of {len(instance_ids)} instance(s): {e}\n")
+        default_ping = 'unknown'
+    return [[iid, *details.get(iid, ('not found', '', '')), pings.get(iid, default_ping)] for iid in instance_ids]
+
+class EnrichmentPipeline(object):
+    """
+    Background enrichment stage: put() instance IDs as they are found, close() when the
+    producer is done. Each batch is written to `writer` as soon as it is enriched. If the
+    stage dies, the next put() or close() raises its error instead of blocking the scan.
+    """
+
+    def __init__(self, ec2, ssm, writer, batch_size=ENRICH_BATCH, max_wait=ENRICH_MAX_WAIT,
+                 queue_size=ENRICH_QUEUE_SIZE):
+        self.ec2 = ec2
+        self.ssm = ssm
+        self.writer = writer
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.enriched = 0
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name='enrich', daemon=True)
+        self.thread.start()
+
+    def put(self, instance_id):
+        self._put(instance_id)
+
+    def close(self):
+        """Flush the last batch and wait for the stage to finish; returns the number of rows written."""
+        self._put(_DONE)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.enriched
+
+    def _check(self):
+        if self.error is not None:
+            raise self.error
+        if not self.thread.is_alive():
+            raise RuntimeError("enrichment stage is not running")
+
+    def _put(self, item):
+        while True:
+            self._check()
+            try:
+                self.queue.put(item, timeout=ENRICH_PUT_TIMEOUT)
+                return
+            except queue.Full:
+                continue
+
+    def _flush(self, batch):
+        with tracing.span('enrich-batch', instances=len(batch)):
+            self.writer.write_rows(describe_batch(self.ec2, self.ssm, batch))
+            self.writer.flush()
+        self.enriched += len(batch)
+
+    def _run(self):
+        try:
+            self._consume()
+        except BaseException as e:
+            self.error = e
+
+    def _consume(self):
+        batch = []
+        while True:
+            try:
+                item = self.queue.get(timeout=self.max_wait if batch else None)
+            except queue.Empty:
+                self._flush(batch)
+                batch = []
+                continue
+            if item is _DONE:
+                break
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+def main():
+    aws_instrumentation.install()
+    ec2 = boto3.client('ec2')
 
-ec2 = boto3.client('ec2')
+    with open("missing_instances.txt", "r") as f:
+        instance_ids = [line.strip() for line in f if line.strip()]
 
-with open("missing_instances.txt", "r") as f:
-    instance_ids = [line.strip() for line in f if line.strip()]
+    print(f"🔍 Found {len(instance_ids)} instances in missing_instances.txt")
 
-print(f"🔍 Found {len(instance_ids)} instances in missing_instances.txt")
+    # Fetch instance details
+    response = ec2.describe_instances(InstanceIds=instance_ids)
 
-# Fetch instance details
-response = ec2.describe_instances(InstanceIds=instance_ids)
+    print("\n📋 Instance Details:")
+    print(f"{'InstanceId':<20} {'State':<10} {'Platform':<10}")
 
-print("\n📋 Instance Details:")
-print(f"{'InstanceId':<20} {'State':<10} {'Platform':<10}")
+    for reservation in response['Reservations']:
+        for instance in reservation['Instances']:
+            instance_id = instance['InstanceId']
+            state = instance['State']['Name']
+            # 'Platform' is only present for Windows, otherwise it's Linux
+            platform = instance.get('Platform', 'linux')
+            print(f"{instance_id:<20} {state:<10} {platform:<10}")
 
-for reservation in response['Reservations']:
-    for instance in reservation['Instances']:
-        instance_id = instance['InstanceId']
-        state = instance['State']['Name']
-        # 'Platform' is only present for Windows, otherwise it's Linux
-        platform = instance.get('Platform', 'linux')
-        print(f"{instance_id:<20} {state:<10} {platform:<10}")
+if __name__ == '__main__':
+    main()
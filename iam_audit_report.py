@@ -2,6 +2,7 @@
 import csv
 import boto3
 import botocore
+import aws_instrumentation
 import io
 import sys
 import time
@@ -44,6 +45,7 @@ def fetch_roles():
     return roles
 
 def main():
+    aws_instrumentation.install()
     # Define the output CSV file name in the script.
     output_filename = 'audit_report.csv'
     
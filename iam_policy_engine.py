@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+'''
+iam_policy_engine.py
+
+Offline effective-permission queries over every IAM user's and role's policies.
+
+`collect` pulls the whole account's authorization details (users, groups, roles and
+managed policy documents) with one paginated GetAccountAuthorizationDetails call and
+saves them to a local JSON snapshot. Every other command works from that snapshot
+only, so questions like "who can call s3:DeleteObject on bucket X" never touch IAM.
+
+Each principal's direct inline, direct managed, group inline and group managed
+statements are compiled into an index keyed by service prefix and lower-cased action
+name. Wildcard actions (s3:Get*, *) and NotAction statements sit in per-service /
+global pattern buckets, so a query only evaluates the handful of statements that can
+possibly match instead of every statement of every principal.
+
+Evaluation follows IAM's identity-policy rules: an explicit Deny wins over any Allow,
+otherwise any Allow grants. Statements with a Condition are kept but flagged; a
+conditional Allow is reported as "conditional" and a conditional Deny does not remove
+an Allow (it may not apply). Without a resource, an Allow counts as "allow" only on
+every resource ('*'); an Allow scoped to some buckets or keys is reported as "partial".
+Likewise only a Deny on '*' removes a principal; a Deny scoped to some resources turns
+an Allow into "partial". Permission boundaries, SCPs and
+resource policies are not evaluated.
+
+The compiled index is cached next to the snapshot (<snapshot>.index.pickle) and reused
+until the snapshot (or this module) changes, so repeated queries skip parsing and
+indexing the snapshot.
+
+Usage:
+  python3 iam_policy_engine.py collect
+  python3 iam_policy_engine.py who-can s3:DeleteObject arn:aws:s3:::my-bucket/some/key
+  python3 iam_policy_engine.py actions-for user/alice
+'''
+import argparse
+import fnmatch
+import json
+import os
+import pickle
+import re
+import sys
+import time
+from functools import lru_cache
+
+SNAPSHOT_FILE = 'iam_authorization_details.json'
+INDEX_CACHE_SUFFIX = '.index.pickle'
+DECISION_RANK = {'conditional': 0, 'partial': 1, 'allow': 2}
+AWS_MANAGED_PREFIX = 'arn:aws:iam::aws:policy/'
+
+
+@lru_cache(maxsize=None)
+def _compile_pattern(pattern, ignore_case):
+    """Compile an IAM wildcard pattern ('*' and '?') into a regex matcher."""
+    flags = re.IGNORECASE if ignore_case else 0
+    # IAM has no character classes: '[' is literal, fnmatch would start a set with it.
+    return re.compile(fnmatch.translate(pattern.replace('[', '[[]')), flags).match
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _load_document(doc):
+    """Policy documents from the API may be URL-encoded strings or already-parsed dicts."""
+    if isinstance(doc, str):
+        import urllib.parse
+        doc = json.loads(urllib.parse.unquote(doc))
+    return doc or {}
+
+
+def _substitute_variables(pattern, variables):
+    for name, value in variables.items():
+        pattern = pattern.replace('${' + name + '}', value)
+    return pattern
+
+
+class Statement(object):
+    """One compiled policy statement belonging to a single principal."""
+    __slots__ = ('principal', 'source', 'effect', 'actions', 'not_actions',
+                 'resources', 'not_resources', 'conditional')
+
+    def __init__(self, principal, source, raw, variables):
+        self.principal = principal
+        self.source = source
+        self.effect = raw.get('Effect', 'Allow')
+        self.actions = [a.lower() for a in _as_list(raw.get('Action'))]
+        self.not_actions = [a.lower() for a in _as_list(raw.get('NotAction'))]
+        self.resources = [_substitute_variables(r, variables) for r in _as_list(raw.get('Resource'))]
+        self.not_resources = [_substitute_variables(r, variables) for r in _as_list(raw.get('NotResource'))]
+        self.conditional = bool(raw.get('Condition'))
+
+    def matches_action(self, action):
+        if self.not_actions:
+            return not any(_compile_pattern(p, True)(action) for p in self.not_actions)
+        return any(_compile_pattern(p, True)(action) for p in self.actions)
+
+    def matches_resource(self, resource):
+        if resource is None:
+            return True
+        if self.not_resources:
+            return not any(_compile_pattern(p, False)(resource) for p in self.not_resources)
+        return any(_compile_pattern(p, False)(resource) for p in self.resources)
+
+    def covers_all_resources(self):
+        """True if the statement applies to every resource (Resource '*', no NotResource)."""
+        return not self.not_resources and any(r and set(r) == {'*'} for r in self.resources)
+
+
+class PolicyIndex(object):
+    """
+    Statement index keyed by service prefix.
+
+    _exact[service][action] -> statements naming that exact action
+    _wild[service]          -> statements with a wildcard action inside the service
+    _global                 -> statements with '*' / '*:...' actions or NotAction
+    _by_principal[name]     -> every statement of a principal
+    """
+
+    def __init__(self):
+        self._exact = {}
+        self._wild = {}
+        self._global = []
+        self._by_principal = {}
+
+    @property
+    def principals(self):
+        return sorted(self._by_principal)
+
+    def add_statement(self, stmt):
+        self._by_principal.setdefault(stmt.principal, []).append(stmt)
+        if stmt.not_actions:
+            self._global.append(stmt)
+            return
+        for action in stmt.actions:
+            service, _, name = action.partition(':')
+            if '*' in service or '?' in service or not name:
+                self._global.append(stmt)
+            elif '*' in name or '?' in name:
+                self._wild.setdefault(service, []).append(stmt)
+            else:
+                self._exact.setdefault(service, {}).setdefault(name, []).append(stmt)
+
+    def add_policy(self, principal, source, document, variables):
+        for raw in _as_list(_load_document(document).get('Statement')):
+            self.add_statement(Statement(principal, source, raw, variables))
+
+    def _candidates(self, action):
+        service, _, name = action.lower().partition(':')
+        seen = set()
+        buckets = (self._exact.get(service, {}).get(name, ()), self._wild.get(service, ()), self._global)
+        for bucket in buckets:
+            for stmt in bucket:
+                if id(stmt) not in seen:
+                    seen.add(id(stmt))
+                    yield stmt
+
+    def principals_allowed(self, action, resource=None):
+        """
+        Return {principal: {'decision': 'allow'|'conditional'|'partial', 'sources': [...]}}
+        for every principal whose identity policies allow `action` on `resource`. Without a
+        resource, an Allow that does not cover '*' is 'partial', and a Deny that does not cover
+        '*' makes an Allow 'partial' instead of removing it.
+        """
+        allows = {}
+        denied = set()
+        partly_denied = set()
+        action = action.lower()
+        for stmt in self._candidates(action):
+            if not (stmt.matches_action(action) and stmt.matches_resource(resource)):
+                continue
+            if stmt.effect == 'Deny':
+                if stmt.conditional:
+                    continue
+                if resource is None and not stmt.covers_all_resources():
+                    partly_denied.add(stmt.principal)
+                else:
+                    denied.add(stmt.principal)
+                continue
+            if stmt.conditional:
+                decision = 'conditional'
+            elif resource is None and not stmt.covers_all_resources():
+                decision = 'partial'
+            else:
+                decision = 'allow'
+            entry = allows.setdefault(stmt.principal, {'decision': decision, 'sources': []})
+            if DECISION_RANK[decision] > DECISION_RANK[entry['decision']]:
+                entry['decision'] = decision
+            if stmt.source not in entry['sources']:
+                entry['sources'].append(stmt.source)
+        for principal in partly_denied:
+            if allows.get(principal, {}).get('decision') == 'allow':
+                allows[principal]['decision'] = 'partial'
+        return {p: v for p, v in allows.items() if p not in denied}
+
+    def actions_allowed(self, principal):
+        """
+        Return the principal's effective action patterns:
+        {'allow': [(pattern, resources, source, conditional)], 'deny': [...]}.
+        NotAction statements are rendered as 'NOT <patterns>'.
+        """
+        result = {'allow': [], 'deny': []}
+        for stmt in self._by_principal.get(principal, []):
+            patterns = stmt.actions or ['NOT ' + ','.join(stmt.not_actions)]
+            resources = stmt.resources or ['NOT ' + ','.join(stmt.not_resources)]
+            bucket = 'deny' if stmt.effect == 'Deny' else 'allow'
+            for pattern in patterns:
+                result[bucket].append((pattern, resources, stmt.source, stmt.conditional))
+        return result
+
+    def is_allowed(self, principal, action, resource=None):
+        return principal in self.principals_allowed(action, resource)
+
+
+def collect_authorization_details(iam_client=None):
+    """Fetch users, groups, roles and every managed policy document in one paginated pass."""
+    if iam_client is None:
+        import boto3
+        iam_client = boto3.client('iam')
+    details = {'UserDetailList': [], 'GroupDetailList': [], 'RoleDetailList': [], 'Policies': []}
+    paginator = iam_client.get_paginator('get_account_authorization_details')
+    for page in paginator.paginate(Filter=['User', 'Group', 'Role', 'LocalManagedPolicy', 'AWSManagedPolicy']):
+        for key in details:
+            details[key].extend(page.get(key, []))
+    return details
+
+
+def _default_policy_documents(policies):
+    docs = {}
+    for policy in policies:
+        for version in policy.get('PolicyVersionList', []):
+            if version.get('IsDefaultVersion'):
+                docs[policy['Arn']] = (policy['PolicyName'], version.get('Document'))
+    return docs
+
+
+def build_index(details):
+    """Compile a GetAccountAuthorizationDetails snapshot into a PolicyIndex."""
+    index = PolicyIndex()
+    managed = _default_policy_documents(details.get('Policies', []))
+    groups = {g['GroupName']: g for g in details.get('GroupDetailList', [])}
+
+    def add_managed(principal, attached, via, variables):
+        for policy in attached:
+            arn = policy['PolicyArn']
+            if arn not in managed:
+                continue
+            kind = 'aws-managed' if arn.startswith(AWS_MANAGED_PREFIX) else 'customer-managed'
+            name, doc = managed[arn]
+            index.add_policy(principal, f"{via}{kind}:{name}", doc, variables)
+
+    for user in details.get('UserDetailList', []):
+        principal = f"user/{user['UserName']}"
+        variables = {'aws:username': user['UserName'], 'aws:userid': user.get('UserId', '')}
+        for inline in user.get('UserPolicyList', []):
+            index.add_policy(principal, f"inline:{inline['PolicyName']}", inline['PolicyDocument'], variables)
+        add_managed(principal, user.get('AttachedManagedPolicies', []), '', variables)
+        for group_name in user.get('GroupList', []):
+            group = groups.get(group_name)
+            if not group:
+                continue
+            via = f"group/{group_name}/"
+            for inline in group.get('GroupPolicyList', []):
+                index.add_policy(principal, f"{via}inline:{inline['PolicyName']}", inline['PolicyDocument'], variables)
+            add_managed(principal, group.get('AttachedManagedPolicies', []), via, variables)
+
+    for role in details.get('RoleDetailList', []):
+        principal = f"role/{role['RoleName']}"
+        for inline in role.get('RolePolicyList', []):
+            index.add_policy(principal, f"inline:{inline['PolicyName']}", inline['PolicyDocument'], {})
+        add_managed(principal, role.get('AttachedManagedPolicies', []), '', {})
+    return index
+
+
+def save_snapshot(details, path=SNAPSHOT_FILE):
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(details, fh, default=str)
+
+
+def load_snapshot(path=SNAPSHOT_FILE):
+    with open(path, 'r', encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def load_index(path=SNAPSHOT_FILE):
+    """
+    The PolicyIndex of a snapshot, reused from <path>.index.pickle while the snapshot and
+    this module are unchanged; rebuilt (and re-cached) otherwise.
+    """
+    snapshot, module = os.stat(path), os.stat(__file__)
+    key = (snapshot.st_mtime_ns, snapshot.st_size, module.st_mtime_ns)
+    cache_path = path + INDEX_CACHE_SUFFIX
+    try:
+        with open(cache_path, 'rb') as fh:
+            cached_key, index = pickle.load(fh)
+        if cached_key == key:
+            return index
+    except Exception:
+        pass  # missing, truncated or written by an older version: rebuild it
+    index = build_index(load_snapshot(path))
+    try:
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'wb') as fh:
+            pickle.dump((key, index), fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Could not cache the index in '{cache_path}': {e}", file=sys.stderr)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline IAM effective-permission queries.")
+    parser.add_argument('--snapshot', default=SNAPSHOT_FILE, help="authorization details JSON file")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('collect', help="fetch authorization details from IAM into the snapshot file")
+    who = sub.add_parser('who-can', help="principals allowed an action (optionally on a resource)")
+    who.add_argument('action')
+    who.add_argument('resource', nargs='?')
+    act = sub.add_parser('actions-for', help="effective action patterns of a principal (user/NAME or role/NAME)")
+    act.add_argument('principal')
+    args = parser.parse_args()
+
+    if args.command == 'collect':
+        import aws_instrumentation
+        aws_instrumentation.install()
+        details = collect_authorization_details()
+        save_snapshot(details, args.snapshot)
+        print(f"✅ Saved {len(details['UserDetailList'])} users, {len(details['RoleDetailList'])} roles "
+              f"and {len(details['Policies'])} managed policies to '{args.snapshot}'")
+        return
+
+    start = time.perf_counter()
+    try:
+        index = load_index(args.snapshot)
+    except FileNotFoundError:
+        print(f"Snapshot '{args.snapshot}' not found. Run the 'collect' command first.", file=sys.stderr)
+        sys.exit(1)
+    built = time.perf_counter()
+
+    if args.command == 'who-can':
+        result = index.principals_allowed(args.action, args.resource)
+        elapsed = (time.perf_counter() - built) * 1000
+        for principal in sorted(result):
+            entry = result[principal]
+            print(f"{principal:<50} {entry['decision']:<12} {', '.join(entry['sources'])}")
+        print(f"\n{len(result)} principal(s) allowed {args.action}"
+              f"{' on ' + args.resource if args.resource else ''} "
+              f"(index loaded in {(built - start) * 1000:.1f} ms, query {elapsed:.2f} ms)")
+    else:
+        result = index.actions_allowed(args.principal)
+        if not result['allow'] and not result['deny']:
+            print(f"No identity policy statements found for {args.principal}.")
+            return
+        for effect in ('allow', 'deny'):
+            print(f"{effect.upper()}:")
+            for pattern, resources, source, conditional in sorted(result[effect]):
+                flag = ' (conditional)' if conditional else ''
+                print(f"\t{pattern:<45} {', '.join(resources)}  [{source}]{flag}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+'''
+iam_trust_graph.py
+
+Who can become which role. iamroleaudit.py only lists each role's trusted entities;
+this builds a directed graph "A can assume B" from every role's AssumeRolePolicyDocument
+together with the sts:AssumeRole grants in the identity policies, and answers
+transitive questions: which principals can reach role X through chains of AssumeRole,
+and which roles a principal can end up in.
+
+Edges (principal -> role) come from Allow statements of the trust policy for
+sts:AssumeRole / AssumeRoleWithSAML / AssumeRoleWithWebIdentity:
+  * a user or role ARN                   -> that principal
+  * an account (ID or :root) we have a   -> every user/role of that account whose identity
+    snapshot of, own account included       policies allow sts:AssumeRole on the role
+                                            (evaluated with iam_policy_engine's index)
+  * an account without a snapshot        -> the account as an external node
+  * Service / Federated / '*'            -> external nodes
+Statements with a Condition still give an edge, marked conditional; Deny statements,
+permission boundaries and SCPs are not evaluated, so the graph over-approximates.
+
+Reachability is precomputed: the graph is condensed into its strongly connected
+components (roles that can assume each other reach the same set), and every component
+gets a bitset (a Python int) of the components it reaches and of those reaching it,
+filled in one pass over the condensation in topological order. A query is then a few
+bit operations, however many roles and accounts are loaded.
+
+Works offline from iam_policy_engine.py snapshots; pass --snapshot once per account to
+follow chains across accounts.
+
+Usage:
+  python3 iam_policy_engine.py collect
+  python3 iam_trust_graph.py who-can-reach role/Admin
+  python3 iam_trust_graph.py reachable-from user/alice
+  python3 iam_trust_graph.py path user/alice role/Admin
+  python3 iam_trust_graph.py --snapshot prod.json --snapshot dev.json summary
+'''
+import argparse
+import sys
+import time
+from collections import deque
+
+from iam_policy_engine import SNAPSHOT_FILE, Statement, _as_list, _load_document, build_index, load_snapshot
+
+ASSUME_ACTIONS = ('sts:assumerole', 'sts:assumerolewithsaml', 'sts:assumerolewithwebidentity')
+CONDITIONAL = ' (conditional)'
+
+
+def _account_of(details):
+    for key, item in (('RoleDetailList', 'Arn'), ('UserDetailList', 'Arn')):
+        for entry in details.get(key, []):
+            return entry[item].split(':')[4]
+    return None
+
+
+def _iter_bits(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def strongly_connected_components(succ):
+    """
+    Iterative Tarjan over adjacency lists. Returns (component of each node, components);
+    components come out in reverse topological order (a component after everything it reaches).
+    """
+    n = len(succ)
+    index = [None] * n
+    low = [0] * n
+    on_stack = [False] * n
+    stack = []
+    comp = [None] * n
+    components = []
+    counter = 0
+    for root in range(n):
+        if index[root] is not None:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, 0)]
+        while work:
+            v, i = work[-1]
+            if i < len(succ[v]):
+                work[-1] = (v, i + 1)
+                w = succ[v][i]
+                if index[w] is None:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, 0))
+                elif on_stack[w]:
+                    low[v] = min(low[v], index[w])
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[v])
+            if low[v] == index[v]:
+                members = []
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    comp[w] = len(components)
+                    members.append(w)
+                    if w == v:
+                        break
+                components.append(members)
+    return comp, components
+
+
+class TrustGraph(object):
+    def __init__(self):
+        self.names = []
+        self.kinds = []
+        self.ids = {}
+        self.aliases = {}     # 'role/NAME' -> ARN, when unique across the loaded accounts
+        self.succ = []
+        self.edges = {}       # (src, dst) -> set of reasons
+        self.comp = None
+
+    def node(self, name, kind):
+        node_id = self.ids.get(name)
+        if node_id is None:
+            node_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.kinds.append(kind)
+            self.succ.append([])
+        return node_id
+
+    def add_edge(self, src, dst, reason):
+        key = (src, dst)
+        if key not in self.edges:
+            self.edges[key] = set()
+            self.succ[src].append(dst)
+        self.edges[key].add(reason)
+        self.comp = None
+
+    def resolve(self, name):
+        """Node id of an ARN, 'user/NAME' / 'role/NAME' or external node name; KeyError if unknown."""
+        name = self.aliases.get(name, name)
+        return self.ids[name]
+
+    def condense(self):
+        """SCC condensation plus per-component reach / reached-by bitsets."""
+        self.comp, self.components = strongly_connected_components(self.succ)
+        comp_succ = [set() for _ in self.components]
+        for v, targets in enumerate(self.succ):
+            for w in targets:
+                if self.comp[v] != self.comp[w]:
+                    comp_succ[self.comp[v]].add(self.comp[w])
+        # Tarjan's order is reverse topological: everything a component reaches is done before it.
+        self.reach = [0] * len(self.components)
+        for c, targets in enumerate(comp_succ):
+            bits = 1 << c
+            for d in targets:
+                bits |= self.reach[d]
+            self.reach[c] = bits
+        self.reached_by = [1 << c for c in range(len(self.components))]
+        for c in reversed(range(len(self.components))):
+            for d in comp_succ[c]:
+                self.reached_by[d] |= self.reached_by[c]
+
+    def _nodes(self, bits, exclude):
+        if self.comp is None:
+            self.condense()
+        return sorted((self.names[v] for c in _iter_bits(bits) for v in self.components[c] if v != exclude),
+                      key=lambda name: (self.kinds[self.ids[name]], name))
+
+    def reachable_from(self, name):
+        node = self.resolve(name)
+        if self.comp is None:
+            self.condense()
+        return self._nodes(self.reach[self.comp[node]], node)
+
+    def who_can_reach(self, name):
+        node = self.resolve(name)
+        if self.comp is None:
+            self.condense()
+        return self._nodes(self.reached_by[self.comp[node]], node)
+
+    def can_reach(self, src, dst):
+        if self.comp is None:
+            self.condense()
+        return bool(self.reach[self.comp[self.resolve(src)]] >> self.comp[self.resolve(dst)] & 1)
+
+    def path(self, src, dst):
+        """Shortest chain src -> ... -> dst as [(node, reasons of the edge into it)], or None."""
+        start, goal = self.resolve(src), self.resolve(dst)
+        if not self.can_reach(src, dst):
+            return None
+        parent = {start: None}
+        queue = deque([start])
+        while queue and goal not in parent:
+            v = queue.popleft()
+            for w in self.succ[v]:
+                if w not in parent:
+                    parent[w] = v
+                    queue.append(w)
+        chain = []
+        v = goal
+        while parent[v] is not None:
+            chain.append((self.names[v], sorted(self.edges[(parent[v], v)])))
+            v = parent[v]
+        chain.append((self.names[start], []))
+        return chain[::-1]
+
+
+def _assume_statements(document):
+    """(statement, raw principal block) for every trust policy Allow that grants an AssumeRole action."""
+    for raw in _as_list(_load_document(document).get('Statement')):
+        stmt = Statement('', 'trust', raw, {})
+        if stmt.effect != 'Allow' or not any(stmt.matches_action(a) for a in ASSUME_ACTIONS):
+            continue
+        yield stmt, raw.get('Principal', {})
+
+
+def _principal_entries(principal):
+    if principal == '*':
+        yield 'AWS', '*'
+        return
+    if isinstance(principal, dict):
+        for kind, values in principal.items():
+            for value in _as_list(values):
+                yield kind, value
+
+
+def build_trust_graph(snapshots):
+    """Build the graph from one or more GetAccountAuthorizationDetails snapshots (one per account)."""
+    graph = TrustGraph()
+    accounts = {}
+    short = {}
+    for details in snapshots:
+        account = _account_of(details)
+        arns = {}
+        for kind, key, name_key in (('user', 'UserDetailList', 'UserName'), ('role', 'RoleDetailList', 'RoleName')):
+            for entry in details.get(key, []):
+                graph.node(entry['Arn'], kind)
+                arns[f"{kind}/{entry[name_key]}"] = entry['Arn']
+                short.setdefault(f"{kind}/{entry[name_key]}", set()).add(entry['Arn'])
+        accounts[account] = (details, build_index(details), arns)
+    graph.aliases = {name: next(iter(found)) for name, found in short.items() if len(found) == 1}
+
+    for account, (details, _, _) in accounts.items():
+        for role in details.get('RoleDetailList', []):
+            role_arn = role['Arn']
+            dst = graph.ids[role_arn]
+            for stmt, principal in _assume_statements(role.get('AssumeRolePolicyDocument')):
+                suffix = CONDITIONAL if stmt.conditional else ''
+                for kind, value in _principal_entries(principal):
+                    _add_trust_edges(graph, accounts, dst, role_arn, kind, str(value), suffix)
+    graph.condense()
+    return graph
+
+
+def _add_trust_edges(graph, accounts, dst, role_arn, kind, value, suffix):
+    if kind != 'AWS':
+        graph.add_edge(graph.node(f"{kind.lower()}:{value}", kind.lower()), dst, f"trust{suffix}")
+        return
+    if value == '*':
+        graph.add_edge(graph.node('*', 'anyone'), dst, f"trust: anyone{suffix}")
+        return
+    if value.isdigit() or value.endswith(':root'):
+        account = value if value.isdigit() else value.split(':')[4]
+        if account not in accounts:
+            graph.add_edge(graph.node(f"arn:aws:iam::{account}:root", 'account'), dst, f"trust: account{suffix}")
+            return
+        _, index, arns = accounts[account]
+        for principal, entry in index.principals_allowed('sts:AssumeRole', role_arn).items():
+            conditional = suffix or (CONDITIONAL if entry['decision'] == 'conditional' else '')
+            graph.add_edge(graph.ids[arns[principal]], dst,
+                           f"trust: account + {', '.join(entry['sources'])}{conditional}")
+        return
+    if value in graph.ids:
+        src = graph.ids[value]
+        account = value.split(':')[4]
+        if account != role_arn.split(':')[4] and account in accounts:
+            # Cross-account: the principal's own identity policies must allow the call as well.
+            _, index, arns = accounts[account]
+            names = {arn: name for name, arn in arns.items()}
+            if not index.is_allowed(names[value], 'sts:AssumeRole', role_arn):
+                return
+        graph.add_edge(src, dst, f"trust: principal{suffix}")
+        return
+    # Principals outside the loaded snapshots (other accounts, deleted principals shown as IDs).
+    graph.add_edge(graph.node(value, 'external'), dst, f"trust: principal{suffix}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IAM role trust graph with transitive AssumeRole reachability.")
+    parser.add_argument('--snapshot', action='append',
+                        help=f"authorization details JSON from iam_policy_engine.py collect, once per account "
+                             f"(default: {SNAPSHOT_FILE})")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('summary', help="graph size, cycles and external entry points")
+    who = sub.add_parser('who-can-reach', help="principals that can end up in a role (directly or by chaining)")
+    who.add_argument('role')
+    frm = sub.add_parser('reachable-from', help="roles a principal can end up in")
+    frm.add_argument('principal')
+    pth = sub.add_parser('path', help="shortest AssumeRole chain between two principals")
+    pth.add_argument('source')
+    pth.add_argument('target')
+    args = parser.parse_args()
+
+    snapshots = []
+    for path in args.snapshot or [SNAPSHOT_FILE]:
+        try:
+            snapshots.append(load_snapshot(path))
+        except FileNotFoundError:
+            print(f"Snapshot '{path}' not found. Run 'iam_policy_engine.py collect' first.", file=sys.stderr)
+            sys.exit(1)
+
+    start = time.perf_counter()
+    graph = build_trust_graph(snapshots)
+    built = time.perf_counter()
+
+    try:
+        if args.command == 'summary':
+            cycles = [c for c in graph.components if len(c) > 1]
+            external = [name for name, kind in zip(graph.names, graph.kinds) if kind not in ('user', 'role')]
+            print(f"{len(graph.names)} node(s), {len(graph.edges)} edge(s), {len(graph.components)} component(s)")
+            for members in sorted(cycles, key=len, reverse=True):
+                print(f"  cycle: {', '.join(sorted(graph.names[v] for v in members))}")
+            for name in sorted(external):
+                print(f"  entry point: {name} -> {len(graph.reachable_from(name))} role(s)")
+        elif args.command == 'who-can-reach':
+            result = graph.who_can_reach(args.role)
+            for name in result:
+                print(f"{graph.kinds[graph.ids[name]]:<10} {name}")
+            print(f"\n{len(result)} principal(s) can reach {args.role}")
+        elif args.command == 'reachable-from':
+            result = [name for name in graph.reachable_from(args.principal) if graph.kinds[graph.ids[name]] == 'role']
+            for name in result:
+                print(name)
+            print(f"\n{args.principal} can reach {len(result)} role(s)")
+        else:
+            chain = graph.path(args.source, args.target)
+            if chain is None:
+                print(f"{args.source} cannot reach {args.target}.")
+            else:
+                print(chain[0][0])
+                for name, reasons in chain[1:]:
+                    print(f"  -> {name}  [{'; '.join(reasons)}]")
+    except KeyError as e:
+        print(f"Unknown principal {e}; use an ARN, user/NAME or role/NAME.", file=sys.stderr)
+        sys.exit(1)
+    print(f"(graph built in {(built - start) * 1000:.1f} ms, query {(time.perf_counter() - built) * 1000:.2f} ms)")
+
+
+if __name__ == '__main__':
+    main()
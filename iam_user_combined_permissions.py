@@ -1,6 +1,12 @@
+import argparse
 import boto3
+import aws_instrumentation
+import hashlib
 import json
 
+POLICIES_SIDECAR = "iam_user_combined_permissions.policies.jsonl"
+HASH_LENGTH = 12
+
 def get_policy_document(iam_client, policy_arn):
     try:
         policy = iam_client.get_policy(PolicyArn=policy_arn)
@@ -10,65 +16,150 @@ def get_policy_document(iam_client, policy_arn):
     except Exception as e:
         return {"error": str(e)}
 
-def fetch_user_permissions_combined():
+def policy_hash(doc):
+    """Content address of a policy document: its canonical JSON, hashed."""
+    canonical = json.dumps(doc, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:HASH_LENGTH]
+
+class PolicyStore(object):
+    """
+    Writes every distinct customer managed policy document once to a JSON-lines sidecar
+    (one record per policy ARN, the document only on the first record of each hash) and
+    hands out `name@hash` references. Each policy ARN is fetched once per run and only
+    the ARN -> reference map is kept, so memory does not grow with the documents.
+    """
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.refs = {}
+        self.hashes = set()
+
+    def ref(self, iam_client, policy_arn, policy_name):
+        if policy_arn in self.refs:
+            return self.refs[policy_arn]
+        doc = get_policy_document(iam_client, policy_arn)
+        if 'error' in doc:
+            # Not cached: the next user with this policy retries the lookup.
+            return f"{policy_name} -- error: {doc['error']}"
+        digest = policy_hash(doc)
+        ref = f"{policy_name}@{digest}"
+        record = {'ref': ref, 'arn': policy_arn, 'hash': digest}
+        if digest not in self.hashes:
+            # Identical documents under other ARNs get a record without the document.
+            record['document'] = doc
+            self.hashes.add(digest)
+        self.fh.write(json.dumps(record) + "\n")
+        self.refs[policy_arn] = ref
+        return ref
+
+def iter_user_permissions_combined(policy_store=None):
+    """
+    Yield the report one line at a time, user by user, so nothing accumulates in memory.
+    With a PolicyStore, customer managed policies are listed as `name@hash` references
+    into the store's sidecar instead of their full documents.
+    """
     iam_client = boto3.client('iam')
-    output_lines = []
-
-    users = iam_client.list_users()
-    for user in users['Users']:
-        username = user['UserName']
-        output_lines.append(f"User:\n\n** {username}\n")
-
-        aws_managed = set()
-        customer_managed = {}
-
-        # Directly attached user policies
-        attached_policies = iam_client.list_attached_user_policies(UserName=username)
-        for policy in attached_policies.get('AttachedPolicies', []):
-            policy_arn = policy['PolicyArn']
-            policy_name = policy['PolicyName']
-            if policy_arn.startswith('arn:aws:iam::aws:policy/'):
-                aws_managed.add(policy_name)
-            else:
-                policy_doc = get_policy_document(iam_client, policy_arn)
-                customer_managed[policy_name] = policy_doc
-
-        # Group policies
-        groups_resp = iam_client.list_groups_for_user(UserName=username)
-        for group in groups_resp.get('Groups', []):
-            group_name = group['GroupName']
-            group_policies = iam_client.list_attached_group_policies(GroupName=group_name)
-            for policy in group_policies.get('AttachedPolicies', []):
+
+    paginator = iam_client.get_paginator('list_users')
+    for page in paginator.paginate():
+        for user in page['Users']:
+            username = user['UserName']
+            yield f"User:\n\n** {username}\n"
+
+            aws_managed = set()
+            customer_managed = {}
+
+            # Directly attached user policies
+            attached_policies = iam_client.list_attached_user_policies(UserName=username)
+            for policy in attached_policies.get('AttachedPolicies', []):
                 policy_arn = policy['PolicyArn']
                 policy_name = policy['PolicyName']
                 if policy_arn.startswith('arn:aws:iam::aws:policy/'):
                     aws_managed.add(policy_name)
+                elif policy_store is not None:
+                    customer_managed[policy_name] = policy_store.ref(iam_client, policy_arn, policy_name)
                 else:
                     policy_doc = get_policy_document(iam_client, policy_arn)
                     customer_managed[policy_name] = policy_doc
 
-        # Output AWS Managed
-        output_lines.append("\nAWS Managed:")
-        output_lines += [f"\t{p}" for p in sorted(aws_managed)] if aws_managed else ["\tNone"]
+            # Group policies
+            groups_resp = iam_client.list_groups_for_user(UserName=username)
+            for group in groups_resp.get('Groups', []):
+                group_name = group['GroupName']
+                group_policies = iam_client.list_attached_group_policies(GroupName=group_name)
+                for policy in group_policies.get('AttachedPolicies', []):
+                    policy_arn = policy['PolicyArn']
+                    policy_name = policy['PolicyName']
+                    if policy_arn.startswith('arn:aws:iam::aws:policy/'):
+                        aws_managed.add(policy_name)
+                    elif policy_store is not None:
+                        customer_managed[policy_name] = policy_store.ref(iam_client, policy_arn, policy_name)
+                    else:
+                        policy_doc = get_policy_document(iam_client, policy_arn)
+                        customer_managed[policy_name] = policy_doc
 
-        # Output Customer Managed with JSON
-        output_lines.append("\n\nCustomer Managed:\n")
-        if customer_managed:
-            for name, doc in customer_managed.items():
-                output_lines.append(f"{name} -- ")
-                output_lines.append(json.dumps(doc, indent=4) + "\n")
-        else:
-            output_lines.append("None\n")
+            # Output AWS Managed
+            yield "\nAWS Managed:"
+            if aws_managed:
+                for p in sorted(aws_managed):
+                    yield f"\t{p}"
+            else:
+                yield "\tNone"
 
-        output_lines.append("\n" + "-"*60 + "\n")
+            # Output Customer Managed with JSON
+            yield "\n\nCustomer Managed:\n"
+            if customer_managed and policy_store is not None:
+                for name in sorted(customer_managed):
+                    yield f"\t{customer_managed[name]}"
+            elif customer_managed:
+                for name, doc in customer_managed.items():
+                    yield f"{name} -- "
+                    yield json.dumps(doc, indent=4) + "\n"
+            else:
+                yield "None\n"
 
-    return "\n".join(output_lines)
+            yield "\n" + "-"*60 + "\n"
 
-if __name__ == '__main__':
-    result = fetch_user_permissions_combined()
+def fetch_user_permissions_combined():
+    return "\n".join(iter_user_permissions_combined())
 
+def write_user_permissions_combined(output_file, policies_file=None):
+    """
+    Stream the report to `output_file`, flushing after each user so partial output survives a crash.
+    With `policies_file`, policy documents go to that sidecar once each (see PolicyStore).
+    """
+    sidecar = open(policies_file, "w", encoding="utf-8") if policies_file else None
+    try:
+        policy_store = PolicyStore(sidecar) if sidecar else None
+        with open(output_file, "w", encoding="utf-8") as f:
+            if policies_file:
+                f.write(f"Customer managed policies are listed as name@hash; documents are in '{policies_file}'.\n\n")
+            separator = ""
+            for line in iter_user_permissions_combined(policy_store):
+                f.write(separator + line)
+                separator = "\n"
+                if line.startswith("\n---"):
+                    f.flush()
+                    if sidecar:
+                        sidecar.flush()
+    finally:
+        if sidecar:
+            sidecar.close()
+    return policy_store
+
+def main():
+    aws_instrumentation.install()
+    parser = argparse.ArgumentParser(description="Per-user AWS managed and customer managed policies (text report).")
+    parser.add_argument('--dedup', action='store_true',
+                        help=f"write each distinct policy document once to {POLICIES_SIDECAR} and "
+                             "reference it as name@hash")
+    args = parser.parse_args()
     output_file = "iam_user_combined_permissions.txt"
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write(result)
+    store = write_user_permissions_combined(output_file, POLICIES_SIDECAR if args.dedup else None)
 
     print(f"\n✅ File '{output_file}' created successfully in your CloudShell directory.")
+    if store is not None:
+        print(f"📄 {len(store.hashes)} distinct policy document(s) written to '{POLICIES_SIDECAR}'.")
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,26 @@
+import argparse
 import boto3
-import csv
+import time
+import aws_instrumentation
+import tracing
+from checkpoint import CheckpointJournal, add_resume_argument
+from report_writers import add_format_argument, open_report_writer, output_path
 
-def fetch_iam_group_data():
+def fetch_iam_group_data(journal=None):
     iam = boto3.client('iam')
-    groups_data = []
 
     paginator = iam.get_paginator('list_groups')
     for page in paginator.paginate():
         for group in page['Groups']:
             group_name = group['GroupName']
 
+            # Replay groups finished by an interrupted run (--resume).
+            if journal is not None and group_name in journal:
+                yield journal.get(group_name)
+                continue
+
+            started = time.perf_counter()
+
             # Managed policies attached to group
             attached_resp = iam.list_attached_group_policies(GroupName=group_name)
             managed_policies = [p['PolicyName'] for p in attached_resp.get('AttachedPolicies', [])]
@@ -18,27 +29,37 @@ def fetch_iam_group_data():
             inline_resp = iam.list_group_policies(GroupName=group_name)
             inline_policies = inline_resp.get('PolicyNames', [])
 
-            groups_data.append([
+            row = [
                 group_name,
                 ', '.join(managed_policies) if managed_policies else "None",
                 ', '.join(inline_policies) if inline_policies else "None"
-            ])
-    return groups_data
+            ]
+            tracing.add_span('group', started, time.perf_counter(), args={'group': group_name})
+            if journal is not None:
+                journal.record(group_name, row)
+            yield row
 
 
-if __name__ == '__main__':
-    output_file = "iam_groups_report.csv"
+def main():
+    aws_instrumentation.install()
+    parser = argparse.ArgumentParser(description="IAM group policy report.")
+    args = tracing.add_trace_arguments(add_resume_argument(add_format_argument(parser))).parse_args()
+    tracing.setup(args)
+    output_file = output_path("iam_groups_report.csv", args.format)
     headers = [
         "Group Name",
         "Managed Policies",
         "Inline Policies"
     ]
 
-    group_data = fetch_iam_group_data()
+    journal = CheckpointJournal('iamgroupaudit', resume=args.resume)
+    with open_report_writer(output_file, headers, args.format) as writer:
+        with tracing.span('write-report', format=args.format):
+            writer.write_rows(fetch_iam_group_data(journal))
+    journal.complete()
 
-    with open(output_file, mode='w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(headers)
-        writer.writerows(group_data)
+    print(f"✅ {args.format.upper()} file '{output_file}' has been created with IAM group policy details.")
 
-    print(f"✅ CSV file '{output_file}' has been created with IAM group policy details.")
+
+if __name__ == '__main__':
+    main()
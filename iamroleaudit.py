@@ -1,12 +1,28 @@
 #!/usr/bin/env python3
+import argparse
 import csv
 import boto3
 import botocore
+import aws_instrumentation
+import tracing
+from aws_governor import is_throttle_error
+import service_last_accessed
+from records import CredentialReportUser, RoleSummary
 import io
 import json
+import os
 import sys
 import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+# Role last-used enrichment: one get_role call per role, fetched in parallel and cached
+# on disk so that re-running the audit only re-fetches roles that changed or expired.
+ROLE_LOOKUP_WORKERS = 8
+ROLE_CACHE_FILE = 'role_last_used_cache.json'
+ROLE_CACHE_TTL = 15 * 60  # seconds
+ROLE_THROTTLED = 'unknown (throttled)'
+ROLE_UNREACHABLE = 'unknown (connection error)'
 
 def get_account_id():
     sts = boto3.client('sts')
@@ -29,21 +45,92 @@ def get_credential_report():
         sys.exit(1)
 
 def parse_users(report_data):
-    # Parse CSV data from the credential report.
+    # Parse CSV data from the credential report, keeping only the columns the audits read.
     users = []
     csv_reader = csv.DictReader(io.StringIO(report_data))
     for row in csv_reader:
-        users.append(row)
+        users.append(CredentialReportUser.from_row(row))
     return users
 
 def fetch_roles():
+    """Every role as a RoleSummary; the trust policy is flattened while its page is in hand."""
     iam = boto3.client('iam')
     roles = []
     paginator = iam.get_paginator('list_roles')
     for page in paginator.paginate():
-        roles.extend(page['Roles'])
+        roles.extend(RoleSummary(RoleName=role['RoleName'], RoleId=role['RoleId'], Arn=role['Arn'],
+                                 TrustedEntities=get_trusted_entities(role))
+                     for role in page['Roles'])
     return roles
 
+def load_role_cache(path=ROLE_CACHE_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_role_cache(cache, path=ROLE_CACHE_FILE):
+    # Write to a temp file first so an interrupted run never leaves a corrupt cache.
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(cache, fh)
+    os.replace(tmp_path, path)
+
+def fetch_role_last_used(iam, role_name):
+    """Return the role's RoleLastUsed date as an ISO-8601 string, or "" if never used."""
+    role = iam.get_role(RoleName=role_name)['Role']
+    last_used = role.get('RoleLastUsed', {}).get('LastUsedDate')
+    return last_used.isoformat() if last_used else ""
+
+def get_roles_last_used(roles, cache_path=ROLE_CACHE_FILE, ttl=ROLE_CACHE_TTL, workers=ROLE_LOOKUP_WORKERS):
+    """
+    Map RoleName -> last used date for every role.
+    Cached entries are reused while younger than `ttl` and while the role's RoleId is
+    unchanged (a deleted and recreated role gets a new RoleId); all other roles are
+    fetched with get_role on a bounded thread pool.
+    """
+    iam = boto3.client('iam')
+    cache = load_role_cache(cache_path)
+    now = time.time()
+    result = {}
+    stale = []
+    for role in roles:
+        entry = cache.get(role['RoleName'])
+        if entry and entry.get('RoleId') == role['RoleId'] and now - entry.get('FetchedAt', 0) < ttl:
+            result[role['RoleName']] = entry['LastUsed']
+        else:
+            stale.append(role)
+
+    def lookup(role):
+        try:
+            return role, fetch_role_last_used(iam, role['RoleName'])
+        except botocore.exceptions.ClientError as e:
+            sys.stderr.write(f"Error fetching last activity for role {role['RoleName']}: {e}\n")
+            # An empty value would read as "never used"; a throttled lookup is unknown, not a finding.
+            return role, (ROLE_THROTTLED if is_throttle_error(e) else None)
+        except botocore.exceptions.BotoCoreError as e:
+            # Connection errors, read timeouts, exhausted retries: unknown as well, not a reason to stop.
+            sys.stderr.write(f"Error fetching last activity for role {role['RoleName']}: {e}\n")
+            return role, ROLE_UNREACHABLE
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for role, last_used in pool.map(lookup, stale):
+                if last_used in (None, ROLE_THROTTLED, ROLE_UNREACHABLE):
+                    # Leave failed lookups out of the cache so the next run retries them.
+                    result[role['RoleName']] = last_used or ""
+                    continue
+                result[role['RoleName']] = last_used
+                cache[role['RoleName']] = {'RoleId': role['RoleId'], 'LastUsed': last_used, 'FetchedAt': now}
+    finally:
+        # Keep what was fetched even if the run dies. Drop cache entries for roles that no longer exist.
+        current = {role['RoleName'] for role in roles}
+        cache = {name: entry for name, entry in cache.items() if name in current}
+        save_role_cache(cache, cache_path)
+    print(f"Role last activity: {len(roles) - len(stale)} cached, {len(stale)} fetched.")
+    return result
+
 def get_latest_activity(user):
     """
     Determine the most recent activity for an IAM user.
@@ -102,15 +189,33 @@ def get_trusted_entities(role):
     return ", ".join(principals)
 
 def main():
+    aws_instrumentation.install()
+    parser = argparse.ArgumentParser(description="IAM users and roles with last activity, MFA and trusted entities.")
+    parser.add_argument('--service-usage', action='store_true',
+                        help="add services granted vs used columns (service last accessed data)")
+    args = parser.parse_args()
     output_filename = 'audit_report.csv'
     
     account_id = get_account_id()
     
-    report_data = get_credential_report()
-    user_report = parse_users(report_data)
+    with tracing.span('credential-report'):
+        report_data = get_credential_report()
+    with tracing.span('parse-credential-report'):
+        user_report = parse_users(report_data)
     
     # Updated header includes Trusted Entities as the last column.
     header = ['Name', 'Account', 'Type', 'Use Type', 'Last Activity', 'MFA Active', 'Trusted Entities']
+    if args.service_usage:
+        header += service_last_accessed.USAGE_HEADERS
+    
+    with tracing.span('list-roles'):
+        roles = fetch_roles()
+    usage = {}
+    if args.service_usage:
+        # The root account has no service last accessed data.
+        arns = [u['arn'] for u in user_report if u['user'] != '<root_account>'] + [r['Arn'] for r in roles]
+        with tracing.span('service-last-accessed', principals=len(arns)):
+            usage = service_last_accessed.collect(arns)
     
     with open(output_filename, 'w', newline='') as csvfile:
         writer = csv.writer(csvfile)
@@ -126,19 +231,27 @@ def main():
             mfa_active = user['mfa_active']
             # For users, Trusted Entities is not applicable.
             trusted_entities = ""
-            writer.writerow([name, account_id, user_type, use_type, last_activity, mfa_active, trusted_entities])
+            row = [name, account_id, user_type, use_type, last_activity, mfa_active, trusted_entities]
+            if args.service_usage:
+                row += service_last_accessed.usage_columns(usage.get(user['arn']))
+            writer.writerow(row)
         
         # Process IAM roles.
-        for role in fetch_roles():
+        with tracing.span('role-last-used', roles=len(roles)):
+            roles_last_used = get_roles_last_used(roles)
+        for role in roles:
             name = role['RoleName']
             user_type = "Role"
             use_type = "AssumedRole"
-            # Roles do not have console activity.
-            last_activity = ""
+            # list_roles does not return RoleLastUsed; it comes from the get_role enrichment.
+            last_activity = roles_last_used.get(name, "")
             mfa_active = "N/A"
-            # Get trusted entities from the AssumeRolePolicyDocument.
-            trusted_entities = get_trusted_entities(role)
-            writer.writerow([name, account_id, user_type, use_type, last_activity, mfa_active, trusted_entities])
+            # Trusted entities from the AssumeRolePolicyDocument (flattened by fetch_roles).
+            trusted_entities = role['TrustedEntities']
+            row = [name, account_id, user_type, use_type, last_activity, mfa_active, trusted_entities]
+            if args.service_usage:
+                row += service_last_accessed.usage_columns(usage.get(role['Arn']))
+            writer.writerow(row)
     
     print(f"CSV audit report generated: {output_filename}")
 
@@ -1,15 +1,26 @@
+import argparse
 import boto3
-import csv
+import time
+import aws_instrumentation
+import tracing
+from checkpoint import CheckpointJournal, add_resume_argument
+from report_writers import add_format_argument, open_report_writer, output_path
 
-def get_iam_user_details():
+def get_iam_user_details(journal=None):
     iam = boto3.client('iam')
-    users_data = []
 
     paginator = iam.get_paginator('list_users')
     for page in paginator.paginate():
         for user in page['Users']:
             username = user['UserName']
 
+            # Replay users finished by an interrupted run (--resume).
+            if journal is not None and username in journal:
+                yield journal.get(username)
+                continue
+
+            started = time.perf_counter()
+
             # --- Groups Attached to the User ---
             groups_resp = iam.list_groups_for_user(UserName=username)
             group_names = [g['GroupName'] for g in groups_resp.get('Groups', [])]
@@ -41,19 +52,25 @@ def get_iam_user_details():
             # --- All Effective Policies ---
             all_policies = direct_policies + group_policies
 
-            users_data.append([
+            row = [
                 username,
                 ", ".join(group_names) if group_names else "None",
                 ", ".join(all_policies) if all_policies else "None",
                 ", ".join(direct_policies) if direct_policies else "None",
                 ", ".join(group_policies) if group_policies else "None"
-            ])
-    
-    return users_data
-
-
-if __name__ == '__main__':
-    output_file = "iam_user_policy_report.csv"
+            ]
+            tracing.add_span('user', started, time.perf_counter(), args={'user': username})
+            if journal is not None:
+                journal.record(username, row)
+            yield row
+
+
+def main():
+    aws_instrumentation.install()
+    parser = argparse.ArgumentParser(description="IAM user and group policy report.")
+    args = tracing.add_trace_arguments(add_resume_argument(add_format_argument(parser))).parse_args()
+    tracing.setup(args)
+    output_file = output_path("iam_user_policy_report.csv", args.format)
     headers = [
         "Username",
         "Attached Groups",
@@ -62,11 +79,14 @@ if __name__ == '__main__':
         "Group Policies Only"
     ]
 
-    data = get_iam_user_details()
+    journal = CheckpointJournal('iamuserandgrouppolicies', resume=args.resume)
+    with open_report_writer(output_file, headers, args.format) as writer:
+        with tracing.span('write-report', format=args.format):
+            writer.write_rows(get_iam_user_details(journal))
+    journal.complete()
+
+    print(f"\n✅ {args.format.upper()} file '{output_file}' created successfully in the current CloudShell directory.")
 
-    with open(output_file, mode='w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(headers)
-        writer.writerows(data)
 
-    print(f"\n✅ CSV file '{output_file}' created successfully in the current CloudShell directory.")
+if __name__ == '__main__':
+    main()
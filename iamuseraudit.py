@@ -1,10 +1,14 @@
+import argparse
 import boto3
-import csv
+import time
+import aws_instrumentation
+import tracing
+from checkpoint import CheckpointJournal, add_resume_argument
+from report_writers import add_format_argument, open_report_writer, output_path
 
-def get_iam_details():
-    """Retrieve read-only IAM details without modifications."""
+def get_iam_details(journal=None):
+    """Retrieve read-only IAM details without modifications, yielding one row per user."""
     iam_client = boto3.client('iam')
-    users_data = []
 
     # Use paginator to go through all IAM users.
     paginator = iam_client.get_paginator('list_users')
@@ -12,6 +16,13 @@ def get_iam_details():
         for user in page['Users']:
             username = user['UserName']
 
+            # Replay users finished by an interrupted run (--resume).
+            if journal is not None and username in journal:
+                yield journal.get(username)
+                continue
+
+            started = time.perf_counter()
+
             # Retrieve groups the user belongs to.
             groups_resp = iam_client.list_groups_for_user(UserName=username)
             groups = ', '.join([group['GroupName'] for group in groups_resp.get('Groups', [])])
@@ -36,25 +47,35 @@ def get_iam_details():
                 access_keys_info.append(f"{key_id} (Last Used: {service} on {last_used_date})")
             access_keys_str = " | ".join(access_keys_info)
 
-            # Append aggregated data for the user.
-            users_data.append([
+            # Yield aggregated data for the user.
+            row = [
                 username,
                 groups if groups else "None",
                 aws_managed if aws_managed else "None",
                 custom_policies if custom_policies else "None",
                 access_keys_str if access_keys_str else "None"
-            ])
-    return users_data
+            ]
+            tracing.add_span('user', started, time.perf_counter(), args={'user': username})
+            if journal is not None:
+                journal.record(username, row)
+            yield row
 
-if __name__ == '__main__':
-    iam_details = get_iam_details()
-    filename = 'iam_details.csv'
+def main():
+    aws_instrumentation.install()
+    parser = argparse.ArgumentParser(description="IAM user audit report.")
+    args = tracing.add_trace_arguments(add_resume_argument(add_format_argument(parser))).parse_args()
+    tracing.setup(args)
+    filename = output_path('iam_details.csv', args.format)
     headers = ["UserName", "Groups", "AWS Managed Policies", "Custom Policies", "Access Keys (Last Used)"]
 
-    # Write details to CSV file.
-    with open(filename, mode='w', newline='', encoding='utf-8') as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerow(headers)
-        writer.writerows(iam_details)
+    # Stream rows to the report as each user is processed.
+    journal = CheckpointJournal('iamuseraudit', resume=args.resume)
+    with open_report_writer(filename, headers, args.format) as writer:
+        with tracing.span('write-report', format=args.format):
+            writer.write_rows(get_iam_details(journal))
+    journal.complete()
 
-    print(f"CSV file '{filename}' has been created with the IAM audit details.")
+    print(f"{args.format.upper()} file '{filename}' has been created with the IAM audit details.")
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,33 @@
+import argparse
 import boto3
-import csv
+import botocore
+import time
+import aws_instrumentation
+import tracing
+import service_last_accessed
+from api_plan import ApiPlan, add_plan_argument, pages
+from checkpoint import CheckpointJournal, add_resume_argument, journaled_units
+from iamroleaudit import parse_users
+from report_writers import add_format_argument, open_report_writer, output_path
 
-def get_iam_details():
+SAVED_CREDENTIAL_REPORT = 'credential_report.csv'  # as saved by credential_analytics.py --save
+
+def get_iam_details(journal=None):
     iam_client = boto3.client('iam')
-    users_data = []
 
     paginator = iam_client.get_paginator('list_users')
     for page in paginator.paginate():
         for user in page['Users']:
             username = user['UserName']
 
+            # Replay users finished by an interrupted run (--resume).
+            if journal is not None and username in journal:
+                yield journal.get(username)
+                continue
+
+            # Timed by hand: a span around the body would also count the consumer's time at `yield`.
+            started = time.perf_counter()
+
             # Groups and their attached policies
             groups_resp = iam_client.list_groups_for_user(UserName=username)
             groups = [g['GroupName'] for g in groups_resp.get('Groups', [])]
@@ -55,17 +73,100 @@ def get_iam_details():
                 access_keys.append(f"{key_id} (Used: {service} on {last_used})")
             access_keys_str = " | ".join(access_keys) if access_keys else "None"
 
-            users_data.append([
+            row = [
                 username,
                 ", ".join(groups) if groups else "None",
                 ", ".join(user_aws_policies + group_aws_policies) if (user_aws_policies or group_aws_policies) else "None",
                 ", ".join(user_customer_policies + group_customer_policies) if (user_customer_policies or group_customer_policies) else "None",
                 access_keys_str
-            ])
-    return users_data
+            ]
+            tracing.add_span('user', started, time.perf_counter(), args={'user': username})
+            if journal is not None:
+                journal.record(username, row)
+            yield row
 
-if __name__ == '__main__':
-    iam_details = get_iam_details()
+def with_service_usage(rows, usage_by_user):
+    """Append the services granted vs used columns to get_iam_details() rows."""
+    for row in rows:
+        yield row + service_last_accessed.usage_columns(usage_by_user.get(row[0]))
+
+def existing_credential_report(iam, path=SAVED_CREDENTIAL_REPORT):
+    """
+    A credential report without generating one: the saved file, else the report IAM still
+    holds from its last generation. Returns (report, source), or (None, None) if neither exists.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return fh.read(), f"'{path}'"
+    except FileNotFoundError:
+        pass
+    try:
+        return iam.get_credential_report()['Content'].decode('utf-8'), "the last generated credential report"
+    except botocore.exceptions.ClientError:
+        return None, None
+
+def plan_iam_details(iam, resume=False, service_usage=False):
+    """
+    --plan: estimate get_iam_details() from the account summary, the group memberships of
+    every user (paginated get_account_authorization_details, no per-group calls) and an
+    existing credential report (access keys), without the per-user calls.
+    """
+    users = iam.get_account_summary()['SummaryMap']['Users']
+    memberships = 0
+    for page in iam.get_paginator('get_account_authorization_details').paginate(Filter=['User']):
+        memberships += sum(len(user.get('GroupList', [])) for user in page['UserDetailList'])
+    report, report_source = existing_credential_report(iam)
+    if report is not None:
+        keys = sum(1 for user in parse_users(report) if user['user'] != '<root_account>'
+                   for n in ('1', '2') if user.get(f'access_key_{n}_last_rotated', 'N/A') != 'N/A')
+    else:
+        keys = users  # assumed one key per user
+
+    journaled = journaled_units('iamuserauditnew')
+    remaining = users - journaled if resume else users
+    share = remaining / users if users else 0
+    plan = ApiPlan('iamuserauditnew.py')
+    plan.add('iam', 'ListUsers', pages(users, 100))
+    plan.add('iam', 'ListGroupsForUser', remaining)
+    plan.add('iam', 'ListAttachedGroupPolicies', memberships * share)
+    plan.add('iam', 'ListGroupPolicies', memberships * share)
+    plan.add('iam', 'ListAttachedUserPolicies', remaining)
+    plan.add('iam', 'ListUserPolicies', remaining)
+    plan.add('iam', 'ListAccessKeys', remaining)
+    plan.add('iam', 'GetAccessKeyLastUsed', keys * share)
+    if report is not None:
+        plan.note(f"{users} user(s), {memberships} group membership(s), {keys} access key(s) (from {report_source})")
+    else:
+        plan.note(f"{users} user(s), {memberships} group membership(s); access keys assumed one per user: "
+                  f"the key count needs a credential report (credential_analytics.py --save {SAVED_CREDENTIAL_REPORT})")
+    if journaled:
+        plan.note(f"{journaled} user(s) are in the checkpoint journal: "
+                  + ("skipped with --resume" if resume else "--resume would skip them"))
+
+    if service_usage:
+        cache = service_last_accessed.load_cache()
+        now = time.time()
+        cached = sum(1 for arn, entry in cache.items()
+                     if ':user/' in arn and now - entry.get('FetchedAt', 0) < service_last_accessed.CACHE_TTL)
+        jobs = max(0, users - cached)
+        plan.add('iam', 'ListUsers', pages(users, 100))
+        plan.add('iam', 'GenerateServiceLastAccessedDetails', jobs, workers=service_last_accessed.SUBMIT_WORKERS)
+        # At least one poll per job; jobs still being built by IAM are polled again.
+        plan.add('iam', 'GetServiceLastAccessedDetails', jobs, workers=service_last_accessed.POLL_BATCH)
+        plan.note(f"--service-usage: {cached} user(s) reused from {service_last_accessed.CACHE_FILE}")
+    return plan
+
+def main():
+    aws_instrumentation.install()
+    parser = argparse.ArgumentParser(description="IAM user audit report (AWS vs customer policies).")
+    parser.add_argument('--service-usage', action='store_true',
+                        help="add services granted vs used columns (service last accessed data)")
+    args = tracing.add_trace_arguments(add_plan_argument(add_resume_argument(add_format_argument(parser)))).parse_args()
+    tracing.setup(args)
+    if args.plan:
+        plan_iam_details(boto3.client('iam'), args.resume, args.service_usage).report()
+        return
+    filename = output_path('iam_details.csv', args.format)
     headers = [
         "UserName", 
         "Groups", 
@@ -74,9 +175,24 @@ if __name__ == '__main__':
         "Access Keys (Last Used)"
     ]
 
-    with open('iam_details.csv', mode='w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(headers)
-        writer.writerows(iam_details)
+    if args.service_usage:
+        headers += service_last_accessed.USAGE_HEADERS
+        # Collected before the per-user scan so the report still streams row by row.
+        with tracing.span('service-last-accessed'):
+            users = service_last_accessed.list_principals(boto3.client('iam'), roles=False)
+            usage = service_last_accessed.collect([arn for _, _, arn in users])
+        usage_by_user = {name: usage.get(arn) for _, name, arn in users}
 
-    print("CSV file 'iam_details.csv' created with IAM audit details.")
+    journal = CheckpointJournal('iamuserauditnew', resume=args.resume)
+    rows = get_iam_details(journal)
+    if args.service_usage:
+        rows = with_service_usage(rows, usage_by_user)
+    with open_report_writer(filename, headers, args.format) as writer:
+        with tracing.span('write-report', format=args.format):
+            writer.write_rows(rows)
+    journal.complete()
+
+    print(f"{args.format.upper()} file '{filename}' created with IAM audit details.")
+
+if __name__ == '__main__':
+    main()
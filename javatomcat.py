@@ -1,24 +1,18 @@
 import boto3
+import aws_instrumentation
 import time
 import csv
-from tabulate import tabulate
 from datetime import datetime
+from records import InstanceSummary
 
 def list_instances():
     ec2 = boto3.client("ec2")
-    response = ec2.describe_instances()
     instances = []
-    for reservation in response.get("Reservations", []):
-        for instance in reservation.get("Instances", []):
-            name = "(no name)"
-            for tag in instance.get("Tags", []):
-                if tag["Key"] == "Name":
-                    name = tag["Value"]
-            instances.append({
-                "InstanceId": instance["InstanceId"],
-                "Name": name,
-                "State": instance["State"]["Name"]
-            })
+    # Each page is reduced to InstanceSummary records and dropped before the next is fetched.
+    for page in ec2.get_paginator("describe_instances").paginate():
+        for reservation in page.get("Reservations", []):
+            for instance in reservation.get("Instances", []):
+                instances.append(InstanceSummary.from_instance(instance))
     return instances
 
 def send_ssm_command(instance_id, command):
@@ -45,6 +39,7 @@ def get_command_output(ssm, instance_id, command_id):
             time.sleep(2)
 
 def main():
+    aws_instrumentation.install()
     instances = list_instances()
     if not instances:
         print("No EC2 instances found.")
@@ -99,6 +94,7 @@ def main():
         writer.writerows(rows)
 
     # Print table
+    from tabulate import tabulate
     print("\nTomcat Audit Results:")
     print(tabulate(rows, headers=["Instance Name", "User", "Tomcat Directories"], tablefmt="grid"))
     print(f"\nData saved to: {filename}")
@@ -1,11 +1,22 @@
+import argparse
 import boto3
+import aws_instrumentation
+import time
+from collections import deque
 from datetime import datetime, timedelta
 
 INSTANCE_ID = "i-08bd03bdecb4635ba"  # Replace with your test instance
 
-cloudwatch = boto3.client('cloudwatch')
+# Watch mode
+WATCH_NAMESPACE = 'CWAgent'
+WATCH_INTERVAL = 60           # seconds between GetMetricData calls
+WATCH_LOOKBACK = 10           # minutes of data requested per call
+WATCH_STALE_AFTER = 5         # minutes without a datapoint before an instance counts as stopped
+WATCH_BUFFER_SIZE = 30        # datapoints kept per instance
+WATCH_REDISCOVER_EVERY = 10   # intervals between metric re-discovery for instances without one
+GET_METRIC_DATA_MAX_QUERIES = 500
 
-def has_recent_datapoints(metric):
+def has_recent_datapoints(cloudwatch, metric):
     end_time = datetime.utcnow()
     start_time = end_time - timedelta(minutes=15)
     response = cloudwatch.get_metric_statistics(
@@ -19,7 +30,7 @@ def has_recent_datapoints(metric):
     )
     return len(response['Datapoints']) > 0
 
-def check_instance_metrics(instance_id):
+def check_instance_metrics(cloudwatch, instance_id):
     print(f"🔍 Checking memory-related metrics for instance: {instance_id}")
     metrics = cloudwatch.list_metrics(Dimensions=[{'Name': 'InstanceId', 'Value': instance_id}])
     found = False
@@ -27,7 +38,7 @@ def check_instance_metrics(instance_id):
         name = m['MetricName'].lower()
         if 'mem' in name or 'memory' in name:
             print(f"  📊 Found metric: {m['MetricName']} (Namespace: {m['Namespace']})")
-            if has_recent_datapoints(m):
+            if has_recent_datapoints(cloudwatch, m):
                 print("    ✅ Receiving data.")
                 return True
             else:
@@ -37,8 +48,131 @@ def check_instance_metrics(instance_id):
         print("  ⚠️ No memory-related metrics found.")
     return False
 
-# Run the check
-if check_instance_metrics(INSTANCE_ID):
-    print("\n✅ Instance has working memory metrics.\n")
-else:
-    print("\n❌ Instance is missing memory metrics or no recent data.\n")
+def discover_memory_metrics(cloudwatch, instance_ids, metric_names=None):
+    """
+    One paginated list_metrics over the agent namespace instead of one call per instance.
+    Returns {instance_id: metric} for instances that publish a memory metric; with
+    `metric_names`, only metrics with exactly one of those names count.
+    """
+    wanted = set(instance_ids)
+    found = {}
+    paginator = cloudwatch.get_paginator('list_metrics')
+    for page in paginator.paginate(Namespace=WATCH_NAMESPACE):
+        for m in page['Metrics']:
+            if metric_names is not None:
+                if m['MetricName'] not in metric_names:
+                    continue
+            else:
+                name = m['MetricName'].lower()
+                if 'mem' not in name and 'memory' not in name:
+                    continue
+            for d in m['Dimensions']:
+                if d['Name'] == 'InstanceId' and d['Value'] in wanted and d['Value'] not in found:
+                    found[d['Value']] = m
+    return found
+
+def fetch_latest_datapoints(cloudwatch, metrics):
+    """Batched GetMetricData for every watched metric: {instance_id: [(timestamp, value), ...]}."""
+    end_time = datetime.utcnow()
+    start_time = end_time - timedelta(minutes=WATCH_LOOKBACK)
+    items = list(metrics.items())
+    results = {}
+    for start in range(0, len(items), GET_METRIC_DATA_MAX_QUERIES):
+        chunk = items[start:start + GET_METRIC_DATA_MAX_QUERIES]
+        queries = [{
+            'Id': f"m{n}",
+            'MetricStat': {'Metric': {k: metric[k] for k in ('Namespace', 'MetricName', 'Dimensions')},
+                           'Period': 60, 'Stat': 'Average'},
+            'ReturnData': True,
+        } for n, (_, metric) in enumerate(chunk)]
+        paginator = cloudwatch.get_paginator('get_metric_data')
+        for page in paginator.paginate(MetricDataQueries=queries, StartTime=start_time, EndTime=end_time):
+            for r in page['MetricDataResults']:
+                instance_id = chunk[int(r['Id'][1:])][0]
+                results.setdefault(instance_id, []).extend(zip(r['Timestamps'], r['Values']))
+    return results
+
+def watch(cloudwatch, instance_ids, interval=WATCH_INTERVAL, iterations=None):
+    """
+    Poll memory metrics for all instances every `interval` seconds and print only state
+    transitions. Each instance keeps a fixed-size ring buffer of recent datapoints, so
+    memory and API calls per interval stay constant however long this runs.
+    """
+    buffers = {iid: deque(maxlen=WATCH_BUFFER_SIZE) for iid in instance_ids}
+    state = {}
+    metrics = {}
+    n = 0
+    print(f"👀 Watching memory metrics for {len(instance_ids)} instance(s) every {interval}s (Ctrl-C to stop)")
+    while iterations is None or n < iterations:
+        if n % WATCH_REDISCOVER_EVERY == 0 and len(metrics) < len(instance_ids):
+            metrics.update(discover_memory_metrics(cloudwatch, [i for i in instance_ids if i not in metrics]))
+
+        now = datetime.utcnow()
+        for instance_id, points in fetch_latest_datapoints(cloudwatch, metrics).items():
+            buf = buffers[instance_id]
+            last_seen = buf[-1][0] if buf else None
+            for ts, value in sorted(points):
+                ts = ts.replace(tzinfo=None)
+                if last_seen is None or ts > last_seen:
+                    buf.append((ts, value))
+
+        stale_before = now - timedelta(minutes=WATCH_STALE_AFTER)
+        for instance_id in instance_ids:
+            buf = buffers[instance_id]
+            reporting = bool(buf) and buf[-1][0] >= stale_before
+            previous = state.get(instance_id)
+            if previous is None:
+                state[instance_id] = reporting
+                continue
+            if reporting != previous:
+                state[instance_id] = reporting
+                stamp = now.strftime('%Y-%m-%d %H:%M:%S')
+                if reporting:
+                    print(f"{stamp} 🟢 {instance_id} started reporting (latest {buf[-1][1]:.1f})")
+                else:
+                    print(f"{stamp} 🔴 {instance_id} stopped reporting"
+                          f"{' (no memory metric)' if instance_id not in metrics else ''}")
+
+        if n == 0:
+            up = sum(1 for v in state.values() if v)
+            print(f"Initial state: {up} reporting, {len(state) - up} not reporting")
+        n += 1
+        if iterations is None or n < iterations:
+            time.sleep(interval)
+    return state
+
+def read_instance_file(path):
+    with open(path, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def main():
+    aws_instrumentation.install()
+    parser = argparse.ArgumentParser(description="Check (or continuously watch) CWAgent memory metrics.")
+    parser.add_argument('--instance', default=INSTANCE_ID, help="instance for the one-shot check")
+    parser.add_argument('--watch', action='store_true', help="keep watching and print state transitions")
+    parser.add_argument('--instances', nargs='+', default=[], help="instances to watch")
+    parser.add_argument('--instances-file', help="file with one instance ID per line (e.g. missing_instances.txt)")
+    parser.add_argument('--interval', type=int, default=WATCH_INTERVAL, help="seconds between polls")
+    args = parser.parse_args()
+
+    cloudwatch = boto3.client('cloudwatch')
+
+    if args.watch:
+        instance_ids = list(dict.fromkeys(args.instances + (read_instance_file(args.instances_file)
+                                                            if args.instances_file else [])))
+        if not instance_ids:
+            parser.error("--watch needs --instances or --instances-file")
+        try:
+            watch(cloudwatch, instance_ids, args.interval)
+        except KeyboardInterrupt:
+            print("\nStopped.")
+        return
+
+    # Run the check
+    if check_instance_metrics(cloudwatch, args.instance):
+        print("\n✅ Instance has working memory metrics.\n")
+    else:
+        print("\n❌ Instance is missing memory metrics or no recent data.\n")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+'''
+memory_report.py
+
+Fleet-wide memory utilization report. cwcheck.py only answers "is memory reporting";
+this pulls N days of the CWAgent memory utilization metric for every instance and works
+out how much memory each one actually uses.
+
+The thresholds below are percentages, so only the percent metrics are used:
+mem_used_percent (Linux) or 'Memory % Committed Bytes In Use' (Windows). Instances that
+publish neither (only mem_used / mem_available bytes, or no agent at all) are skipped
+and listed as such in the report rather than judged on a metric in other units.
+
+Metrics are discovered with one paginated list_metrics over the agent namespace and
+fetched with batched GetMetricData (500 metrics per call). Datapoints are placed into a
+dense NumPy matrix (instances x time buckets, NaN where missing) and p50 / p95 / max /
+coverage and the least-squares trend (percentage points per day) are computed for all
+instances at once.
+
+Right-sizing flags:
+  downsize   p95 < DOWNSIZE_P95 and max < DOWNSIZE_MAX
+  upsize     p95 > UPSIZE_P95
+  growing    trend > GROWING_PER_DAY and p95 > GROWING_MIN_P95
+  sparse     less than MIN_COVERAGE of the buckets have data (stats unreliable)
+
+Usage:
+  python3 memory_report.py --days 14
+  python3 memory_report.py --days 30 --period 3600 --instances-file working_instances.txt --format jsonl
+
+Requires: numpy.
+'''
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import aws_instrumentation
+import tracing
+from cwcheck import get_all_instance_ids
+from matricsreceivecheck import GET_METRIC_DATA_MAX_QUERIES, discover_memory_metrics, read_instance_file
+from report_writers import add_format_argument, open_report_writer, output_path
+
+DEFAULT_DAYS = 14
+DEFAULT_PERIOD = 3600  # seconds per bucket
+DOWNSIZE_P95 = 40.0
+DOWNSIZE_MAX = 60.0
+UPSIZE_P95 = 90.0
+GROWING_PER_DAY = 0.5
+GROWING_MIN_P95 = 70.0
+MIN_COVERAGE = 0.5
+PERCENT_METRICS = ('mem_used_percent', 'Memory % Committed Bytes In Use')
+
+HEADERS = ['InstanceId', 'InstanceType', 'Metric', 'P50', 'P95', 'Max', 'TrendPerDay', 'Coverage', 'Flags']
+
+
+def fetch_matrix(cloudwatch, metrics, start_time, end_time, period, np):
+    """
+    Batched GetMetricData for every metric into a (len(metrics) x buckets) float matrix.
+    Row order follows `metrics` (a list of (instance_id, metric)).
+    """
+    buckets = int((end_time - start_time).total_seconds() // period)
+    matrix = np.full((len(metrics), buckets), np.nan)
+    start_epoch = start_time.timestamp()
+    paginator = cloudwatch.get_paginator('get_metric_data')
+    for offset in range(0, len(metrics), GET_METRIC_DATA_MAX_QUERIES):
+        chunk = metrics[offset:offset + GET_METRIC_DATA_MAX_QUERIES]
+        queries = [{
+            'Id': f"m{offset + n}",
+            'MetricStat': {'Metric': {k: metric[k] for k in ('Namespace', 'MetricName', 'Dimensions')},
+                           'Period': period, 'Stat': 'Average'},
+            'ReturnData': True,
+        } for n, (_, metric) in enumerate(chunk)]
+        for page in paginator.paginate(MetricDataQueries=queries, StartTime=start_time, EndTime=end_time,
+                                       ScanBy='TimestampAscending'):
+            for r in page['MetricDataResults']:
+                if not r['Timestamps']:
+                    continue
+                row = int(r['Id'][1:])
+                ts = np.array([t.timestamp() for t in r['Timestamps']])
+                cols = ((ts - start_epoch) // period).astype(np.int64)
+                keep = (cols >= 0) & (cols < buckets)
+                matrix[row, cols[keep]] = np.asarray(r['Values'], dtype=float)[keep]
+    return matrix
+
+
+def summarize(matrix, period, np):
+    """Vectorized per-row p50, p95, max, coverage and trend (units per day) of a NaN-padded matrix."""
+    valid = ~np.isnan(matrix)
+    counts = valid.sum(axis=1)
+    coverage = counts / matrix.shape[1] if matrix.shape[1] else np.zeros(len(matrix))
+    has_data = counts > 0
+    stats = np.full((len(matrix), 3), np.nan)
+    if has_data.any():
+        rows = matrix[has_data]
+        stats[has_data, 0:2] = np.nanpercentile(rows, [50, 95], axis=1).T
+        stats[has_data, 2] = np.nanmax(rows, axis=1)
+
+    # Least-squares slope with missing points masked out: x in days since the window start.
+    x = np.arange(matrix.shape[1]) * (period / 86400.0)
+    xs = np.where(valid, x, 0.0)
+    ys = np.where(valid, matrix, 0.0)
+    n = np.maximum(counts, 1)
+    x_mean = xs.sum(axis=1) / n
+    y_mean = ys.sum(axis=1) / n
+    dx = np.where(valid, x - x_mean[:, None], 0.0)
+    dy = np.where(valid, matrix - y_mean[:, None], 0.0)
+    denom = (dx * dx).sum(axis=1)
+    trend = np.where(denom > 0, (dx * dy).sum(axis=1) / np.where(denom > 0, denom, 1), np.nan)
+    return stats[:, 0], stats[:, 1], stats[:, 2], trend, coverage
+
+
+def flag(p50, p95, peak, trend, coverage, np):
+    """Right-sizing flags per instance as comma-joined strings."""
+    with np.errstate(invalid='ignore'):
+        rules = [
+            ('downsize', (p95 < DOWNSIZE_P95) & (peak < DOWNSIZE_MAX)),
+            ('upsize', p95 > UPSIZE_P95),
+            ('growing', (trend > GROWING_PER_DAY) & (p95 > GROWING_MIN_P95)),
+            ('sparse', coverage < MIN_COVERAGE),
+        ]
+    flags = [[] for _ in range(len(p50))]
+    for name, mask in rules:
+        for i in np.flatnonzero(mask):
+            flags[i].append(name)
+    return [', '.join(f) for f in flags]
+
+
+def _fmt(value):
+    return '' if value != value else f"{value:.2f}"  # NaN -> ''
+
+
+def main():
+    aws_instrumentation.install()
+    parser = argparse.ArgumentParser(description="Memory utilization percentiles and right-sizing candidates.")
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help="days of history to analyse")
+    parser.add_argument('--period', type=int, default=DEFAULT_PERIOD, help="seconds per datapoint bucket")
+    parser.add_argument('--instances-file', help="analyse only these instances (default: all in the region)")
+    add_format_argument(parser)
+    tracing.add_trace_arguments(parser)
+    args = parser.parse_args()
+    tracing.setup(args)
+
+    try:
+        import numpy as np
+    except ImportError:
+        print("memory_report.py requires numpy (pip install numpy)", file=sys.stderr)
+        sys.exit(1)
+
+    cloudwatch = boto3.client('cloudwatch')
+    if args.instances_file:
+        instance_ids = read_instance_file(args.instances_file)
+    else:
+        with tracing.span('list-instances'):
+            instance_ids = get_all_instance_ids(boto3.client('ec2'))
+    print(f"🔎 {len(instance_ids)} instance(s); discovering memory metrics...")
+
+    with tracing.span('discover-metrics'):
+        found = discover_memory_metrics(cloudwatch, instance_ids, PERCENT_METRICS)
+    metrics = [(iid, found[iid]) for iid in instance_ids if iid in found]
+    skipped = len(instance_ids) - len(metrics)
+    print(f"📊 {len(metrics)} instance(s) publish a memory percent metric; fetching {args.days} days of data...")
+    if skipped:
+        print(f"⏭️  Skipping {skipped} instance(s) without {' or '.join(PERCENT_METRICS)}")
+
+    end_time = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    start_time = end_time - timedelta(days=args.days)
+    with tracing.span('fetch-datapoints', metrics=len(metrics)):
+        matrix = fetch_matrix(cloudwatch, metrics, start_time, end_time, args.period, np)
+
+    analysis_start = time.perf_counter()
+    with tracing.span('analyse', shape=list(matrix.shape)):
+        p50, p95, peak, trend, coverage = summarize(matrix, args.period, np)
+        flags = flag(p50, p95, peak, trend, coverage, np)
+    elapsed = time.perf_counter() - analysis_start
+
+    filename = output_path('memory_utilization_report.csv', args.format)
+    with tracing.span('write-report'), open_report_writer(filename, HEADERS, args.format) as writer:
+        for i, (instance_id, metric) in enumerate(metrics):
+            dims = {d['Name']: d['Value'] for d in metric['Dimensions']}
+            writer.write([instance_id, dims.get('InstanceType', ''), metric['MetricName'],
+                          _fmt(p50[i]), _fmt(p95[i]), _fmt(peak[i]), _fmt(trend[i]),
+                          f"{coverage[i]:.2f}", flags[i]])
+        for instance_id in instance_ids:
+            if instance_id not in found:
+                writer.write([instance_id, '', '', '', '', '', '', '0.00', 'skipped: no memory percent metric'])
+
+    counts = {name: sum(1 for f in flags if name in f) for name in ('downsize', 'upsize', 'growing', 'sparse')}
+    print(f"⚙️  Analysed {matrix.shape[0]} x {matrix.shape[1]} datapoints in {elapsed:.2f}s: "
+          + ", ".join(f"{n} {name}" for name, n in counts.items()))
+    print(f"✅ Report saved to '{filename}'")
+
+
+if __name__ == '__main__':
+    main()
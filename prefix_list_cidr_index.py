@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+'''
+prefix_list_cidr_index.py
+
+Answers "which prefix lists (and so which security groups) contain 10.4.7.12 or overlap
+10.4.0.0/16" during incidents.
+
+Entries of every customer-managed prefix list are fetched with
+get_managed_prefix_list_entries, in parallel across regions, and cached on disk together
+with the list version they belong to. The prefix list index (prefix_list_index.py)
+tells us which lists changed, so a refresh only re-fetches entries of new or modified
+lists.
+
+Queries run against an in-memory index over IPv4 and IPv6 CIDRs: for every prefix length
+present, a dict from network address to entries (containment = one dict lookup per
+length) and a sorted array of network addresses (entries inside a query network = one
+bisect range per length). Either query costs O(number of distinct prefix lengths), not
+O(number of entries).
+
+Usage:
+  python3 prefix_list_cidr_index.py refresh [--force]
+  python3 prefix_list_cidr_index.py query 10.4.7.12 10.4.0.0/16 [--associations]
+'''
+import argparse
+import bisect
+import ipaddress
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import prefix_list_index
+
+ENTRIES_FILE = 'prefix_list_entries.json'
+FETCH_WORKERS = 8
+
+
+class CidrIndex(object):
+    """Prefix-length buckets of network addresses for fast containment and overlap queries."""
+
+    def __init__(self):
+        # version -> {prefixlen: {network_int: [payload, ...]}}
+        self._exact = {4: {}, 6: {}}
+        # version -> {prefixlen: sorted [network_int, ...]}
+        self._sorted = {4: {}, 6: {}}
+        self._dirty = True
+        self.size = 0
+
+    def add(self, cidr, payload):
+        net = ipaddress.ip_network(cidr, strict=False)
+        bucket = self._exact[net.version].setdefault(net.prefixlen, {})
+        bucket.setdefault(int(net.network_address), []).append(payload)
+        self._dirty = True
+        self.size += 1
+
+    def _prepare(self):
+        if self._dirty:
+            self._sorted = {v: {plen: sorted(b) for plen, b in buckets.items()}
+                            for v, buckets in self._exact.items()}
+            self._dirty = False
+
+    def containing(self, address):
+        """Payloads of every CIDR that contains `address` (an IP or a network)."""
+        net = ipaddress.ip_network(address, strict=False)
+        bits = net.max_prefixlen
+        value = int(net.network_address)
+        result = []
+        for plen, bucket in self._exact[net.version].items():
+            if plen > net.prefixlen:
+                continue
+            masked = value >> (bits - plen) << (bits - plen) if plen else 0
+            result.extend(bucket.get(masked, ()))
+        return result
+
+    def overlapping(self, network):
+        """Payloads of every CIDR that contains, equals or lies inside `network`."""
+        self._prepare()
+        net = ipaddress.ip_network(network, strict=False)
+        result = self.containing(net)
+        low = int(net.network_address)
+        high = int(net.broadcast_address)
+        for plen, starts in self._sorted[net.version].items():
+            if plen <= net.prefixlen:
+                continue
+            bucket = self._exact[net.version][plen]
+            for start in starts[bisect.bisect_left(starts, low):bisect.bisect_right(starts, high)]:
+                result.extend(bucket[start])
+        return result
+
+
+def load_entries(path=ENTRIES_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_entries(entries, path=ENTRIES_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(entries, fh)
+    os.replace(tmp_path, path)
+
+
+def fetch_entries(session, record):
+    ec2 = session.client('ec2', region_name=record['Region'])
+    entries = []
+    paginator = ec2.get_paginator('get_managed_prefix_list_entries')
+    for page in paginator.paginate(PrefixListId=record['PrefixListId'], TargetVersion=record['Version']):
+        for e in page.get('Entries', []):
+            entries.append([e['Cidr'], e.get('Description', '')])
+    return entries
+
+
+def refresh_entries(session, entries, pl_index, workers=FETCH_WORKERS):
+    """
+    Bring the entry cache in line with the prefix list index: fetch entries for
+    customer-managed lists whose cached version differs, drop lists that disappeared.
+    Returns the number of lists fetched.
+    """
+    import botocore
+    current = {}
+    for region_data in pl_index['regions'].values():
+        for plid, record in region_data.get('lists', {}).items():
+            if not record['AwsManaged']:
+                current[plid] = record
+    todo = [r for plid, r in current.items() if entries.get(plid, {}).get('Version') != r['Version']]
+
+    def fetch(record):
+        try:
+            return record, fetch_entries(session, record)
+        except botocore.exceptions.ClientError as e:
+            print(f"  ⚠️ {record['PrefixListId']} ({record['Region']}): {e.response['Error']['Code']}", file=sys.stderr)
+            return record, None
+
+    # Interleave regions so the pool works on all of them at once instead of one region at a time.
+    by_region = {}
+    for record in todo:
+        by_region.setdefault(record['Region'], []).append(record)
+    todo = [r for group in itertools.zip_longest(*by_region.values()) for r in group if r is not None]
+    fetched = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for record, cidrs in pool.map(fetch, todo):
+            if cidrs is None:
+                continue
+            entries[record['PrefixListId']] = {
+                'Region': record['Region'], 'PrefixListName': record['PrefixListName'],
+                'Version': record['Version'], 'Entries': cidrs, 'FetchedAt': time.time()}
+            fetched += 1
+    for plid in set(entries) - set(current):
+        del entries[plid]
+    return fetched
+
+
+def build_cidr_index(entries):
+    index = CidrIndex()
+    for plid, data in entries.items():
+        for cidr, description in data['Entries']:
+            index.add(cidr, (plid, data['Region'], data['PrefixListName'], cidr, description))
+    return index
+
+
+def get_associations(session, plid, region):
+    """Resources (security groups, route tables) that reference the prefix list."""
+    ec2 = session.client('ec2', region_name=region)
+    resources = []
+    paginator = ec2.get_paginator('get_managed_prefix_list_associations')
+    for page in paginator.paginate(PrefixListId=plid):
+        for assoc in page.get('PrefixListAssociations', []):
+            resources.append(f"{assoc.get('ResourceId')} ({assoc.get('ResourceOwner')})")
+    return resources
+
+
+def main():
+    import boto3
+    import aws_instrumentation
+    session = aws_instrumentation.install(boto3.Session())
+
+    parser = argparse.ArgumentParser(description="CIDR containment / overlap queries over prefix list entries.")
+    parser.add_argument('--entries', default=ENTRIES_FILE, help="entry cache file")
+    parser.add_argument('--index', default=prefix_list_index.INDEX_FILE, help="prefix list index file")
+    sub = parser.add_subparsers(dest='command', required=True)
+    ref = sub.add_parser('refresh', help="refresh the prefix list index and re-fetch changed lists' entries")
+    ref.add_argument('--force', action='store_true', help="re-list every region and re-fetch all entries")
+    q = sub.add_parser('query', help="prefix lists containing an IP or overlapping a CIDR")
+    q.add_argument('targets', nargs='+', help="IP addresses or CIDRs")
+    q.add_argument('--associations', action='store_true', help="also list the resources using each match")
+    args = parser.parse_args()
+
+    entries = load_entries(args.entries)
+    if args.command == 'refresh' or not entries:
+        pl_index = prefix_list_index.load_index(args.index)
+        force = args.command == 'refresh' and args.force
+        prefix_list_index.refresh(pl_index, session, 0 if force else prefix_list_index.INDEX_MAX_AGE)
+        prefix_list_index.save_index(pl_index, args.index)
+        if force:
+            entries = {}
+        fetched = refresh_entries(session, entries, pl_index)
+        save_entries(entries, args.entries)
+        print(f"✅ Entries of {fetched} prefix list(s) fetched; {len(entries)} customer-managed lists cached.",
+              file=sys.stderr)
+        if args.command == 'refresh':
+            return
+
+    start = time.perf_counter()
+    index = build_cidr_index(entries)
+    built = time.perf_counter()
+    associations = {}
+    for target in args.targets:
+        try:
+            net = ipaddress.ip_network(target, strict=False)
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            continue
+        t0 = time.perf_counter()
+        single = net.num_addresses == 1
+        matches = index.containing(net) if single else index.overlapping(net)
+        elapsed_us = (time.perf_counter() - t0) * 1e6
+        verb = 'containing' if single else 'overlapping'
+        print(f"🔎 Prefix lists {verb} {target}: {len(matches)} entr{'y' if len(matches) == 1 else 'ies'} "
+              f"({elapsed_us:.0f} µs)")
+        for plid, region, name, cidr, description in sorted(matches):
+            print(f"  {region:<16} {plid:<26} {name:<30} {cidr:<20} {description}")
+            if args.associations:
+                if plid not in associations:
+                    associations[plid] = get_associations(session, plid, region)
+                print(f"      used by: {', '.join(associations[plid]) or 'nothing'}")
+    print(f"\n({index.size} entries indexed in {(built - start) * 1000:.1f} ms)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
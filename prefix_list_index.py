@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+'''
+prefix_list_index.py
+
+Persistent cross-region index of every visible managed prefix list, so repeat lookups
+of a pl- ID are answered from disk instead of rescanning every region.
+
+For each region the index keeps ID, region, name, owner, AWS-managed flag, state,
+address family, version and max entries, plus when the region was last fetched. A
+refresh only re-lists regions whose data is older than the allowed age and compares
+the stored version numbers with the fresh listing, so callers (e.g. the CIDR index)
+learn exactly which lists were added, changed or removed.
+
+Lookups that miss force a refresh of regions not fetched within the last few minutes,
+so a newly created list is still found.
+
+Usage:
+  python3 prefix_list_index.py refresh [--force]
+  python3 prefix_list_index.py lookup pl-0123456789abcdef0 pl-...
+  python3 prefix_list_index.py lookup --input prefix_ids.txt
+'''
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+INDEX_FILE = 'prefix_list_index.json'
+INDEX_MAX_AGE = 6 * 3600   # seconds before a region is re-listed
+MISS_REFRESH_AGE = 300     # on a lookup miss, re-list regions older than this
+REGION_WORKERS = 8
+FIELDS = ('PrefixListId', 'PrefixListName', 'OwnerId', 'State', 'AddressFamily', 'MaxEntries', 'Version')
+
+
+def empty_index():
+    return {'regions_fetched_at': 0, 'region_names': [], 'regions': {}}
+
+
+def load_index(path=INDEX_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return empty_index()
+
+
+def save_index(index, path=INDEX_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(index, fh)
+    os.replace(tmp_path, path)
+
+
+def _record(pl, region):
+    record = {k: pl.get(k) for k in FIELDS}
+    record['Region'] = region
+    record['AwsManaged'] = pl.get('OwnerId') == 'AWS'
+    return record
+
+
+def fetch_region(session, region):
+    """List every managed prefix list visible in `region`: {id: record}."""
+    ec2 = session.client('ec2', region_name=region)
+    lists = {}
+    for page in ec2.get_paginator('describe_managed_prefix_lists').paginate():
+        for pl in page.get('PrefixLists', []):
+            lists[pl['PrefixListId']] = _record(pl, region)
+    return lists
+
+
+def _region_names(index, session, max_age):
+    if not index['region_names'] or time.time() - index['regions_fetched_at'] > max_age:
+        ec2 = session.client('ec2')
+        index['region_names'] = [r['RegionName'] for r in ec2.describe_regions()['Regions']]
+        index['regions_fetched_at'] = time.time()
+    return index['region_names']
+
+
+def refresh(index, session, max_age=INDEX_MAX_AGE, regions=None, workers=REGION_WORKERS):
+    """
+    Re-list every region whose data is older than `max_age` (0 forces all) and return
+    {region: {'added': [...], 'changed': [...], 'removed': [...]}} based on stored versions.
+    """
+    import botocore
+    now = time.time()
+    regions = regions or _region_names(index, session, max_age or INDEX_MAX_AGE)
+    stale = [r for r in regions if now - index['regions'].get(r, {}).get('fetched_at', 0) >= max_age]
+
+    def fetch(region):
+        try:
+            return region, fetch_region(session, region)
+        except botocore.exceptions.ClientError as e:
+            print(f"  ⚠️ Skipping {region}: {e.response['Error']['Code']}", file=sys.stderr)
+            return region, None
+
+    changes = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for region, lists in pool.map(fetch, stale):
+            if lists is None:
+                continue
+            old = index['regions'].get(region, {}).get('lists', {})
+            changes[region] = {
+                'added': sorted(set(lists) - set(old)),
+                'removed': sorted(set(old) - set(lists)),
+                'changed': sorted(i for i in set(lists) & set(old) if lists[i]['Version'] != old[i]['Version']),
+            }
+            index['regions'][region] = {'fetched_at': now, 'lists': lists}
+    return changes
+
+
+def lookup(index, prefix_ids):
+    """Map each ID to its records (normally one) from the index, without any API call."""
+    matches = {plid: [] for plid in prefix_ids}
+    for region_data in index['regions'].values():
+        lists = region_data.get('lists', {})
+        for plid in prefix_ids:
+            if plid in lists:
+                matches[plid].append(lists[plid])
+    return matches
+
+
+def locate_cached(prefix_ids, session, path=INDEX_FILE, max_age=INDEX_MAX_AGE, regions=None):
+    """Answer from the on-disk index, re-listing only stale regions (and recent ones on a miss)."""
+    index = load_index(path)
+    refresh(index, session, max_age, regions)
+    matches = lookup(index, prefix_ids)
+    if any(not found for found in matches.values()):
+        refresh(index, session, MISS_REFRESH_AGE, regions)
+        matches = lookup(index, prefix_ids)
+    save_index(index, path)
+    return matches
+
+
+def main():
+    import boto3
+    import aws_instrumentation
+    from prefix_list_locator import read_prefix_ids, print_table
+    session = aws_instrumentation.install(boto3.Session())
+
+    parser = argparse.ArgumentParser(description="Persistent cross-region managed prefix list index.")
+    parser.add_argument('--index', default=INDEX_FILE, help="index file")
+    sub = parser.add_subparsers(dest='command', required=True)
+    ref = sub.add_parser('refresh', help="re-list stale regions")
+    ref.add_argument('--force', action='store_true', help="re-list every region regardless of age")
+    ref.add_argument('--max-age', type=int, default=INDEX_MAX_AGE, help="seconds before a region is stale")
+    look = sub.add_parser('lookup', help="find prefix list IDs in the index")
+    look.add_argument('ids', nargs='*')
+    look.add_argument('--input', help="file with one prefix list ID per line")
+    look.add_argument('--max-age', type=int, default=INDEX_MAX_AGE, help="seconds before a region is stale")
+    args = parser.parse_args()
+
+    if args.command == 'refresh':
+        index = load_index(args.index)
+        changes = refresh(index, session, 0 if args.force else args.max_age)
+        save_index(index, args.index)
+        total = sum(len(r.get('lists', {})) for r in index['regions'].values())
+        for region, change in sorted(changes.items()):
+            if any(change.values()):
+                print(f"{region}: {len(change['added'])} added, {len(change['changed'])} changed, "
+                      f"{len(change['removed'])} removed")
+        print(f"✅ {len(changes)} region(s) re-listed; {total} prefix lists indexed in '{args.index}'")
+        return
+
+    prefix_ids = list(args.ids)
+    if args.input:
+        prefix_ids += [i for i in read_prefix_ids(args.input) if i not in prefix_ids]
+    if not prefix_ids:
+        parser.error("no prefix list IDs given")
+    matches = locate_cached(prefix_ids, session, args.index, args.max_age)
+    for plid in prefix_ids:
+        if matches[plid]:
+            print_table(matches[plid], ['Region', 'PrefixListId', 'PrefixListName', 'OwnerId', 'AwsManaged',
+                                        'Version', 'MaxEntries'])
+        else:
+            print(f"❌ {plid} not found in any region")
+
+
+if __name__ == '__main__':
+    main()
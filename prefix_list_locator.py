@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+'''
+prefix_list_locator.py
+
+Read-only Python replacement for check_prefix_lists.sh, check_prefix_lists_console_view.sh
+and plfinal.sh. Instead of forking the AWS CLI once per (ID, region) pair, it issues one
+paginated describe_managed_prefix_lists per region, filtered on every requested ID at
+once, and queries all regions in parallel.
+
+Modes:
+  customer  customer-managed lists owned by this account only (check_prefix_lists.sh)
+  console   every match with Region/ID/Name/Owner, like the console (check_prefix_lists_console_view.sh)
+  all       every visible match, reporting IDs found nowhere (plfinal.sh)
+
+With --use-index, lookups are answered from the on-disk index kept by
+prefix_list_index.py, which only re-lists regions whose data is stale.
+
+Usage:
+  python3 prefix_list_locator.py                    # customer mode, reads prefix_ids.txt
+  python3 prefix_list_locator.py --mode console --input my_ids.txt
+  python3 prefix_list_locator.py --use-index        # instant repeat lookups
+'''
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import botocore
+import aws_instrumentation
+import prefix_list_index
+
+INPUT_FILE = 'prefix_ids.txt'
+REGION_WORKERS = 8
+# describe_managed_prefix_lists accepts at most 200 values per filter.
+FILTER_CHUNK = 200
+SEPARATOR = '-' * 45
+
+
+def read_prefix_ids(path=INPUT_FILE):
+    ids = []
+    with open(path, 'r') as f:
+        for line in f:
+            plid = line.strip()
+            if plid and plid not in ids:
+                ids.append(plid)
+    return ids
+
+
+def list_regions(ec2):
+    return [r['RegionName'] for r in ec2.describe_regions()['Regions']]
+
+
+def find_in_region(session, region, prefix_ids):
+    """Return every prefix list in `region` whose ID is in `prefix_ids` (one paginated call per 200 IDs)."""
+    ec2 = session.client('ec2', region_name=region)
+    found = []
+    paginator = ec2.get_paginator('describe_managed_prefix_lists')
+    for start in range(0, len(prefix_ids), FILTER_CHUNK):
+        chunk = prefix_ids[start:start + FILTER_CHUNK]
+        for page in paginator.paginate(Filters=[{'Name': 'prefix-list-id', 'Values': chunk}]):
+            for pl in page.get('PrefixLists', []):
+                found.append(dict(pl, Region=region))
+    return found
+
+
+def locate(prefix_ids, session=None, regions=None, workers=REGION_WORKERS):
+    """Map each prefix list ID to the list of matches ({..., 'Region': r}) across all regions."""
+    session = session or boto3.Session()
+    if regions is None:
+        regions = list_regions(session.client('ec2'))
+
+    def search(region):
+        try:
+            return find_in_region(session, region, prefix_ids)
+        except botocore.exceptions.ClientError as e:
+            # Regions that are not enabled for the account answer with auth errors; skip them.
+            print(f"  ⚠️ Skipping {region}: {e.response['Error']['Code']}", file=sys.stderr)
+            return []
+
+    matches = {plid: [] for plid in prefix_ids}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for region_matches in pool.map(search, regions):
+            for pl in region_matches:
+                matches.setdefault(pl['PrefixListId'], []).append(pl)
+    return matches
+
+
+def print_table(rows, columns):
+    widths = [max(len(col), *(len(str(r.get(col, ''))) for r in rows)) for col in columns]
+    print('  ' + '  '.join(col.ljust(w) for col, w in zip(columns, widths)))
+    for r in rows:
+        print('  ' + '  '.join(str(r.get(col, '')).ljust(w) for col, w in zip(columns, widths)))
+
+
+def report(prefix_ids, matches, mode, account_id=None):
+    for plid in prefix_ids:
+        print(f"🔎 Checking prefix list ID: {plid}")
+        rows = sorted(matches.get(plid, []), key=lambda pl: pl['Region'])
+        if mode == 'customer':
+            rows = [pl for pl in rows if pl.get('OwnerId') == account_id]
+            if rows:
+                print_table(rows, ['Region', 'PrefixListId', 'PrefixListName'])
+            else:
+                print(f"❌ {plid} not found as customer-managed in any region")
+            print(SEPARATOR)
+        elif mode == 'console':
+            if rows:
+                print_table(rows, ['Region', 'PrefixListId', 'PrefixListName', 'OwnerId'])
+        else:
+            if rows:
+                print_table(rows, ['Region', 'PrefixListId', 'PrefixListName', 'OwnerId', 'State',
+                                   'AddressFamily', 'MaxEntries', 'Version'])
+            else:
+                print(f"❌ {plid} not found in any region")
+            print(SEPARATOR)
+
+
+def main():
+    session = aws_instrumentation.install(boto3.Session())
+    parser = argparse.ArgumentParser(description="Locate managed prefix list IDs across all regions (read-only).")
+    parser.add_argument('--mode', choices=('customer', 'console', 'all'), default='customer',
+                        help="customer: customer-managed only; console: console view; all: every visible list")
+    parser.add_argument('--input', default=INPUT_FILE, help="file with one prefix list ID per line")
+    parser.add_argument('--regions', nargs='+', help="limit the search to these regions")
+    parser.add_argument('--workers', type=int, default=REGION_WORKERS, help="regions queried in parallel")
+    parser.add_argument('--use-index', action='store_true', help="answer from the persistent prefix list index")
+    parser.add_argument('--max-age', type=int, default=prefix_list_index.INDEX_MAX_AGE,
+                        help="with --use-index: seconds before a region is re-listed")
+    args = parser.parse_args()
+
+    try:
+        prefix_ids = read_prefix_ids(args.input)
+    except FileNotFoundError:
+        print(f"Input file '{args.input}' not found.", file=sys.stderr)
+        sys.exit(1)
+    if not prefix_ids:
+        print(f"No prefix list IDs in '{args.input}'.", file=sys.stderr)
+        sys.exit(1)
+
+    account_id = session.client('sts').get_caller_identity()['Account'] if args.mode == 'customer' else None
+    if args.use_index:
+        matches = prefix_list_index.locate_cached(prefix_ids, session, max_age=args.max_age, regions=args.regions)
+    else:
+        matches = locate(prefix_ids, session, args.regions, args.workers)
+    report(prefix_ids, matches, args.mode, account_id)
+
+
+if __name__ == '__main__':
+    main()
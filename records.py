@@ -0,0 +1,90 @@
+'''
+records.py
+
+Compact record types for large inventories. Collectors used to keep every boto3
+response dict (or credential report row) whole until the report was written; at 100k
+instances or org-wide IAM that is gigabytes of keys, nested metadata and duplicate
+strings the reports never read.
+
+A record keeps only the fields the reports use, in __slots__ (no per-object dict), and
+interns the low-cardinality fields listed in its INTERNED (instance state and platform,
+the credential report's true/false flags), so a thousand instances in state 'running'
+share one string. Parse each response page into records and let the page go.
+
+ecs_tree_view.py keeps its clusters as plain dicts because the --resume journal stores
+them as JSON; it only calls intern() on the strings tasks repeat (status, task
+definition, container names, images and ports).
+
+Records read like the dicts they replace, so callers keep using record['Field'] and
+record.get('Field', default); fields that were not set behave as missing keys.
+
+Usage:
+  instances = [InstanceSummary.from_instance(i) for r in page['Reservations'] for i in r['Instances']]
+'''
+import sys
+
+
+def intern(value):
+    """sys.intern for strings; anything else is returned unchanged."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Record(object):
+    __slots__ = ()
+    INTERNED = ()
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, intern(value) if name in self.INTERNED else value)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            return default
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.as_dict()!r})"
+
+
+class InstanceSummary(Record):
+    """An EC2 instance as the instance pickers and tables show it."""
+    __slots__ = ('InstanceId', 'Name', 'State', 'Platform')
+    INTERNED = ('State', 'Platform')
+
+    @classmethod
+    def from_instance(cls, instance, default_name="(no name)"):
+        name = default_name
+        for tag in instance.get("Tags", []):
+            if tag["Key"] == "Name":
+                name = tag["Value"]
+        return cls(InstanceId=instance["InstanceId"], Name=name, State=instance["State"]["Name"],
+                   Platform=instance.get("Platform", "linux"))
+
+
+class CredentialReportUser(Record):
+    """The credential report columns the IAM audits read (the report has about twenty more)."""
+    __slots__ = ('user', 'arn', 'user_creation_time', 'password_enabled', 'password_last_used',
+                 'password_last_changed', 'mfa_active',
+                 'access_key_1_active', 'access_key_1_last_rotated', 'access_key_1_last_used_date',
+                 'access_key_2_active', 'access_key_2_last_rotated', 'access_key_2_last_used_date')
+    # Only the flags: the timestamps are close to unique per user and would just fill the intern table.
+    INTERNED = ('password_enabled', 'mfa_active', 'access_key_1_active', 'access_key_2_active')
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(**{name: row[name] for name in cls.__slots__ if name in row})
+
+
+class RoleSummary(Record):
+    """An IAM role from list_roles, with its trust policy already flattened to a string."""
+    __slots__ = ('RoleName', 'RoleId', 'Arn', 'TrustedEntities')
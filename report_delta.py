@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+'''
+report_delta.py
+
+Delta mode for the CSV reports written by the audit scripts (audit_report.csv,
+iam_details.csv, iam_groups_report.csv, iam_user_policy_report.csv, ...).
+
+Each run canonicalizes the freshly written report: rows are sorted by the report's key
+columns with a bounded-memory external sort and a per-row hash column is appended. The
+canonical file is then compared with the one kept from the previous run using a
+streaming merge-join, so neither report is ever loaded into memory as a whole. Only
+added, removed and changed rows are written to the delta file.
+
+Usage:
+  python3 iamuseraudit.py && python3 report_delta.py iam_details.csv
+  python3 report_delta.py audit_report.csv --key Name Type
+  python3 report_delta.py --diff old.canonical.csv new.canonical.csv
+
+Files (per report, in --state-dir):
+  <report>.canonical.csv       canonical snapshot of the latest run
+  <report>.canonical.prev.csv  canonical snapshot of the run before
+  <report>.delta.csv           Change,<report columns...>,Changed Columns
+'''
+import argparse
+import csv
+import hashlib
+import heapq
+import itertools
+import os
+import sys
+import tempfile
+
+HASH_COLUMN = '_row_hash'
+SORT_CHUNK_ROWS = 100000
+STATE_DIR = '.report_state'
+
+# Key columns of the reports this repo writes; anything else defaults to its first column.
+REPORT_KEYS = {
+    'audit_report.csv': ['Name', 'Type'],
+    'iam_details.csv': ['UserName'],
+    'iam_groups_report.csv': ['Group Name'],
+    'iam_user_policy_report.csv': ['Username'],
+    'iam_access_keys_report.csv': ['UserName', 'AccessKeyId'],
+}
+
+
+def row_hash(row):
+    return hashlib.sha1('\x1f'.join(row).encode('utf-8')).hexdigest()
+
+
+def _write_chunk(header, rows, tmp_dir):
+    fd, path = tempfile.mkstemp(suffix='.csv', dir=tmp_dir)
+    with os.fdopen(fd, 'w', newline='', encoding='utf-8') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return path
+
+
+def _read_header(path):
+    with open(path, newline='', encoding='utf-8') as fh:
+        return next(csv.reader(fh), [])
+
+
+def _key_indices(path, header, key_columns):
+    missing = [c for c in key_columns if c not in header]
+    if missing:
+        raise ValueError(f"{path}: key column(s) not in header: {', '.join(missing)}")
+    return [header.index(c) for c in key_columns]
+
+
+def _padded_rows(path, reader, width):
+    """
+    Rows of `reader` padded to `width` fields (writers may drop trailing empty fields);
+    a row with more fields than the header cannot be keyed reliably and is rejected.
+    """
+    for row in reader:
+        if len(row) > width:
+            raise ValueError(f"{path}: line {reader.line_num} has {len(row)} fields, the header has {width}")
+        yield row + [''] * (width - len(row))
+
+
+def _read_rows(path):
+    with open(path, newline='', encoding='utf-8') as fh:
+        reader = csv.reader(fh)
+        next(reader, None)
+        for row in reader:
+            yield row
+
+
+def canonicalize(report_path, canonical_path, key_columns=None, chunk_rows=SORT_CHUNK_ROWS):
+    """
+    Write `report_path` sorted by its key columns (then by row hash) with a trailing
+    row-hash column. Memory is bounded by `chunk_rows`: sorted runs are spilled to temp
+    files and combined with a k-way heap merge.
+    """
+    with open(report_path, newline='', encoding='utf-8') as fh:
+        reader = csv.reader(fh)
+        header = next(reader, [])
+        if key_columns is None:
+            key_columns = REPORT_KEYS.get(os.path.basename(report_path), header[:1])
+        key_idx = _key_indices(report_path, header, key_columns)
+        hash_idx = len(header)
+        rows = _padded_rows(report_path, reader, len(header))
+
+        def sort_key(row):
+            return tuple(row[i] for i in key_idx) + (row[hash_idx],)
+
+        tmp_dir = os.path.dirname(os.path.abspath(canonical_path))
+        runs = []
+        try:
+            while True:
+                chunk = [row + [row_hash(row)] for row in itertools.islice(rows, chunk_rows)]
+                if not chunk:
+                    break
+                chunk.sort(key=sort_key)
+                runs.append(_write_chunk(header + [HASH_COLUMN], chunk, tmp_dir))
+
+            tmp_out = canonical_path + '.tmp'
+            with open(tmp_out, 'w', newline='', encoding='utf-8') as out:
+                writer = csv.writer(out)
+                writer.writerow(header + [HASH_COLUMN])
+                writer.writerows(heapq.merge(*[_read_rows(p) for p in runs], key=sort_key))
+            os.replace(tmp_out, canonical_path)
+        finally:
+            for path in runs:
+                os.remove(path)
+    return header, key_columns
+
+
+def _grouped(path, key_idx):
+    """Yield (key, [rows]) from a canonical file; rows sharing a key are adjacent."""
+    return ((k, list(g)) for k, g in itertools.groupby(_read_rows(path), key=lambda r: tuple(r[i] for i in key_idx)))
+
+
+def diff_canonical(old_path, new_path, key_columns):
+    """
+    Streaming merge-join of two canonical files. Yields (change, old_row, new_row) with
+    change in 'added', 'removed', 'changed'. Rows whose hashes match are skipped without
+    comparing fields. Each file is keyed by its own header, so the two runs may have
+    different columns (e.g. a report that gained columns since the last run).
+    """
+    old_groups = _grouped(old_path, _key_indices(old_path, _read_header(old_path), key_columns))
+    new_groups = _grouped(new_path, _key_indices(new_path, _read_header(new_path), key_columns))
+    old = next(old_groups, None)
+    new = next(new_groups, None)
+
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            for row in old[1]:
+                yield 'removed', row, None
+            old = next(old_groups, None)
+        elif old is None or new[0] < old[0]:
+            for row in new[1]:
+                yield 'added', None, row
+            new = next(new_groups, None)
+        else:
+            old_hashes = {r[-1] for r in old[1]}
+            new_hashes = {r[-1] for r in new[1]}
+            old_rows = [r for r in old[1] if r[-1] not in new_hashes]
+            new_rows = [r for r in new[1] if r[-1] not in old_hashes]
+            # Pair up rows sharing a key: a lone old/new pair is a change, extras are adds/removes.
+            for old_row, new_row in itertools.zip_longest(old_rows, new_rows):
+                if old_row is None:
+                    yield 'added', None, new_row
+                elif new_row is None:
+                    yield 'removed', old_row, None
+                else:
+                    yield 'changed', old_row, new_row
+            old = next(old_groups, None)
+            new = next(new_groups, None)
+
+
+def write_delta(old_path, new_path, delta_path, key_columns):
+    """Write the delta in the new file's columns; old rows are matched to them by column name."""
+    counts = {'added': 0, 'removed': 0, 'changed': 0}
+    header = _read_header(new_path)[:-1]
+    old_header = _read_header(old_path)[:-1]
+    dropped = [col for col in old_header if col not in header]
+    with open(delta_path, 'w', newline='', encoding='utf-8') as out:
+        writer = csv.writer(out)
+        writer.writerow(['Change'] + header + ['Changed Columns'])
+        for change, old_row, new_row in diff_canonical(old_path, new_path, key_columns):
+            old = dict(zip(old_header, old_row)) if old_row else {}
+            if change == 'changed':
+                changed = [f"{col}: {old.get(col, '')} -> {n}" for col, n in zip(header, new_row)
+                           if old.get(col, '') != n]
+                changed += [f"{col}: {old[col]} -> (column removed)" for col in dropped if old[col]]
+                if not changed:
+                    continue  # only an empty column was added or removed
+                writer.writerow([change] + new_row[:-1] + ['; '.join(changed)])
+            elif change == 'added':
+                writer.writerow([change] + new_row[:-1] + [''])
+            else:
+                writer.writerow([change] + [old.get(col, '') for col in header] + [''])
+            counts[change] += 1
+    return counts
+
+
+def run_delta(report_path, key_columns=None, state_dir=STATE_DIR):
+    os.makedirs(state_dir, exist_ok=True)
+    base = os.path.join(state_dir, os.path.basename(report_path))
+    canonical = base + '.canonical.csv'
+    previous = base + '.canonical.prev.csv'
+    delta = base + '.delta.csv'
+
+    fresh = canonical + '.new'
+    _, key_columns = canonicalize(report_path, fresh, key_columns)
+    if not os.path.exists(canonical):
+        os.replace(fresh, canonical)
+        print(f"📄 First canonical snapshot of '{report_path}' saved; the next run will produce a delta.")
+        return None
+    os.replace(canonical, previous)
+    os.replace(fresh, canonical)
+
+    counts = write_delta(previous, canonical, delta, key_columns)
+    print(f"✅ Delta for '{report_path}': {counts['added']} added, {counts['removed']} removed, "
+          f"{counts['changed']} changed -> {delta}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Canonical sorted snapshots and streaming deltas of CSV reports.")
+    parser.add_argument('report', nargs='?', help="report CSV written by one of the audit scripts")
+    parser.add_argument('--key', nargs='+', help="key column(s) identifying a row (default: per-report)")
+    parser.add_argument('--state-dir', default=STATE_DIR, help="where canonical snapshots and deltas are kept")
+    parser.add_argument('--diff', nargs=2, metavar=('OLD', 'NEW'), help="diff two existing canonical files")
+    parser.add_argument('--output', default='report.delta.csv', help="delta file for --diff")
+    args = parser.parse_args()
+
+    if args.diff:
+        if not args.key:
+            parser.error("--diff requires --key")
+        try:
+            counts = write_delta(args.diff[0], args.diff[1], args.output, args.key)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"✅ {counts['added']} added, {counts['removed']} removed, {counts['changed']} changed -> {args.output}")
+    elif args.report:
+        try:
+            run_delta(args.report, args.key, args.state_dir)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        parser.error("a report file or --diff is required")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+'''
+report_writers.py
+
+Streaming report sinks shared by the audit scripts. Collectors yield rows (lists in
+header order) and a writer appends them to the selected format in batches, so memory
+stays constant however large the account is, and whatever was written before a crash
+or Ctrl-C is still readable.
+
+Formats:
+  csv     - same layout as the scripts have always written (default)
+  jsonl   - one JSON object per row, keyed by header
+  sqlite  - one table named after the output file, committed every batch
+  parquet - a single .parquet file, one row group per batch (needs pyarrow); written
+            to a temp file whose footer is completed on close, even after a failure
+  snapshot - a new run of the dataset named after the report in the shared local
+            snapshot (snapshot_store.py), queryable together with the other collectors
+
+Usage from a script:
+  with open_report_writer('iam_details.csv', headers, fmt='jsonl') as writer:
+      writer.write_rows(get_iam_details())
+'''
+import csv
+import json
+import os
+import sqlite3
+
+FORMATS = ('csv', 'jsonl', 'sqlite', 'parquet', 'snapshot')
+EXTENSIONS = {'csv': '.csv', 'jsonl': '.jsonl', 'sqlite': '.sqlite', 'parquet': '.parquet', 'snapshot': ''}
+BATCH_SIZE = 500
+
+
+def output_path(path, fmt):
+    """Swap the extension of a script's default CSV name for the selected format."""
+    return os.path.splitext(path)[0] + EXTENSIONS[fmt]
+
+
+class ReportWriter(object):
+    """Buffers up to `batch_size` rows and hands each full batch to _flush_batch()."""
+
+    def __init__(self, path, headers, batch_size=BATCH_SIZE):
+        self.path = path
+        self.headers = list(headers)
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self._batch = []
+
+    def write(self, row):
+        self._batch.append(list(row))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write(row)
+        return self.rows_written
+
+    def flush(self):
+        if self._batch:
+            self._flush_batch(self._batch)
+            self.rows_written += len(self._batch)
+            self._batch = []
+
+    def close(self):
+        self.flush()
+
+    def _flush_batch(self, rows):
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Flush what was collected even when the run dies, so partial output is usable.
+        self.close()
+        return False
+
+
+class CsvReportWriter(ReportWriter):
+    def __init__(self, path, headers, batch_size=BATCH_SIZE):
+        super().__init__(path, headers, batch_size)
+        self._fh = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._fh)
+        self._writer.writerow(self.headers)
+
+    def _flush_batch(self, rows):
+        self._writer.writerows(rows)
+        self._fh.flush()
+
+    def close(self):
+        super().close()
+        self._fh.close()
+
+
+class JsonlReportWriter(ReportWriter):
+    def __init__(self, path, headers, batch_size=BATCH_SIZE):
+        super().__init__(path, headers, batch_size)
+        self._fh = open(path, 'w', encoding='utf-8')
+
+    def _flush_batch(self, rows):
+        self._fh.write(''.join(json.dumps(dict(zip(self.headers, row)), default=str) + '\n' for row in rows))
+        self._fh.flush()
+
+    def close(self):
+        super().close()
+        self._fh.close()
+
+
+class SqliteReportWriter(ReportWriter):
+    def __init__(self, path, headers, batch_size=BATCH_SIZE, table=None):
+        super().__init__(path, headers, batch_size)
+        self.table = table or os.path.splitext(os.path.basename(path))[0]
+        self._conn = sqlite3.connect(path)
+        columns = ', '.join('"{}" TEXT'.format(h.replace('"', '""')) for h in self.headers)
+        self._conn.execute('DROP TABLE IF EXISTS "{}"'.format(self.table))
+        self._conn.execute('CREATE TABLE "{}" ({})'.format(self.table, columns))
+        self._insert = 'INSERT INTO "{}" VALUES ({})'.format(self.table, ', '.join('?' * len(self.headers)))
+
+    def _flush_batch(self, rows):
+        self._conn.executemany(self._insert, [[None if v is None else str(v) for v in row] for row in rows])
+        self._conn.commit()
+
+    def close(self):
+        super().close()
+        self._conn.close()
+
+
+class ParquetReportWriter(ReportWriter):
+    def __init__(self, path, headers, batch_size=BATCH_SIZE):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+        super().__init__(path, headers, batch_size)
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._schema = pyarrow.schema([(h, pyarrow.string()) for h in self.headers])
+        self._tmp_path = path + '.tmp'
+        self._writer = self._pq.ParquetWriter(self._tmp_path, self._schema)
+
+    def _flush_batch(self, rows):
+        columns = [[None if row[i] is None else str(row[i]) for row in rows] for i in range(len(self.headers))]
+        table = self._pa.Table.from_arrays([self._pa.array(c, type=self._pa.string()) for c in columns],
+                                           schema=self._schema)
+        self._writer.write_table(table, row_group_size=len(rows))
+
+    def close(self):
+        super().close()
+        self._writer.close()
+        if os.path.isdir(self.path):
+            # Output of the old part-per-batch layout.
+            for name in os.listdir(self.path):
+                if name.startswith('part-') and name.endswith('.parquet'):
+                    os.remove(os.path.join(self.path, name))
+            os.rmdir(self.path)
+        os.replace(self._tmp_path, self.path)
+
+
+class SnapshotReportWriter(ReportWriter):
+    """Writes into the shared snapshot; `path` without extension is the dataset name."""
+
+    def __init__(self, path, headers, batch_size=BATCH_SIZE):
+        from snapshot_store import SnapshotStore
+        super().__init__(path, headers, batch_size)
+        self.dataset = os.path.basename(path)
+        self._store = SnapshotStore()
+        self._run_id = self._store.begin_run(self.dataset, self.headers)
+
+    def _flush_batch(self, rows):
+        self._store.insert(self.dataset, self._run_id, self.headers, rows)
+
+    def close(self, ok=True):
+        super().close()
+        self._store.finish_run(self._run_id, ok)
+        self._store.close()
+
+    def __exit__(self, exc_type, exc, tb):
+        # Keep the partial rows but do not let an interrupted run become the "latest" one.
+        self.close(ok=exc_type is None)
+        return False
+
+
+WRITERS = {
+    'csv': CsvReportWriter,
+    'jsonl': JsonlReportWriter,
+    'sqlite': SqliteReportWriter,
+    'parquet': ParquetReportWriter,
+    'snapshot': SnapshotReportWriter,
+}
+
+
+def open_report_writer(path, headers, fmt='csv', batch_size=BATCH_SIZE):
+    """Return a context-managed writer for `fmt`; `path` should already carry the right extension."""
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown report format '{fmt}'. Choose from: {', '.join(FORMATS)}")
+    return WRITERS[fmt](path, headers, batch_size=batch_size)
+
+
+def add_format_argument(parser):
+    parser.add_argument('--format', choices=FORMATS, default='csv',
+                        help="output format (default: csv, same file as before)")
+    return parser
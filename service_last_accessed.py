@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+'''
+service_last_accessed.py
+
+"Services granted vs used" for IAM users and roles, from IAM's service last accessed
+data. The API is asynchronous: generate_service_last_accessed_details starts a job per
+principal and get_service_last_accessed_details has to be polled until it completes.
+
+Instead of generate-then-wait for one principal at a time, every job is submitted up
+front on a thread pool (the rate governor installed by aws_instrumentation keeps the
+submissions at the rate IAM allows), and outstanding jobs are then polled in rounds of
+POLL_BATCH, oldest first, sleeping only when a whole round is still in progress.
+
+Results are cached per ARN (service_last_accessed_cache.json) for CACHE_TTL: IAM only
+refreshes the data every few hours, so re-running the audits reuses them.
+
+Columns joined onto the IAM reports (iamroleaudit.py / iamuserauditnew.py with
+--service-usage):
+  Services Granted   number of services the principal's policies allow
+  Services Used      number of those it authenticated to in the tracking period
+  Unused Services    namespaces of the granted but never used services
+
+Usage:
+  python3 service_last_accessed.py                  # all users and roles
+  python3 service_last_accessed.py --roles --format jsonl
+'''
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import botocore
+import aws_instrumentation
+import tracing
+from aws_governor import is_throttle_error
+from report_writers import add_format_argument, open_report_writer, output_path
+
+SUBMIT_WORKERS = 16
+POLL_BATCH = 16
+POLL_INTERVAL = 2.0          # seconds between rounds in which no job finished
+JOB_TIMEOUT = 15 * 60        # seconds before outstanding jobs are given up
+CACHE_FILE = 'service_last_accessed_cache.json'
+CACHE_TTL = 4 * 60 * 60      # seconds
+THROTTLED = 'unknown (throttled)'
+
+USAGE_HEADERS = ['Services Granted', 'Services Used', 'Unused Services']
+HEADERS = ['Type', 'Name', 'Arn'] + USAGE_HEADERS + ['Last Accessed']
+
+
+def load_cache(path=CACHE_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_cache(cache, path=CACHE_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(cache, fh)
+    os.replace(tmp_path, path)
+
+
+def summarize(services):
+    """Reduce a ServicesLastAccessed list to granted / used counts, unused namespaces and the last access."""
+    used = [s for s in services if s.get('LastAuthenticated')]
+    last = max((s['LastAuthenticated'] for s in used), default=None)
+    return {
+        'granted': len(services),
+        'used': len(used),
+        'unused': sorted(s['ServiceNamespace'] for s in services if not s.get('LastAuthenticated')),
+        'last_accessed': last.isoformat() if last else "",
+    }
+
+
+def submit_jobs(iam, arns, workers=SUBMIT_WORKERS):
+    """Start a job for every ARN; returns ({arn: job_id}, {arn: error})."""
+    def submit(arn):
+        try:
+            return arn, iam.generate_service_last_accessed_details(Arn=arn)['JobId'], None
+        except botocore.exceptions.ClientError as e:
+            sys.stderr.write(f"Error starting service last accessed job for {arn}: {e}\n")
+            return arn, None, THROTTLED if is_throttle_error(e) else str(e)
+
+    jobs, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for arn, job_id, error in pool.map(submit, arns):
+            if job_id:
+                jobs[arn] = job_id
+            else:
+                errors[arn] = error
+    return jobs, errors
+
+
+def fetch_job(iam, job_id):
+    """One poll of a job: (status, services or error). Pages through completed results."""
+    response = iam.get_service_last_accessed_details(JobId=job_id)
+    status = response['JobStatus']
+    if status == 'FAILED':
+        return status, response.get('Error', {}).get('Message', 'job failed')
+    if status != 'COMPLETED':
+        return status, None
+    services = list(response.get('ServicesLastAccessed', []))
+    while response.get('IsTruncated'):
+        response = iam.get_service_last_accessed_details(JobId=job_id, Marker=response['Marker'])
+        services.extend(response.get('ServicesLastAccessed', []))
+    return status, services
+
+
+def poll_jobs(iam, jobs, batch=POLL_BATCH, interval=POLL_INTERVAL, timeout=JOB_TIMEOUT):
+    """Poll outstanding jobs in batches until all are done; returns ({arn: summary}, {arn: error})."""
+    outstanding = list(jobs.items())
+    results, errors = {}, {}
+    deadline = time.monotonic() + timeout
+
+    def poll(item):
+        arn, job_id = item
+        try:
+            return item, fetch_job(iam, job_id)
+        except botocore.exceptions.ClientError as e:
+            if is_throttle_error(e):
+                return item, ('IN_PROGRESS', None)  # try again in a later round
+            return item, ('FAILED', str(e))
+
+    with ThreadPoolExecutor(max_workers=batch) as pool:
+        while outstanding and time.monotonic() < deadline:
+            round_items, outstanding = outstanding[:batch], outstanding[batch:]
+            pending = []
+            for (arn, job_id), (status, value) in pool.map(poll, round_items):
+                if status == 'COMPLETED':
+                    results[arn] = summarize(value)
+                elif status == 'FAILED':
+                    sys.stderr.write(f"Service last accessed job failed for {arn}: {value}\n")
+                    errors[arn] = value
+                else:
+                    pending.append((arn, job_id))
+            # Unfinished jobs go to the back, so every job is polled once per pass.
+            outstanding.extend(pending)
+            if pending and len(pending) == len(round_items):
+                time.sleep(interval)
+    for arn, _ in outstanding:
+        sys.stderr.write(f"Service last accessed job for {arn} did not finish in {timeout}s\n")
+        errors[arn] = 'timed out'
+    return results, errors
+
+
+def collect(arns, cache_path=CACHE_FILE, ttl=CACHE_TTL, iam=None):
+    """
+    Map ARN -> summary (see summarize()) for every principal. Failed principals map to
+    None, throttled ones to THROTTLED; neither is cached, so the next run retries them.
+    """
+    iam = iam or boto3.client('iam')
+    cache = load_cache(cache_path)
+    now = time.time()
+    result = {}
+    stale = []
+    for arn in arns:
+        entry = cache.get(arn)
+        if entry and now - entry.get('FetchedAt', 0) < ttl:
+            result[arn] = entry['Summary']
+        else:
+            stale.append(arn)
+
+    with tracing.span('submit-jobs', jobs=len(stale)):
+        jobs, errors = submit_jobs(iam, stale)
+    with tracing.span('poll-jobs', jobs=len(jobs)):
+        summaries, poll_errors = poll_jobs(iam, jobs)
+    errors.update(poll_errors)
+
+    for arn, summary in summaries.items():
+        result[arn] = summary
+        cache[arn] = {'Summary': summary, 'FetchedAt': now}
+    for arn, error in errors.items():
+        result[arn] = THROTTLED if error == THROTTLED else None
+
+    current = set(arns)
+    save_cache({arn: entry for arn, entry in cache.items() if arn in current}, cache_path)
+    print(f"Service last accessed: {len(arns) - len(stale)} cached, {len(summaries)} fetched, "
+          f"{len(errors)} failed.")
+    return result
+
+
+def usage_columns(summary):
+    """The USAGE_HEADERS values for one principal's summary."""
+    if summary is None:
+        return ["", "", ""]
+    if summary == THROTTLED:
+        return [THROTTLED, THROTTLED, ""]
+    return [summary['granted'], summary['used'], ", ".join(summary['unused'])]
+
+
+def list_principals(iam, users=True, roles=True):
+    """(type, name, arn) for every IAM user and/or role."""
+    principals = []
+    if users:
+        for page in iam.get_paginator('list_users').paginate():
+            principals.extend(('User', u['UserName'], u['Arn']) for u in page['Users'])
+    if roles:
+        for page in iam.get_paginator('list_roles').paginate():
+            principals.extend(('Role', r['RoleName'], r['Arn']) for r in page['Roles'])
+    return principals
+
+
+def main():
+    aws_instrumentation.install()
+    parser = argparse.ArgumentParser(description="Services granted vs used per IAM user and role.")
+    parser.add_argument('--users', action='store_true', help="only users")
+    parser.add_argument('--roles', action='store_true', help="only roles")
+    args = tracing.add_trace_arguments(add_format_argument(parser)).parse_args()
+    tracing.setup(args)
+    iam = boto3.client('iam')
+
+    both = not args.users and not args.roles
+    with tracing.span('list-principals'):
+        principals = list_principals(iam, users=args.users or both, roles=args.roles or both)
+    print(f"🔎 {len(principals)} principal(s); collecting service last accessed data...")
+    usage = collect([arn for _, _, arn in principals], iam=iam)
+
+    filename = output_path('service_last_accessed.csv', args.format)
+    with tracing.span('write-report'), open_report_writer(filename, HEADERS, args.format) as writer:
+        for kind, name, arn in principals:
+            summary = usage.get(arn)
+            last = summary['last_accessed'] if isinstance(summary, dict) else ""
+            writer.write([kind, name, arn] + usage_columns(summary) + [last])
+    print(f"✅ Report saved to '{filename}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+'''
+snapshot_store.py
+
+One local SQLite snapshot (audit_snapshot.sqlite) that every collector can write into,
+so cross-dataset questions are answered with a join instead of VLOOKUPs across the
+txt/CSV outputs or re-running several scans.
+
+Each collector run is a row in `runs` (dataset, script, start/finish time, status, row
+count) and its rows go into the dataset's table tagged with the run_id. For every
+dataset a `latest_<dataset>` view shows the rows of the last completed run (for
+per-instance datasets such as tomcat: the last completed run of each instance). Key
+columns are indexed together with run_id, so the canned joins run in milliseconds.
+
+Writing:
+  --format snapshot    IAM reports (report_writers.py): dataset = report name
+  --snapshot           cwcheck.py (cw_memory), ecs_tree_view.py (ecs_container_instances),
+                       atc-conf-check.py (ssm_instances, tomcat)
+
+Usage:
+  python3 snapshot_store.py runs
+  python3 snapshot_store.py query                         # list canned queries
+  python3 snapshot_store.py query ecs-hosts-missing-metrics [--csv]
+  python3 snapshot_store.py sql "SELECT * FROM latest_cw_memory WHERE Status != 'working'"
+'''
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+SNAPSHOT_DB = 'audit_snapshot.sqlite'
+
+# dataset -> (columns, key column, scope). Scope 'run': a run covers the whole fleet;
+# 'key': a run covers some keys only (e.g. one instance), latest is taken per key.
+DATASETS = {
+    'cw_memory': (['InstanceId', 'Status'], 'InstanceId', 'run'),
+    'ecs_container_instances': (['Cluster', 'ContainerInstanceId', 'Ec2InstanceId', 'TaskCount', 'Tasks'],
+                                'Ec2InstanceId', 'run'),
+    'ssm_instances': (['InstanceId', 'Name', 'PlatformName', 'PingStatus'], 'InstanceId', 'run'),
+    'tomcat': (['InstanceId', 'Username', 'TomcatHome', 'RedirectPort', 'Status', 'ServerXml',
+                'Pid', 'RssKb', 'CpuSeconds', 'XmxMb', 'Threads', 'OpenFds', 'HostMemKb'], 'InstanceId', 'key'),
+}
+
+# name -> (description, SQL over the latest_* views)
+QUERIES = {
+    'ecs-hosts-missing-metrics': (
+        "ECS container instances whose EC2 host is not reporting memory metrics",
+        """SELECT e.Cluster, e.ContainerInstanceId, e.Ec2InstanceId, e.TaskCount, c.Status AS MemoryMetrics
+           FROM latest_ecs_container_instances e
+           JOIN latest_cw_memory c ON c.InstanceId = e.Ec2InstanceId
+           WHERE c.Status != 'working'
+           ORDER BY e.Cluster, e.Ec2InstanceId"""),
+    'online-hosts-stopped-tomcat': (
+        "SSM-Online hosts with a Tomcat whose redirect port is not listening",
+        """SELECT s.InstanceId, s.Name, t.Username, t.TomcatHome, t.RedirectPort
+           FROM latest_ssm_instances s
+           JOIN latest_tomcat t ON t.InstanceId = s.InstanceId
+           WHERE s.PingStatus = 'Online' AND t.Status = 'stopped'
+           ORDER BY s.InstanceId, t.Username"""),
+    'missing-metrics-ssm-status': (
+        "Instances missing memory metrics with their SSM agent status (can the agent be fixed remotely?)",
+        """SELECT c.InstanceId, c.Status AS MemoryMetrics, COALESCE(s.PingStatus, 'not managed') AS PingStatus,
+                  COALESCE(s.Name, '') AS Name
+           FROM latest_cw_memory c
+           LEFT JOIN latest_ssm_instances s ON s.InstanceId = c.InstanceId
+           WHERE c.Status != 'working'
+           ORDER BY PingStatus, c.InstanceId"""),
+    'overcommitted-tomcat-hosts': (
+        "Hosts whose Tomcat JVMs may use more memory (-Xmx) than the host has",
+        """SELECT InstanceId, COUNT(DISTINCT Pid) AS Jvms, SUM(CAST(XmxMb AS INTEGER)) AS XmxMb,
+                  SUM(CAST(RssKb AS INTEGER)) / 1024 AS RssMb, MAX(CAST(HostMemKb AS INTEGER)) / 1024 AS HostMemMb
+           FROM (SELECT DISTINCT InstanceId, Pid, XmxMb, RssKb, HostMemKb FROM latest_tomcat WHERE Pid != '')
+           GROUP BY InstanceId
+           HAVING SUM(CAST(XmxMb AS INTEGER)) > MAX(CAST(HostMemKb AS INTEGER)) / 1024
+           ORDER BY XmxMb DESC"""),
+    'ecs-hosts-not-online': (
+        "ECS container instances whose EC2 host is not SSM-Online",
+        """SELECT e.Cluster, e.Ec2InstanceId, COALESCE(s.PingStatus, 'not managed') AS PingStatus
+           FROM latest_ecs_container_instances e
+           LEFT JOIN latest_ssm_instances s ON s.InstanceId = e.Ec2InstanceId
+           WHERE s.PingStatus IS NULL OR s.PingStatus != 'Online'
+           ORDER BY e.Cluster, e.Ec2InstanceId"""),
+}
+
+
+def _quote(name):
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def _now():
+    return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class SnapshotStore(object):
+    def __init__(self, path=SNAPSHOT_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT, dataset TEXT NOT NULL, script TEXT,
+            started_at TEXT NOT NULL, finished_at TEXT, status TEXT NOT NULL, row_count INTEGER)''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS runs_dataset ON runs(dataset, status, run_id)')
+        for dataset, (columns, key, scope) in DATASETS.items():
+            self.ensure_dataset(dataset, columns, key, scope)
+        self.conn.commit()
+
+    def ensure_dataset(self, dataset, columns, key=None, scope='run'):
+        """Create the table, indexes and latest_ view; add columns a newer collector writes."""
+        table = _quote(dataset)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS {} (run_id INTEGER NOT NULL, {})'.format(
+            table, ', '.join(_quote(c) + ' TEXT' for c in columns)))
+        existing = {row[1] for row in self.conn.execute('PRAGMA table_info({})'.format(table))}
+        for column in columns:
+            if column not in existing:
+                self.conn.execute('ALTER TABLE {} ADD COLUMN {} TEXT'.format(table, _quote(column)))
+        self.conn.execute('CREATE INDEX IF NOT EXISTS {} ON {}(run_id)'.format(_quote(dataset + '_run'), table))
+        key = key or columns[0]
+        self.conn.execute('CREATE INDEX IF NOT EXISTS {} ON {}({}, run_id)'.format(
+            _quote(dataset + '_key'), table, _quote(key)))
+        complete = "SELECT run_id FROM runs WHERE dataset = '{}' AND status = 'complete'".format(
+            dataset.replace("'", "''"))
+        if scope == 'key':
+            where = 'run_id = (SELECT MAX(t2.run_id) FROM {} t2 WHERE t2.{k} = t.{k} AND t2.run_id IN ({}))'.format(
+                table, complete, k=_quote(key))
+        else:
+            where = 'run_id = (SELECT MAX(run_id) FROM ({}))'.format(complete)
+        self.conn.execute('CREATE VIEW IF NOT EXISTS {} AS SELECT * FROM {} t WHERE {}'.format(
+            _quote('latest_' + dataset), table, where))
+
+    def begin_run(self, dataset, columns, script=None):
+        known = DATASETS.get(dataset)
+        self.ensure_dataset(dataset, columns, known[1] if known else None, known[2] if known else 'run')
+        script = script or os.path.basename(sys.argv[0])
+        cur = self.conn.execute("INSERT INTO runs (dataset, script, started_at, status, row_count) "
+                                "VALUES (?, ?, ?, 'running', 0)", (dataset, script, _now()))
+        self.conn.commit()
+        return cur.lastrowid
+
+    def insert(self, dataset, run_id, columns, rows):
+        sql = 'INSERT INTO {} (run_id, {}) VALUES (?, {})'.format(
+            _quote(dataset), ', '.join(_quote(c) for c in columns), ', '.join('?' * len(columns)))
+        rows = [[run_id] + [None if v is None else str(v) for v in row] for row in rows]
+        self.conn.executemany(sql, rows)
+        self.conn.execute('UPDATE runs SET row_count = row_count + ? WHERE run_id = ?', (len(rows), run_id))
+        self.conn.commit()
+
+    def finish_run(self, run_id, ok=True):
+        """Only complete runs show up in the latest_ views; a crashed run stays 'failed'."""
+        self.conn.execute('UPDATE runs SET finished_at = ?, status = ? WHERE run_id = ?',
+                          (_now(), 'complete' if ok else 'failed', run_id))
+        self.conn.commit()
+
+    def query(self, sql, params=()):
+        cur = self.conn.execute(sql, params)
+        columns = [d[0] for d in cur.description or ()]
+        return columns, cur.fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+def record(dataset, rows, columns=None, path=SNAPSHOT_DB):
+    """Store one complete run of `dataset` in a single call (for collectors that build their rows in memory)."""
+    columns = columns or DATASETS[dataset][0]
+    store = SnapshotStore(path)
+    try:
+        run_id = store.begin_run(dataset, columns)
+        store.insert(dataset, run_id, columns, rows)
+        store.finish_run(run_id)
+    finally:
+        store.close()
+    print(f"🗄️  {len(rows)} row(s) of '{dataset}' saved to the snapshot '{path}'")
+
+
+def add_snapshot_argument(parser):
+    parser.add_argument('--snapshot', action='store_true',
+                        help=f"also record the results in the local snapshot ({SNAPSHOT_DB})")
+    return parser
+
+
+def print_rows(columns, rows, as_csv=False):
+    if as_csv:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(columns)
+        writer.writerows(rows)
+        return
+    if rows:
+        text = [['' if v is None else str(v) for v in row] for row in rows]
+        widths = [max(len(col), *(len(row[i]) for row in text)) for i, col in enumerate(columns)]
+        print('  ' + '  '.join(col.ljust(w) for col, w in zip(columns, widths)))
+        for row in text:
+            print('  ' + '  '.join(v.ljust(w) for v, w in zip(row, widths)))
+    print(f"({len(rows)} row{'s' if len(rows) != 1 else ''})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SQLite snapshot of collector results.")
+    parser.add_argument('--db', default=SNAPSHOT_DB, help="snapshot database")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('runs', help="list recorded runs")
+    q = sub.add_parser('query', help="run a canned cross-dataset query (no name: list them)")
+    q.add_argument('name', nargs='?', choices=sorted(QUERIES))
+    q.add_argument('--csv', action='store_true', help="CSV output")
+    s = sub.add_parser('sql', help="run an ad-hoc SQL statement (latest_<dataset> views are available)")
+    s.add_argument('statement')
+    s.add_argument('--csv', action='store_true', help="CSV output")
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.db)
+    try:
+        if args.command == 'runs':
+            print_rows(*store.query('SELECT run_id, dataset, script, started_at, finished_at, status, row_count '
+                                    'FROM runs ORDER BY run_id'))
+        elif args.command == 'query' and not args.name:
+            for name, (description, _) in sorted(QUERIES.items()):
+                print(f"  {name:<30} {description}")
+        else:
+            sql = QUERIES[args.name][1] if args.command == 'query' else args.statement
+            try:
+                columns, rows = store.query(sql)
+            except sqlite3.Error as e:
+                print(f"❌ {e}", file=sys.stderr)
+                sys.exit(1)
+            print_rows(columns, rows, args.csv)
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+'''
+Offline checks for iam_policy_engine.py (no AWS access): python3 -m pytest test_iam_policy_engine.py
+'''
+import json
+
+import iam_policy_engine
+from iam_policy_engine import build_index, load_index
+
+
+def _details(*statements):
+    """A snapshot with one user, user/alice, whose inline policy holds `statements`."""
+    return {'UserDetailList': [{'UserName': 'alice', 'UserId': 'AIDA1', 'UserPolicyList': [
+        {'PolicyName': 'p', 'PolicyDocument': {'Version': '2012-10-17', 'Statement': list(statements)}}]}]}
+
+
+ALLOW_S3 = {'Effect': 'Allow', 'Action': 's3:*', 'Resource': '*'}
+DENY_PROD_DELETE = {'Effect': 'Deny', 'Action': 's3:DeleteObject', 'Resource': 'arn:aws:s3:::prod/*'}
+
+
+def test_scoped_deny_without_resource_is_partial():
+    result = build_index(_details(ALLOW_S3, DENY_PROD_DELETE)).principals_allowed('s3:DeleteObject')
+    assert result['user/alice']['decision'] == 'partial'
+
+
+def test_scoped_deny_on_its_resource_removes_principal():
+    index = build_index(_details(ALLOW_S3, DENY_PROD_DELETE))
+    assert 'user/alice' not in index.principals_allowed('s3:DeleteObject', 'arn:aws:s3:::prod/key')
+    assert index.principals_allowed('s3:DeleteObject', 'arn:aws:s3:::dev/key')['user/alice']['decision'] == 'allow'
+
+
+def test_deny_on_every_resource_removes_principal():
+    deny_all = dict(DENY_PROD_DELETE, Resource='*')
+    assert 'user/alice' not in build_index(_details(ALLOW_S3, deny_all)).principals_allowed('s3:DeleteObject')
+
+
+def test_brackets_are_literal():
+    allow = {'Effect': 'Allow', 'Action': 's3:GetObject', 'Resource': 'arn:aws:s3:::b/[ab]*'}
+    index = build_index(_details(allow))
+    assert 'user/alice' in index.principals_allowed('s3:GetObject', 'arn:aws:s3:::b/[ab]/key')
+    assert 'user/alice' not in index.principals_allowed('s3:GetObject', 'arn:aws:s3:::b/a/key')
+
+
+def test_scoped_allow_without_resource_is_partial():
+    allow_dev = {'Effect': 'Allow', 'Action': 's3:DeleteObject', 'Resource': 'arn:aws:s3:::dev/*'}
+    assert build_index(_details(allow_dev)).principals_allowed('s3:DeleteObject')['user/alice']['decision'] == 'partial'
+    both = build_index(_details(allow_dev, ALLOW_S3))
+    assert both.principals_allowed('s3:DeleteObject')['user/alice']['decision'] == 'allow'
+
+
+def test_index_is_cached_until_the_snapshot_changes(tmp_path, monkeypatch):
+    builds = []
+    monkeypatch.setattr(iam_policy_engine, 'build_index', lambda details: builds.append(1) or build_index(details))
+    snapshot = tmp_path / 'details.json'
+    snapshot.write_text(json.dumps(_details(ALLOW_S3)))
+    load_index(str(snapshot))
+    assert 'user/alice' in load_index(str(snapshot)).principals_allowed('s3:GetObject')
+    assert len(builds) == 1
+    snapshot.write_text(json.dumps(_details(dict(ALLOW_S3, Action='ec2:*'))))
+    assert 'user/alice' not in load_index(str(snapshot)).principals_allowed('s3:GetObject')
+    assert len(builds) == 2
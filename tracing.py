@@ -0,0 +1,131 @@
+'''
+tracing.py
+
+Phase-level timing for the audit scripts. Scripts wrap their major phases (pagination,
+per-item enrichment, SSM waits, parsing, rendering) in spans; every AWS API call made
+while tracing is on is added as a span too (through aws_instrumentation). The result is
+a Chrome trace file: open it in chrome://tracing or https://ui.perfetto.dev to see
+where the time goes, per thread.
+
+--profile additionally runs the script under cProfile and writes the stats file
+(inspect with `python3 -m pstats FILE` or snakeviz).
+
+When tracing is off, span() returns a shared no-op context manager, so the spans cost
+nothing in normal runs.
+
+Usage from a script:
+  add_trace_arguments(parser)
+  args = parser.parse_args()
+  tracing.setup(args)
+  with tracing.span('list-users'):
+      ...
+
+Environment:
+  AWS_TRACE=path      write a trace even for scripts run without --trace
+'''
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_events = []
+_threads = {}
+_state = {'enabled': False, 'trace_path': None, 'profiler': None, 'profile_path': None, 'registered': False}
+_origin = time.perf_counter()
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enabled():
+    return _state['enabled']
+
+
+def add_span(name, start, end, category='phase', args=None):
+    """Record a finished span; `start`/`end` are time.perf_counter() values."""
+    if not _state['enabled']:
+        return
+    event = {'name': name, 'cat': category, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+             'ts': round((start - _origin) * 1e6, 1), 'dur': round((end - start) * 1e6, 1)}
+    if args:
+        event['args'] = args
+    with _lock:
+        _events.append(event)
+        if event['tid'] not in _threads:
+            _threads[event['tid']] = threading.current_thread().name
+
+
+@contextmanager
+def _span(name, category, args):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(name, start, time.perf_counter(), category, args)
+
+
+def span(name, category='phase', **args):
+    """Context manager timing one phase; keyword arguments show up in the trace viewer."""
+    if not _state['enabled']:
+        return _NULL_SPAN
+    return _span(name, category, args)
+
+
+def write_trace(path):
+    with _lock:
+        events = list(_events)
+        names = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                 for tid, name in _threads.items()]
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump({'traceEvents': names + events, 'displayTimeUnit': 'ms'}, fh)
+
+
+def _at_exit():
+    profiler = _state['profiler']
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(_state['profile_path'])
+        print(f"🧪 cProfile stats written to '{_state['profile_path']}'", file=sys.stderr)
+    if _state['enabled'] and _state['trace_path']:
+        write_trace(_state['trace_path'])
+        print(f"⏱️  Trace ({len(_events)} spans) written to '{_state['trace_path']}'", file=sys.stderr)
+
+
+def setup(args=None, trace_path=None, profile_path=None):
+    """Turn on tracing and/or profiling from parsed --trace/--profile arguments (or explicit paths)."""
+    trace_path = trace_path or getattr(args, 'trace', None) or os.environ.get('AWS_TRACE')
+    profile_path = profile_path or getattr(args, 'profile', None)
+    if not trace_path and not profile_path:
+        return
+    if trace_path:
+        _state['enabled'] = True
+        _state['trace_path'] = trace_path
+    if profile_path and _state['profiler'] is None:
+        import cProfile
+        _state['profile_path'] = profile_path
+        _state['profiler'] = cProfile.Profile()
+        _state['profiler'].enable()
+    if not _state['registered']:
+        atexit.register(_at_exit)
+        _state['registered'] = True
+
+
+def add_trace_arguments(parser):
+    script = os.path.splitext(os.path.basename(sys.argv[0]))[0] if sys.argv else 'trace'
+    parser.add_argument('--trace', nargs='?', const=f"{script}.trace.json", metavar='FILE',
+                        help="write a Chrome trace of the script's phases and AWS calls")
+    parser.add_argument('--profile', nargs='?', const=f"{script}.prof", metavar='FILE',
+                        help="also capture cProfile stats")
+    return parser